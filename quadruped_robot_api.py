@@ -2,14 +2,42 @@ import tkinter as tk
 import tkinter.ttk as ttk
 import tkinter.simpledialog as sd
 import tkinter.messagebox as ms
+import tkinter.filedialog as fd
 import random
 import time
+import os
+import json
+import hashlib
+import itertools
+import multiprocessing
+import threading
+import queue
+import sys
+import argparse
+import platform
+import importlib.util
+import functools
 import numpy as np
 import cyipopt
+try:
+    import tomllib  # python 3.11+
+except ImportError:
+    try: import tomli as tomllib
+    except ImportError: tomllib = None  # the TOML scenarios can not be read
+try:
+    import resource  # the peak memory of the benchmarks (not available on Windows)
+except ImportError:
+    resource = None
+try:
+    import numba  # compiles the generated dynamics kernels (optional)
+except ImportError:
+    numba = None
 
 # this class creates instances of the API/GUI of the quadruped robot
 class quadruped_robot_api():
-    def __init__(self, root, instance):
+    dt_values = [0.01, 0.02, 0.05, 0.1]  # the possible values of the time step of the simulation
+    total_time_values = [0.5, 1, 2, 3, 4, 5, 10, 15, 20]  # the possible values of the total time of the simulation
+    def __init__(self, root, instance, cache_directory = None):
         self.root = root
         self.root.title(f"Quadruped robot api {instance+1}")
         self.root.geometry("+0+0")
@@ -38,22 +66,27 @@ class quadruped_robot_api():
         self.transformed_quadruped_robot_points = np.copy(self.quadruped_robot_points)  # initialize the transformed points of the quadruped robot
         self.x_transfer_quadruped_com = 0; self.y_transfer_quadruped_com = 0; self.z_transfer_quadruped_com = 0  # the transfer of the quadruped robot's center of mass in the workspace
         self.rotate_quadruped_matrix = np.eye(4)  # the matrix used to rotate the quadruped robot in the workspace
+        self.camera_transformation_key = None  # the inputs of the cached camera and robot pose transformations
+        self.robot_transformation_key = None
+        # the precomputed points of the quadruped robot for all the knot points of the trajectory, and the robot points they were computed from
+        self.trajectory_robot_points = np.zeros((0, self.quadruped_robot_points_num, 4))
+        self.trajectory_robot_points_source = None
         self.simulation_speed_values = [0.1, 0.5, 1., 2., 5.]; self.simulation_speed_degrees = ["very slow", "slow", "normal", "fast", "very fast"]  # the possible values/degrees of the simulation speed
         self.simulation_speed = self.simulation_speed_values[self.simulation_speed_degrees.index("normal")]  # control the simulation speed
+        self.target_fps_values = [10, 30, 60]  # the possible values of the target frame rate of the workspace (frames per sec)
+        self.target_fps = 60  # the target frame rate of the workspace, the frames are scheduled according to the measured frame time
         # define the quadruped robot model technical features
-        self.default_mass = 30.4213964625  # the default mass of the quadruped robot in kg
-        self.default_g = 9.81  # the default gravitational acceleration in m/s^2
-        self.default_I = np.array([[0.88201174, -0.00137526, -0.00062895], [-0.00137526, 1.85452968, -0.00018922], [-0.00062895, -0.00018922, 1.97309185]])  # the default inertia tensor of the quadruped robot in kg*m^2
-        self.default_feet_pos = np.array([[0.34, 0.19, -0.42],\
-                                    [-0.34, 0.19, -0.42],\
-                                    [0.34, -0.19, -0.42],\
-                                    [-0.34, -0.19, -0.42]])  # the default relative positions (in m) of left fore foot, left hind foot, right fore foot and right hind foot respectively
-        self.default_feet_x_dist = abs(self.default_feet_pos[0][0] - self.default_feet_pos[1][0])  # the default distance in x axis between the left fore foot and the left hind foot in m
-        self.default_feet_y_dist = abs(self.default_feet_pos[0][1] - self.default_feet_pos[2][1])  # the default distance in y axis between the left fore foot and the right fore foot in m
-        self.default_feet_height = 4/5 * abs(self.default_feet_pos[0][2])  # the default height of the quadruped robot in m (the default height of the center of mass of the quadruped robot)
-        self.default_body_length_x = self.default_feet_x_dist * 3/2  # the x length of the quadruped body in m
-        self.default_body_length_y = self.default_feet_y_dist * 3/2  # the y length of the quadruped body in m
-        self.default_body_length_z = self.default_feet_height / 2  # the z length of the quadruped body in m
+        self.default_mass = quadruped_robot_model.default_mass  # the default mass of the quadruped robot in kg
+        self.default_g = quadruped_robot_model.default_g  # the default gravitational acceleration in m/s^2
+        self.default_I = np.copy(quadruped_robot_model.default_I)  # the default inertia tensor of the quadruped robot in kg*m^2
+        # the default relative positions (in m) of left fore foot, left hind foot, right fore foot and right hind foot respectively
+        self.default_feet_pos = np.copy(quadruped_robot_model.default_feet_pos)
+        self.default_feet_x_dist = quadruped_robot_model.default_feet_x_dist  # the default distance in x axis between the left fore foot and the left hind foot in m
+        self.default_feet_y_dist = quadruped_robot_model.default_feet_y_dist  # the default distance in y axis between the left fore foot and the right fore foot in m
+        self.default_feet_height = quadruped_robot_model.default_feet_height  # the default height of the quadruped robot in m (the default height of the center of mass of the quadruped robot)
+        self.default_body_length_x = quadruped_robot_model.default_body_length_x  # the x length of the quadruped body in m
+        self.default_body_length_y = quadruped_robot_model.default_body_length_y  # the y length of the quadruped body in m
+        self.default_body_length_z = quadruped_robot_model.default_body_length_z  # the z length of the quadruped body in m
         self.mass = self.default_mass  # the mass of the quadruped robot in kg
         self.mass_bounds = [0.1, 1000]  # the bounds of the mass of the quadruped robot in kg
         self.g = self.default_g  # the gravitational acceleration in m/s^2
@@ -81,9 +114,9 @@ class quadruped_robot_api():
             self.legs_bounds_z.append([-1.5*(self.feet_height + self.body_length_z/2), -0.5*(self.feet_height + self.body_length_z/2)])  # initialization of the feet/legs bounds along the z-axis
         # define the simulation parameters
         self.dt = 0.1  # the time step of the simulation in sec
-        self.dt_values = [0.01, 0.02, 0.05, 0.1];  # the possible values of the time step of the simulation
+        self.dt_values = quadruped_robot_api.dt_values  # the possible values of the time step of the simulation
         self.total_time = 2  # the total time of the simulation in sec
-        self.total_time_values = [0.5, 1, 2, 3, 4, 5, 10, 15, 20]  # the possible values of the total time of the simulation
+        self.total_time_values = quadruped_robot_api.total_time_values  # the possible values of the total time of the simulation
         self.cycles_period = 1  # the period of every cycle in sec
         self.cycles_period_values = [0.5, 1, 2, 3, 4, 5, 10]  # the possible values of the cycles period of the simulation
         self.cycles_number = int(self.total_time / self.cycles_period)  # the number of cycles of the simulation
@@ -95,22 +128,30 @@ class quadruped_robot_api():
         self.final_com_position = np.array([2.5, 2, self.feet_height + self.body_length_z/2])  # the final position of the quadruped robot's center of mass in m
         self.final_body_orientation = np.array([45, 0, 0])  # the final rotation of the quadruped robot's body, ZYX Euler angles in degrees
         self.simulation_is_running = False  # the flag that indicates if the simulation is running
+        # the possible IPOPT Hessian modes, the exact sparse Hessian of the Lagrangian or the limited-memory (L-BFGS) quasi-Newton approximation
+        self.hessian_approximation_values = ["exact", "limited-memory"]
+        self.hessian_approximation_degrees = ["exact", "L-BFGS"]
+        self.hessian_approximation = self.hessian_approximation_values[self.hessian_approximation_degrees.index("exact")]  # the Hessian mode used by the optimizer
+        # the possible transcriptions of the dynamics between the knot points (the higher order ones need fewer knot points for the same accuracy, but use the L-BFGS Hessian)
+        self.integrator_values = trajectory_optimization.integrators
+        self.integrator_degrees = ["Euler", "trapez.", "H-S", "RK4"]
+        self.integrator = "euler"  # the transcription used by the optimizer
+        self.cost_weights = full_cost_weights()  # the weights of the cost terms used by the optimizer (all zero by default, the pure feasibility problem)
+        self.solver_process = None  # the background process of the running optimization (None if no optimization is running)
+        # the on-disk cache of the solved trajectories (None without cache), it can be shared by all the program instances
+        self.trajectory_cache = None if cache_directory is None else trajectory_cache(cache_directory)
         # define the gaits sequence variables
-        self.gaits_sequence = []  # the gaits sequence for all the feet of the quadruped robot
+        self.gaits_sequence = []  # the gait buttons for all the feet of the quadruped robot, a view of the contact schedule
+        # the contact schedule, the contact (True) or swing (False) phase of every foot and every gait of the gaits sequence grid
+        self.gaits_schedule = np.zeros((self.feet_number, self.gaits_number), dtype = bool)
         self.current_total_time = self.total_time  # the current total time of the simulation
         self.current_cycles_period = self.cycles_period  # the current number of cycles of the gaits sequence/simulation
         self.current_gaits_period = self.gaits_period  # the current number of gaits of the gaits sequence/simulation
         self.chosen_cycle_tens = 0  # the tens of the chosen cycle number
         self.chosen_cycle_units = 0  # the units of the choesn cycle number
         self.chosen_move_type = "walk"  # the movement type of the quadruped robot (walk, trot, pace, jump) at the chosen cycle
-        self.move_types_list = ["walk", "trot", "pace", "run", "jump", "all C", "all S"]  # the list of the possible movement types of the quadruped robot
-        self.move_types_contact_phases = [[[[0.0, 0.2], [0.3, 0.7], [0.8, 1.0]], [[0.0, 0.1], [0.2, 0.6], [0.7, 1.0]], [[0.1, 0.5], [0.6, 1.0]], [[0.0, 0.4], [0.5, 0.9]]],\
-                                          [[[0.0, 0.1], [0.4, 1.0]], [[0.0, 0.6], [0.9, 1.0]], [[0.0, 0.6], [0.9, 1.0]], [[0.0, 0.1], [0.4, 1.0]]],\
-                                          [[[0.0, 0.6], [0.9, 1.0]], [[0.0, 0.6], [0.9, 1.0]], [[0.0, 0.1], [0.4, 1.0]], [[0.0, 0.1], [0.4, 1.0]]],\
-                                          [[[0.5, 0.9]], [[0.0, 0.4]], [[0.5, 0.9]], [[0.0, 0.4]]],\
-                                          [[[0.0, 0.4], [0.8, 1.0]], [[0.0, 0.4], [0.8, 1.0]], [[0.0, 0.4], [0.8, 1.0]], [[0.0, 0.4], [0.8, 1.0]]],\
-                                          [[[0.0, 1.0]], [[0.0, 1.0]], [[0.0, 1.0]], [[0.0, 1.0]]],\
-                                          [[[0.0, 0.0]], [[0.0, 0.0]], [[0.0, 0.0]], [[0.0, 0.0]]]]  # the list of the contact phases (feet sequences) for every movement type
+        self.move_types_list = quadruped_robot_model.move_types_list  # the list of the possible movement types of the quadruped robot
+        self.move_types_contact_phases = quadruped_robot_model.move_types_contact_phases  # the list of the contact phases (feet sequences) for every movement type
         # define the variables for the non linear trajectory optimization/planning
         self.body_state_dim = 13  # the number of the body state variables
         self.body_com_dim = 6  # the number of the body center of mass variables (position and velocity)
@@ -131,6 +172,9 @@ class quadruped_robot_api():
         self.create_workspace_points_links()  # create the points of the visualized workspace
         self.reset_workspace()  # reset the position of the axis origin to be on the center of the workspace canvas
         self.calculate_draw_new_quadruped_model()  # calculate and draw the quadruped robot model in the workspace
+        self.create_workspace_canvas_items()  # create the canvas items of the workspace, once
+        self.last_frame_time = time.perf_counter()  # the wall-clock time of the last frame and the measured time needed for a frame
+        self.frame_time = 0.
         self.draw_next_workspace_frame()  # begin the loop for controlling the motion of the workspace visualization
 
     def create_workspace_menus_options(self):  # create the workspace and the menus with the options given to the user
@@ -146,7 +190,9 @@ class quadruped_robot_api():
         self.workspace.bind("<B1-Motion>", lambda event: self.rotate_workspace(event))
         self.workspace.bind("<MouseWheel>", lambda event: self.scale_workspace(event))
         for point in range(self.total_points_num):  # bind the points of the workspace to show their coordinates when the user's cursor is pointing to them
-            self.workspace.tag_unbind(f"point{point}", "<Enter>"); self.workspace.tag_bind(f"point{point}", "<Enter>", self.show_point_coordinates_helper(point))
+            self.workspace.tag_unbind(f"point{point}", "<Enter>")
+            self.workspace.tag_bind(f"point{point}", "<Enter>", self.show_point_coordinates_helper(point))
+            self.workspace.tag_bind(f"point{point}", "<Leave>", self.hide_point_coordinates)
         # create the borders and controls of the workspace
         borders_width = 50
         workspace_edges_color = "cyan"
@@ -157,7 +203,7 @@ class quadruped_robot_api():
         self.workspace_left_edge.grid(row = 1, rowspan = 2, column = 0, sticky = tk.NSEW)
         self.workspace_right_edge.grid(row = 1, rowspan = 2, column = 2, sticky = tk.NSEW)
         API_title_ord = 1; API_title_x = 1/2; menu_label(self.workspace_up_edge, "Quadruped Robot API:", f"Calibri 20 bold", "black", workspace_edges_color, API_title_x * 2*(self.workspace_width+borders_width), API_title_ord * borders_width / 2)
-        left_edge_width = 2*borders_width; left_edge_height = self.workspace_height; left_edge_rows = 16; left_edge_font = 12
+        left_edge_width = 2*borders_width; left_edge_height = self.workspace_height; left_edge_rows = 18; left_edge_font = 12
         sensitivity_label_ord = 1; sensitivity_label_x = 1/2; menu_label(self.workspace_left_edge, "Control\nsensitivity:", f"Calibri {left_edge_font} bold", "black", workspace_edges_color, sensitivity_label_x * left_edge_width, sensitivity_label_ord * left_edge_height / (left_edge_rows + 1))
         sensitivity_button_ord = sensitivity_label_ord+1; sensitivity_button_x = 1/2; self.change_control_sensitivity_button = menu_button(self.workspace_left_edge, self.sensitivity_degrees[1], f"Calibri {left_edge_font} bold", "magenta", workspace_edges_color, sensitivity_button_x * left_edge_width, sensitivity_button_ord * left_edge_height / (left_edge_rows + 1), self.change_workspace_control_sensitivity).button
         x_axis_range_label_ord = 3; x_axis_range_label_x = 1/2; menu_label(self.workspace_left_edge, "X axis range:", f"Calibri {left_edge_font} bold", "black", workspace_edges_color, x_axis_range_label_x * left_edge_width, x_axis_range_label_ord * left_edge_height / (left_edge_rows + 1))
@@ -174,6 +220,15 @@ class quadruped_robot_api():
         show_quadruped_points_button_ord = show_quadruped_points_label_ord+1; show_quadruped_points_button_x = 1/2; self.show_quadruped_points_button = menu_button(self.workspace_left_edge, self.quadruped_points_enable, f"Calibri {left_edge_font} bold", "magenta", workspace_edges_color, show_quadruped_points_button_x * left_edge_width, show_quadruped_points_button_ord * left_edge_height / (left_edge_rows + 1), self.show_quadruped_points).button
         simulation_speed_label_ord = 15; simulation_speed_label_x = 1/2; menu_label(self.workspace_left_edge, "Simulation\nspeed:", f"Calibri {left_edge_font} bold", "black", workspace_edges_color, simulation_speed_label_x * left_edge_width, simulation_speed_label_ord * left_edge_height / (left_edge_rows + 1))
         simulation_speed_button_ord = simulation_speed_label_ord+1; simulation_speed_button_x = 1/2; self.change_simulation_speed_button = menu_button(self.workspace_left_edge, f"normal", f"Calibri {left_edge_font} bold", "magenta", workspace_edges_color, simulation_speed_button_x * left_edge_width, simulation_speed_button_ord * left_edge_height / (left_edge_rows + 1), self.change_simulation_speed).button
+        target_fps_label_ord = 17
+        target_fps_label_x = 1/2
+        menu_label(self.workspace_left_edge, "Frame rate\n(fps):", f"Calibri {left_edge_font} bold", "black", workspace_edges_color, target_fps_label_x * left_edge_width,
+                   target_fps_label_ord * left_edge_height / (left_edge_rows + 1))
+        target_fps_button_ord = target_fps_label_ord+1
+        target_fps_button_x = 1/2
+        self.change_target_fps_button = menu_button(self.workspace_left_edge, self.target_fps, f"Calibri {left_edge_font} bold", "magenta", workspace_edges_color,
+                                                    target_fps_button_x * left_edge_width, target_fps_button_ord * left_edge_height / (left_edge_rows + 1),
+                                                    self.change_target_fps).button
         # create the menus' backgrounds
         menus_background_width = self.workspace_width / 2; menus_background_height = self.workspace_height - 5 * borders_width
         self.menu1_width = menus_background_width; self.menu1_height = menus_background_height; self.menu1_rows = 9; menu1_font = 12; menu1_bg_color = "black"
@@ -223,9 +278,23 @@ class quadruped_robot_api():
         gaits_period_button_x = 2/5; self.change_gaits_period_button = menu_button(self.menu2, self.gaits_period, f"Calibri {menu2_font} bold", "white", menu2_bg_color, gaits_period_button_x * self.menu2_width, gaits_period_ord * self.menu2_height / (self.menu2_rows + 1), self.change_simulation_gaits_period).button
         gaits_number_label_x = 3/5; menu_label(self.menu2, "Gaits\nnumber:", f"Arial {menu2_font} bold", "lime", menu2_bg_color, gaits_number_label_x * self.menu1_width, gaits_period_ord * self.menu2_height / (self.menu2_rows + 1))
         gaits_number_indicator_x = 4/5; self.gaits_number_indicator = menu_label(self.menu2, self.gaits_number, f"Calibri {menu2_font} bold", "yellow", menu2_bg_color, gaits_number_indicator_x * self.menu2_width, gaits_period_ord * self.menu2_height / (self.menu2_rows + 1)).label
-        menu2_seperator_ord = 5.5; menu2_seperator_x = 1/2; menu_label(self.menu2, "----------", f"Arial {menu2_font} bold", "brown", menu2_bg_color, menu2_seperator_x * self.menu1_width, menu2_seperator_ord * self.menu2_height / (self.menu2_rows + 1))
-        dt_ord = 6; dt_label_x = 1/3; menu_label(self.menu2, "dt (sec):", f"Arial {menu2_font} bold", "lime", menu2_bg_color, dt_label_x * self.menu1_width, dt_ord * self.menu2_height / (self.menu2_rows + 1))
-        dt_button_x = 2/3; self.change_dt_button = menu_button(self.menu2, self.dt, f"Calibri {menu2_font} bold", "white", menu2_bg_color, dt_button_x * self.menu2_width, dt_ord * self.menu2_height / (self.menu2_rows + 1), self.change_simulation_dt).button
+        menu2_seperator_ord = 5.5; menu2_seperator_x = 1/5; menu_label(self.menu2, "----------", f"Arial {menu2_font} bold", "brown", menu2_bg_color, menu2_seperator_x * self.menu1_width, menu2_seperator_ord * self.menu2_height / (self.menu2_rows + 1))
+        integrator_label_x = 3/5
+        menu_label(self.menu2, "Integrator:", f"Arial {menu2_font} bold", "lime", menu2_bg_color, integrator_label_x * self.menu1_width,
+                   menu2_seperator_ord * self.menu2_height / (self.menu2_rows + 1))
+        integrator_button_x = 4/5
+        self.change_integrator_button = menu_button(self.menu2, self.integrator_degrees[self.integrator_values.index(self.integrator)], f"Calibri {menu2_font} bold",
+                                                    "white", menu2_bg_color, integrator_button_x * self.menu2_width,
+                                                    menu2_seperator_ord * self.menu2_height / (self.menu2_rows + 1), self.change_integrator).button
+        dt_ord = 6; dt_label_x = 1/5; menu_label(self.menu2, "dt (sec):", f"Arial {menu2_font} bold", "lime", menu2_bg_color, dt_label_x * self.menu1_width, dt_ord * self.menu2_height / (self.menu2_rows + 1))
+        dt_button_x = 2/5; self.change_dt_button = menu_button(self.menu2, self.dt, f"Calibri {menu2_font} bold", "white", menu2_bg_color, dt_button_x * self.menu2_width, dt_ord * self.menu2_height / (self.menu2_rows + 1), self.change_simulation_dt).button
+        hessian_label_x = 3/5
+        menu_label(self.menu2, "Hessian:", f"Arial {menu2_font} bold", "lime", menu2_bg_color, hessian_label_x * self.menu1_width, dt_ord * self.menu2_height / (self.menu2_rows + 1))
+        hessian_button_x = 4/5
+        self.change_hessian_approximation_button = menu_button(self.menu2,
+                                                               self.hessian_approximation_degrees[self.hessian_approximation_values.index(self.hessian_approximation)],
+                                                               f"Calibri {menu2_font} bold", "white", menu2_bg_color, hessian_button_x * self.menu2_width,
+                                                               dt_ord * self.menu2_height / (self.menu2_rows + 1), self.change_hessian_approximation).button
         initial_state_ord = 7.2; initial_state_label_x = 1/5; menu_label(self.menu2, "Initial\nstate:", f"Arial {menu2_font} bold", "lime", menu2_bg_color, initial_state_label_x * self.menu1_width, initial_state_ord * self.menu2_height / (self.menu2_rows + 1))
         initial_com_pos_button_ord = initial_state_ord-0.4; initial_com_pos_button_x = 2/4; self.change_initial_com_pos_button = menu_button(self.menu2, "position", f"Calibri {menu2_font} bold", "white", menu2_bg_color, initial_com_pos_button_x * self.menu2_width, initial_com_pos_button_ord * self.menu2_height / (self.menu2_rows + 1), self.change_quadruped_initial_position).button
         initial_body_orient_button_ord = initial_state_ord+0.4; initial_body_orient_button_x = 2/4; self.change_initial_body_orient_button = menu_button(self.menu2, "orientation", f"Calibri {menu2_font} bold", "white", menu2_bg_color, initial_body_orient_button_x * self.menu2_width, initial_body_orient_button_ord * self.menu2_height / (self.menu2_rows + 1), self.change_quadruped_initial_orientation).button
@@ -235,8 +304,23 @@ class quadruped_robot_api():
         final_body_orient_button_ord = final_state_ord+0.4; final_body_orient_button_x = 2/4; self.change_final_body_orient_button = menu_button(self.menu2, "orientation", f"Calibri {menu2_font} bold", "white", menu2_bg_color, final_body_orient_button_x * self.menu2_width, final_body_orient_button_ord * self.menu2_height / (self.menu2_rows + 1), self.change_quadruped_final_orientation).button
         show_final_state_button_ord = final_state_ord; show_final_state_button_x = 3/4; self.show_initial_state_button = menu_button(self.menu2, "show", f"Calibri {menu2_font} bold", "white", menu2_bg_color, show_final_state_button_x * self.menu2_width, show_final_state_button_ord * self.menu2_height / (self.menu2_rows + 1), self.visualize_quadruped_final_state).button
         optimization_simulation_label_ord = 10; optimization_simulation_label_x = 1/5; menu_label(self.menu2, "Optimization/\nSimulation:", f"Arial {menu2_font} bold", "lime", menu2_bg_color, optimization_simulation_label_x * self.menu1_width, optimization_simulation_label_ord * self.menu2_height / (self.menu2_rows + 1))
-        run_optimization_simulation_button_x = 2/4; self.run_optimization_simulation_button = menu_button(self.menu2, "START", f"Calibri {menu2_font} bold", "white", menu2_bg_color, run_optimization_simulation_button_x * self.menu2_width, optimization_simulation_label_ord * self.menu2_height / (self.menu2_rows + 1), self.run_optimization_simulation).button
-        show_trajectory_button_x = 3/4; self.show_quadruped_trajectory_button = menu_button(self.menu2, "show", f"Calibri {menu2_font} bold", "white", menu2_bg_color, show_trajectory_button_x * self.menu2_width, optimization_simulation_label_ord * self.menu2_height / (self.menu2_rows + 1), self.show_quadruped_trajectory).button
+        optimization_progress_label_ord = optimization_simulation_label_ord+0.6
+        optimization_progress_label_x = 1/2
+        self.optimization_progress_label = menu_label(self.menu2, "", f"Arial {menu2_font-3} bold", "pink", menu2_bg_color,
+                                                      optimization_progress_label_x * self.menu2_width,
+                                                      optimization_progress_label_ord * self.menu2_height / (self.menu2_rows + 1)).label
+        run_optimization_simulation_button_x = 2/5; self.run_optimization_simulation_button = menu_button(self.menu2, "START", f"Calibri {menu2_font} bold", "white", menu2_bg_color, run_optimization_simulation_button_x * self.menu2_width, optimization_simulation_label_ord * self.menu2_height / (self.menu2_rows + 1), self.run_optimization_simulation).button
+        save_trajectory_button_ord = optimization_simulation_label_ord-0.3
+        save_trajectory_button_x = 4/5
+        self.save_trajectory_button = menu_button(self.menu2, "save", f"Calibri {menu2_font-2} bold", "white", menu2_bg_color,
+                                                  save_trajectory_button_x * self.menu2_width, save_trajectory_button_ord * self.menu2_height / (self.menu2_rows + 1),
+                                                  self.save_trajectory_to_file).button
+        load_trajectory_button_ord = optimization_simulation_label_ord+0.3
+        load_trajectory_button_x = 4/5
+        self.load_trajectory_button = menu_button(self.menu2, "load", f"Calibri {menu2_font-2} bold", "white", menu2_bg_color,
+                                                  load_trajectory_button_x * self.menu2_width, load_trajectory_button_ord * self.menu2_height / (self.menu2_rows + 1),
+                                                  self.load_trajectory_from_file).button
+        show_trajectory_button_x = 3/5; self.show_quadruped_trajectory_button = menu_button(self.menu2, "show", f"Calibri {menu2_font} bold", "white", menu2_bg_color, show_trajectory_button_x * self.menu2_width, optimization_simulation_label_ord * self.menu2_height / (self.menu2_rows + 1), self.show_quadruped_trajectory).button
         # create the options of menu 3
         title3_ord = 0.5; title3_x = 1/2; menu_label(self.menu3, "Gaits Sequence / Scheduling for the feet of the quadruped robot:", f"Arial {menu3_font} bold underline", "gold", menu3_bg_color, title3_x * self.menu3_width, title3_ord * self.menu3_height / (self.menu3_rows + 1))
         left_fore_foot_label_ord = 1.5; left_fore_foot_label_x = 1/8; menu_label(self.menu3, "Left Fore (LF):", f"Arial {menu3_font} bold", "lime", menu3_bg_color, left_fore_foot_label_x * self.menu3_width, left_fore_foot_label_ord * self.menu3_height / (self.menu3_rows + 1))
@@ -256,6 +340,25 @@ class quadruped_robot_api():
         chosen_move_type_button_ord = chosen_move_type_label_ord; chosen_move_type_button_x = chosen_move_type_label_x+80/self.menu3_width; self.change_chosen_move_type_button = menu_button(self.menu3, self.chosen_move_type, f"Calibri {menu3_font} bold", "white", menu3_bg_color, chosen_move_type_button_x * self.menu3_width, chosen_move_type_button_ord * self.menu3_height / (self.menu3_rows + 1), self.change_chosen_move_type).button
         apply_move_to_cycle_button_ord = chosen_cycle_label_ord; apply_move_to_cycle_button_x = chosen_move_type_label_x+180/self.menu3_width; self.apply_move_to_cycle_button = menu_button(self.menu3, "apply to cycle", f"Calibri {menu3_font} bold", "white", menu3_bg_color, apply_move_to_cycle_button_x * self.menu3_width, apply_move_to_cycle_button_ord * self.menu3_height / (self.menu3_rows + 1), self.apply_move_type_to_cycle).button
         apply_move_to_all_cycles_button_ord = chosen_cycle_label_ord+1; apply_move_to_all_cycles_button_x = chosen_move_type_label_x+180/self.menu3_width; self.apply_move_to_all_cycles_button = menu_button(self.menu3, "apply to all", f"Calibri {menu3_font} bold", "white", menu3_bg_color, apply_move_to_all_cycles_button_x * self.menu3_width, apply_move_to_all_cycles_button_ord * self.menu3_height / (self.menu3_rows + 1), self.apply_move_type_to_all_cycles).button
+        export_scenario_button_ord = 6.15
+        export_scenario_button_x = 0.77
+        self.export_scenario_button = menu_button(self.menu3, "export scenario", f"Calibri {menu3_font-2} bold", "white", menu3_bg_color,
+                                                  export_scenario_button_x * self.menu3_width, export_scenario_button_ord * self.menu3_height / (self.menu3_rows + 1),
+                                                  self.export_scenario).button
+        import_scenario_button_ord = 6.85
+        import_scenario_button_x = 0.77
+        self.import_scenario_button = menu_button(self.menu3, "import scenario", f"Calibri {menu3_font-2} bold", "white", menu3_bg_color,
+                                                  import_scenario_button_x * self.menu3_width, import_scenario_button_ord * self.menu3_height / (self.menu3_rows + 1),
+                                                  self.import_scenario).button
+        trajectory_cache_button_ord = 7.55
+        trajectory_cache_button_x = 0.77
+        self.trajectory_cache_button = menu_button(self.menu3, "cache: off" if self.trajectory_cache is None else "cache: on", f"Calibri {menu3_font-2} bold", "white",
+                                                   menu3_bg_color, trajectory_cache_button_x * self.menu3_width,
+                                                   trajectory_cache_button_ord * self.menu3_height / (self.menu3_rows + 1), self.change_trajectory_cache).button
+        cost_weights_button_ord = 7.55
+        cost_weights_button_x = 9/10
+        self.cost_weights_button = menu_button(self.menu3, "cost", f"Calibri {menu3_font-2} bold", "white", menu3_bg_color, cost_weights_button_x * self.menu3_width,
+                                               cost_weights_button_ord * self.menu3_height / (self.menu3_rows + 1), self.change_cost_weights).button
         make_new_grid_button_ord = 6.5; make_new_grid_button_x = 9/10; self.make_new_grid_button = menu_button(self.menu3, "new\ngrid", f"Calibri {menu3_font} bold", "white", menu3_bg_color, make_new_grid_button_x * self.menu3_width, make_new_grid_button_ord * self.menu3_height / (self.menu3_rows + 1), self.make_gaits_sequence_grid).button
         self.make_gaits_sequence_grid()
     def create_workspace_points_links(self, event = None):  # create the points and links of the workspace (axis and the quadruped robot)
@@ -285,25 +388,48 @@ class quadruped_robot_api():
                 self.points_links[links_counter+j + 4] = [links_counter+j + 4 + (-1)**j, links_counter+j + 4 + 2*(-1)**j]
             else:
                 self.points_links[links_counter+j] = [links_counter+j + 4]
+        # preallocate the homogeneous points buffers of the workspace, the transformations are applied to them in place
+        # the points of the workspace, before the workspace transformation (due to the user's mouse control) is applied
+        self.workspace_points = np.concatenate((self.axis_terrain_points, self.quadruped_robot_points), axis = 0)
+        self.transformed_quadruped_robot_points = self.workspace_points[self.axis_terrain_points_num :]  # the transformed points of the quadruped robot (a view of the workspace points)
+        self.canvas_moved_points = np.zeros_like(self.workspace_points)  # the moved points of the workspace, converted to canvas coordinates
+        self.robot_transformation_key = None  # the robot points have changed, so the robot pose transformation must be applied again
 
     def apply_workspace_transformation(self, event = None):  # apply the transformation defined by the proper transfer, rotation and scale variables to all the points of the workspace
-        self.workspace_transfer_matrix = np.array([[1, 0, 0, 0], [0, 1, 0, self.y_cor_workspace_center], [0, 0, 1, self.z_cor_workspace_center], [0, 0, 0, 1]])
-        self.workspace_scale_matrix = np.array([[self.magnify_workspace_constant * self.scale_parameter, 0, 0, 0], [0, self.magnify_workspace_constant * self.scale_parameter, 0, 0], [0, 0, self.magnify_workspace_constant * self.scale_parameter, 0], [0, 0, 0, 1]])
-        self.workspace_y_rot_matrix = np.array([[np.cos(self.rot_y_workspace * np.pi / 180), 0, np.sin(self.rot_y_workspace * np.pi / 180), 0], [0, 1, 0, 0], [-np.sin(self.rot_y_workspace * np.pi / 180), 0, np.cos(self.rot_y_workspace * np.pi / 180), 0], [0, 0, 0, 1]])
-        self.workspace_z_rot_matrix = np.array([[np.cos(self.rot_z_workspace * np.pi / 180), -np.sin(self.rot_z_workspace * np.pi / 180), 0, 0], [np.sin(self.rot_z_workspace * np.pi / 180), np.cos(self.rot_z_workspace * np.pi / 180), 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]])
-        self.workspace_rotation_matrix = self.workspace_y_rot_matrix @ self.workspace_z_rot_matrix
-        self.workspace_transformation_matrix = self.workspace_transfer_matrix @ self.workspace_rotation_matrix @ self.workspace_scale_matrix
-        self.apply_quadruped_robot_transformation()  # apply the transformation defined by the proper transfer and rotation matrices to the points of the quadruped robot
-        self.workspace_points = np.concatenate((self.axis_terrain_points, self.transformed_quadruped_robot_points), axis = 0)  # the points of the workspace, before the workspace transformation (due to the user's mouse control) is applied 
-        self.canvas_moved_points = (self.switch_coor_system_matrix @ self.workspace_transformation_matrix @ np.concatenate((self.axis_terrain_points, self.transformed_quadruped_robot_points), axis = 0).T).T  # the moved points of the workspace, converted to canvas coordinates, after the workspace transformation is applied
+        # the inputs of the camera (workspace view) transformation
+        camera_key = (self.y_cor_workspace_center, self.z_cor_workspace_center, self.rot_y_workspace, self.rot_z_workspace, self.magnify_workspace_constant * self.scale_parameter)
+        if camera_key != self.camera_transformation_key:  # the camera transformation is rebuilt only when its inputs change
+            self.camera_transformation_key = camera_key
+            cos_y, sin_y = np.cos(self.rot_y_workspace * np.pi / 180), np.sin(self.rot_y_workspace * np.pi / 180)
+            cos_z, sin_z = np.cos(self.rot_z_workspace * np.pi / 180), np.sin(self.rot_z_workspace * np.pi / 180)
+            self.workspace_transfer_matrix = np.array([[1, 0, 0, 0], [0, 1, 0, self.y_cor_workspace_center], [0, 0, 1, self.z_cor_workspace_center], [0, 0, 0, 1]])
+            self.workspace_scale_matrix = np.diag([camera_key[4], camera_key[4], camera_key[4], 1])
+            self.workspace_y_rot_matrix = np.array([[cos_y, 0, sin_y, 0], [0, 1, 0, 0], [-sin_y, 0, cos_y, 0], [0, 0, 0, 1]])
+            self.workspace_z_rot_matrix = np.array([[cos_z, -sin_z, 0, 0], [sin_z, cos_z, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]])
+            self.workspace_rotation_matrix = self.workspace_y_rot_matrix @ self.workspace_z_rot_matrix
+            self.workspace_transformation_matrix = self.workspace_transfer_matrix @ self.workspace_rotation_matrix @ self.workspace_scale_matrix
+            # the composed (transposed) transformation from the workspace points to the canvas coordinates
+            self.canvas_transformation_matrix_T = (self.switch_coor_system_matrix @ self.workspace_transformation_matrix).T
+        # apply the transformation defined by the proper transfer and rotation matrices to the points of the quadruped robot (only if the robot pose has changed)
+        self.apply_quadruped_robot_transformation()
+        # the moved points of the workspace, converted to canvas coordinates, after the workspace transformation is applied (in place)
+        np.matmul(self.workspace_points, self.canvas_transformation_matrix_T, out = self.canvas_moved_points)
+        self.workspace_needs_redraw = True  # the next frame must be drawn
     def apply_quadruped_robot_transformation(self, event = None):  # apply the transformation defined by the proper transfer and rotation matrices to the points of the quadruped robot
-        reset_transfer_matrix = np.array([[1, 0, 0, -self.center_of_mass[0]], [0, 1, 0, -self.center_of_mass[1]], [0, 0, 1, -self.center_of_mass[2]], [0, 0, 0, 1]])  # the reset transfer matrix
-        transfer_quadruped_matrix = np.array([[1, 0, 0, self.x_transfer_quadruped_com], [0, 1, 0, self.y_transfer_quadruped_com], [0, 0, 1, self.z_transfer_quadruped_com], [0, 0, 0, 1]])  # the transfer matrix of the quadruped robot
-        rotate_quadruped_matrix = np.concatenate((self.rotate_quadruped_matrix, np.array([[0, 0, 0]]).T), axis = 1); rotate_quadruped_matrix = np.concatenate((rotate_quadruped_matrix, np.array([[0, 0, 0, 1]])), axis = 0)
-        self.transformed_quadruped_robot_points = (transfer_quadruped_matrix @ np.linalg.inv(reset_transfer_matrix) @ rotate_quadruped_matrix @ reset_transfer_matrix @ self.quadruped_robot_points.T).T  # the transformed points of the quadruped robot
-        if self.simulation_is_running and self.trajectory_steps_counter < self.K:  # if the simulation is running and the trajectory steps counter is less than the number of trajectory steps, adjust the feet positions of the quadruped robot during the simulation time
-            for foot in range(self.feet_number):
-                for j in range(3): self.transformed_quadruped_robot_points[foot][j] = self.quadruped_traj_feet_positions[self.trajectory_steps_counter][3 * foot + j]  # adjust the feet positions of the quadruped robot during the simulation time
+        if self.simulation_is_running:  # during the playback the robot points are taken from the precomputed trajectory points
+            self.robot_transformation_key = None
+            return
+        # the inputs of the robot pose transformation
+        robot_key = (self.x_transfer_quadruped_com, self.y_transfer_quadruped_com, self.z_transfer_quadruped_com,
+                     np.asarray(self.rotate_quadruped_matrix)[:3, :3].tobytes(), self.center_of_mass.tobytes())
+        if robot_key == self.robot_transformation_key: return  # the robot pose has not changed
+        self.robot_transformation_key = robot_key
+        robot_transformation_matrix = np.eye(4)  # the rotation of the quadruped robot around its center of mass, followed by the transfer of the center of mass
+        robot_transformation_matrix[:3, :3] = self.rotate_quadruped_matrix[:3, :3]
+        robot_transformation_matrix[:3, 3] = self.center_of_mass + np.array([self.x_transfer_quadruped_com, self.y_transfer_quadruped_com,
+                                                                             self.z_transfer_quadruped_com]) - robot_transformation_matrix[:3, :3] @ self.center_of_mass
+        # the transformed points of the quadruped robot (in place, inside the workspace points buffer)
+        np.matmul(self.quadruped_robot_points, robot_transformation_matrix.T, out = self.transformed_quadruped_robot_points)
     def reset_workspace(self, event = None):  # reset the workspace to its initial state
         self.scale_parameter = 1  # initialize the scale parameter of the workspace
         self.y_cor_workspace_center = 0; self.z_cor_workspace_center = 0  # initialize the coordinates of the center of the workspace
@@ -335,28 +461,12 @@ class quadruped_robot_api():
         self.last_rotation_y = event.y
         self.last_rotation_z = event.x
         self.apply_workspace_transformation()
-    def draw_next_workspace_frame(self):  # draw the next frame of the workspace
+    def create_workspace_canvas_items(self):  # create the canvas items of the workspace once (terrain plane, links, points and axis letters), the frames only update their coordinates and visibility
         self.workspace.delete("all")  # clear the workspace
-        # choose the points and links to draw
-        self.points_to_draw = []; self.links_to_draw = []
-        self.canvas_moved_points = np.array(self.canvas_moved_points); self.canvas_moved_points = self.canvas_moved_points.tolist()
-        if self.axis_terrain_enable == "on":
-            self.points_to_draw = self.canvas_moved_points[:self.axis_terrain_points_num] + self.quadruped_robot_points_num*[None]  # draw only the axis and terrain points
-            self.links_to_draw = self.points_links[:self.axis_terrain_points_num] + self.quadruped_robot_points_num*[None]  # draw only the axis and terrain points links
-        if self.quadruped_robot_enable == "on":
-            if self.quadruped_points_enable == "on": self.points_to_draw = self.axis_terrain_points_num*[None] + self.canvas_moved_points[self.axis_terrain_points_num:]  # draw only the quadruped robot points
-            self.links_to_draw = self.axis_terrain_points_num*[None] + self.points_links[self.axis_terrain_points_num:]  # draw only the quadruped robot points links
-        if self.axis_terrain_enable == "on" and self.quadruped_robot_enable == "on":
-            if self.quadruped_points_enable == "on": self.points_to_draw = self.canvas_moved_points  # draw all the points of the workspace
-            else: self.points_to_draw = self.canvas_moved_points[:self.axis_terrain_points_num]  # draw only the axis and terrain points
-            self.links_to_draw = self.points_links  # draw all the points links of the workspace
-        # draw the terrain plane
-        if self.axis_terrain_enable == "on":
-            first_point = 4
-            self.workspace.create_polygon([self.canvas_moved_points[first_point][0], self.canvas_moved_points[first_point][1], self.canvas_moved_points[first_point+1][0], self.canvas_moved_points[first_point+1][1], self.canvas_moved_points[first_point+2][0], self.canvas_moved_points[first_point+2][1], self.canvas_moved_points[first_point+3][0], self.canvas_moved_points[first_point+3][1]], width = 1, fill = "gray", activefill = "gray")
-        # draw the chosen links (connecting lines) between a point and its neighbours
-        for point in range(len(self.links_to_draw)):
-            if self.links_to_draw[point] != None:
+        self.terrain_plane_item = self.workspace.create_polygon(0, 0, 0, 0, 0, 0, 0, 0, width = 1, fill = "gray", activefill = "gray")  # the terrain plane
+        self.link_items = []  # the (item, point, neighbour point) of every link (connecting line) between a point and its neighbours
+        for point in range(self.total_points_num):
+            if self.points_links[point] != None:
                 for link in self.points_links[point]:
                     if link < self.axis_terrain_points_num:
                         link_color = "brown"
@@ -366,25 +476,58 @@ class quadruped_robot_api():
                         link_color = "blue"
                     if point == self.axis_terrain_points_num + 3*self.feet_number and link == self.axis_terrain_points_num + 3*self.feet_number + 2:
                         link_color = "magenta"
-                    self.workspace.create_line(self.canvas_moved_points[point][0], self.canvas_moved_points[point][1], self.canvas_moved_points[link][0], self.canvas_moved_points[link][1], width = 5, fill = link_color, activefill = "white")
-        # draw the chosen points of the workspace (the axis, terrain points and the quadruped robot points) and create the binds for all the points of the workspace
-        for point in range(len(self.points_to_draw)):
-            if self.points_to_draw[point] != None:
-                self.workspace.create_line(self.points_to_draw[point][0], self.points_to_draw[point][1], self.points_to_draw[point][0], self.points_to_draw[point][1], width = 10, fill = "black", capstyle = "round", activefill = "white", tags = f"point{point}")
-        if self.quadruped_robot_enable == "on":
-            self.workspace.create_line(self.canvas_moved_points[-1][0], self.canvas_moved_points[-1][1], self.canvas_moved_points[-1][0], self.canvas_moved_points[-1][1], width = 12, fill = "green", capstyle = "round", activefill = "white", tags = f"point{self.total_points_num-1}")
-        # draw the letters x, y, z to the corresponding points of the axis
-        if self.axis_terrain_enable == "on":
-            self.workspace.create_text(self.canvas_moved_points[1][0]-15, self.canvas_moved_points[1][1], text = "x", font = "Calibri 15 bold", fill = "black")
-            self.workspace.create_text(self.canvas_moved_points[2][0]+15, self.canvas_moved_points[2][1], text = "y", font = "Calibri 15 bold", fill = "black")
-            self.workspace.create_text(self.canvas_moved_points[3][0]+15, self.canvas_moved_points[3][1], text = "z", font = "Calibri 15 bold", fill = "black")
-        # loop the function
-        self.workspace.after(10, self.draw_next_workspace_frame)
+                    self.link_items.append((self.workspace.create_line(0, 0, 0, 0, width = 5, fill = link_color, activefill = "white"), point, link))
+        # the points of the workspace (the axis, terrain points and the quadruped robot points)
+        self.point_items = [self.workspace.create_line(0, 0, 0, 0, width = 10, fill = "black", capstyle = "round", activefill = "white",
+                                                       tags = f"point{point}") for point in range(self.total_points_num)]
+        # the center of mass of the quadruped robot
+        self.com_point_item = self.workspace.create_line(0, 0, 0, 0, width = 12, fill = "green", capstyle = "round", activefill = "white", tags = f"point{self.total_points_num-1}")
+        # the letters x, y, z of the axis, next to the corresponding points
+        self.axis_letter_items = [(self.workspace.create_text(0, 0, text = letter, font = "Calibri 15 bold", fill = "black"), point, offset) for letter, point,
+                                  offset in [("x", 1, -15), ("y", 2, 15), ("z", 3, 15)]]
+        # the coordinates of the point the user's cursor is pointing to
+        self.pointing_to_item = self.workspace.create_text(self.workspace_width/2, self.workspace_height-20, text = "", font = "Calibri 12 bold", fill = "black")
+        self.workspace_needs_redraw = True  # the new items must get their coordinates
+    # draw the next frame of the workspace (only if the workspace has changed since the last frame), the single scheduler of the workspace loop and of the trajectory playback
+    def draw_next_workspace_frame(self):
+        frame_start_time = time.perf_counter()  # the wall-clock time at the start of the frame
+        if self.simulation_is_running:  # the playback follows the wall-clock time, so the trajectory samples are skipped or interpolated according to the actual frame rate
+            self.update_trajectory_playback(frame_start_time - self.last_frame_time)
+        self.last_frame_time = frame_start_time
+        if self.workspace_needs_redraw:
+            self.workspace_needs_redraw = False
+            points = self.canvas_moved_points[:, :2].tolist()  # the canvas coordinates of the points of the workspace
+            axis_terrain_state = "normal" if self.axis_terrain_enable == "on" else "hidden"  # the visibility of the axis and terrain
+            quadruped_robot_state = "normal" if self.quadruped_robot_enable == "on" else "hidden"  # the visibility of the quadruped robot links
+            quadruped_points_state = "normal" if self.quadruped_robot_enable == "on" and self.quadruped_points_enable == "on" else "hidden"  # the visibility of the quadruped robot points
+            # update the terrain plane
+            first_point = 4
+            self.workspace.coords(self.terrain_plane_item, *points[first_point], *points[first_point+1], *points[first_point+2], *points[first_point+3])
+            self.workspace.itemconfigure(self.terrain_plane_item, state = axis_terrain_state)
+            # update the links (connecting lines) between a point and its neighbours
+            for item, point, link in self.link_items:
+                self.workspace.coords(item, *points[point], *points[link])
+                self.workspace.itemconfigure(item, state = axis_terrain_state if point < self.axis_terrain_points_num else quadruped_robot_state)
+            # update the points of the workspace (the axis, terrain points and the quadruped robot points)
+            for point, item in enumerate(self.point_items):
+                self.workspace.coords(item, *points[point], *points[point])
+                self.workspace.itemconfigure(item, state = axis_terrain_state if point < self.axis_terrain_points_num else quadruped_points_state)
+            self.workspace.coords(self.com_point_item, *points[-1], *points[-1])
+            self.workspace.itemconfigure(self.com_point_item, state = quadruped_robot_state)
+            # update the letters x, y, z of the axis
+            for item, point, offset in self.axis_letter_items:
+                self.workspace.coords(item, points[point][0] + offset, points[point][1])
+                self.workspace.itemconfigure(item, state = axis_terrain_state)
+        # loop the function, so that the frames follow the target frame rate
+        self.frame_time = 0.9 * self.frame_time + 0.1 * (time.perf_counter() - frame_start_time)  # the (smoothed) measured time needed for a frame in sec
+        self.workspace.after(max(1, int(1000 * (1 / self.target_fps - self.frame_time))), self.draw_next_workspace_frame)
     def show_point_coordinates_helper(self, point):  # helper function that returns the function that shows the coordinates of the point the user's cursor is pointing to
         return lambda event: self.show_point_coordinates(point, event)
     def show_point_coordinates(self, point, event = None):  # show the coordinates of the point the user's cursor is pointing to
         self.pointing_to_point = f"({self.workspace_points[point][0]:.2f}, {self.workspace_points[point][1]:.2f}, {self.workspace_points[point][2]:.2f})"
-        self.workspace.create_text(self.workspace_width/2, self.workspace_height-20, text = f"Pointing to: {self.pointing_to_point}", font = "Calibri 12 bold", fill = "black")
+        self.workspace.itemconfigure(self.pointing_to_item, text = f"Pointing to: {self.pointing_to_point}")
+    def hide_point_coordinates(self, event = None):  # hide the coordinates when the user's cursor leaves the point
+        self.workspace.itemconfigure(self.pointing_to_item, text = "")
 
     def change_workspace_control_sensitivity(self, event = None):  # change the workspace mouse control sensitivity
         self.workspace_sensitivity = self.alternate_matrix_elements(self.sensitivity_values, self.workspace_sensitivity)
@@ -404,12 +547,18 @@ class quadruped_robot_api():
     def show_axis_terrain(self, event = None):  # show or hide the axis and terrain
         self.axis_terrain_enable = self.alternate_matrix_elements(["on", "off"], self.axis_terrain_enable)
         self.show_axis_terrain_button.configure(text = self.axis_terrain_enable)
+        self.workspace_needs_redraw = True  # the visibility of the workspace items has changed
     def show_quadruped_robot(self, event = None):  # show or hide the quadruped robot
         self.quadruped_robot_enable = self.alternate_matrix_elements(["on", "off"], self.quadruped_robot_enable)
         self.show_quadruped_robot_button.configure(text = self.quadruped_robot_enable)
+        self.workspace_needs_redraw = True  # the visibility of the workspace items has changed
     def show_quadruped_points(self, event = None):  # show or hide the quadruped robot points (the edges of the model are still visible)
         self.quadruped_points_enable = self.alternate_matrix_elements(["on", "off"], self.quadruped_points_enable)
         self.show_quadruped_points_button.configure(text = self.quadruped_points_enable)
+        self.workspace_needs_redraw = True  # the visibility of the workspace items has changed
+    def change_target_fps(self, event = None):  # change the target frame rate of the workspace
+        self.target_fps = self.alternate_matrix_elements(self.target_fps_values, self.target_fps)
+        self.change_target_fps_button.configure(text = self.target_fps)
     def change_simulation_speed(self, event = None):  # change the replay simulation speed
         self.simulation_speed = self.alternate_matrix_elements(self.simulation_speed_values, self.simulation_speed)
         self.change_simulation_speed_button.configure(text = self.simulation_speed_degrees[self.simulation_speed_values.index(self.simulation_speed)])
@@ -485,18 +634,16 @@ class quadruped_robot_api():
             if self.feet_y_dist > self.body_length_y: self.body_length_y = self.feet_y_dist
         self.calculate_draw_new_quadruped_model()
     def calculate_draw_new_quadruped_model(self, event = None):  # calculate the new feet positions based on the left fore foot position, the feet height and the distances from the left fore foot to the other feet
-        for foot in range(self.feet_number):  # update the feet positions
-            self.feet_pos[foot][0] = self.feet_pos[0][0] - (foot%2) * self.feet_x_dist
-            self.feet_pos[foot][1] = self.feet_pos[0][1] - (foot//2) * self.feet_y_dist
-            self.feet_pos[foot][2] = self.feet_pos[0][2]
-        self.center_of_mass = np.array([self.feet_pos[0][0] - self.feet_x_dist/2, self.feet_pos[0][1] - self.feet_y_dist/2, self.feet_pos[0][2] + self.feet_height + self.body_length_z/2])  # update the center of mass position
+        model = self.quadruped_model()  # the model calculates the feet positions, the center of mass and the feet/legs bounds
+        self.feet_pos = model.feet_pos  # update the feet positions
+        self.center_of_mass = model.center_of_mass  # update the center of mass position
         self.initial_com_position[2] = self.feet_height + self.body_length_z/2; self.final_com_position[2] = self.initial_com_position[2]  # update the initial and final center of mass positions
-        self.legs_bounds_x = []; self.legs_bounds_y = []; self.legs_bounds_z = []  # initialize the feet/legs bounds
-        for foot in range(self.feet_number):
-            self.legs_bounds_x.append([self.feet_pos[foot][0] - self.center_of_mass[0] - self.body_length_x/2, self.feet_pos[foot][0] - self.center_of_mass[0] + self.body_length_x/2])  # update the feet/legs bounds along the x-axis
-            self.legs_bounds_y.append([self.feet_pos[foot][1] - self.center_of_mass[1] - self.body_length_y/2, self.feet_pos[foot][1] - self.center_of_mass[1] + self.body_length_y/2])  # update the feet/legs bounds along the y-axis
-            self.legs_bounds_z.append([-1.3*(self.feet_height + self.body_length_z/2), -0.7*(self.feet_height + self.body_length_z/2)])  # update the feet/legs bounds along the z-axis
+        self.legs_bounds_x = model.legs_bounds_x  # update the feet/legs bounds
+        self.legs_bounds_y = model.legs_bounds_y
+        self.legs_bounds_z = model.legs_bounds_z
         self.create_workspace_points_links(); self.apply_workspace_transformation()
+    def quadruped_model(self):  # the quadruped robot model (technical features and dynamics) defined by the current options of the GUI
+        return quadruped_robot_model(self.mass, self.g, self.I, self.feet_pos[0], self.feet_height, self.feet_x_dist, self.feet_y_dist, self.body_length_x, self.body_length_y, self.body_length_z)
     def show_current_quadruped_robot_model(self, event = None):  # show the current quadruped robot model
         ms.showinfo("Current quadruped robot model", "The current quadruped robot model is:\n\nmass (kg) = {}\ngravity acceleration (m/s^2) = {}\ncenter of mass (com) position (m) = {} \ninertia tensor (kg*m^2) =\n{}\nleft fore (LF) foot position (m) = {}\nleft hind (LH) foot position (m) = {}\nright fore (RF) foot position (m) = {}\nright hind (RH) foot position (m) = {}\nfeet height (m) = {}\nfeet distance along the x-axis (m) = {}\nfeet distance along the y-axis (m) = {}\nbody length on the x-axis (m) = {}\nbody width on the y-axis (m) = {}\nbody height on the z-axis (m) = {}".\
                     format(self.mass, self.g, self.center_of_mass, self.I, self.feet_pos[0], self.feet_pos[1], self.feet_pos[2], self.feet_pos[3], self.feet_height, self.feet_x_dist, self.feet_y_dist, self.body_length_x, self.body_length_y, self.body_length_z))
@@ -538,6 +685,18 @@ class quadruped_robot_api():
     def change_simulation_dt(self, event = None):  # change the time step of the simulation
         self.dt = self.alternate_matrix_elements(self.dt_values, self.dt)
         self.change_dt_button.configure(text = self.dt)
+    def change_hessian_approximation(self, event = None):  # change the Hessian mode of the optimizer (exact or L-BFGS)
+        if self.integrator != "euler":
+            ms.showinfo("Hessian", "The exact Hessian is available only for the Euler integrator, the other integrators use L-BFGS.")
+            return
+        self.hessian_approximation = self.alternate_matrix_elements(self.hessian_approximation_values, self.hessian_approximation)
+        self.change_hessian_approximation_button.configure(text = self.hessian_approximation_degrees[self.hessian_approximation_values.index(self.hessian_approximation)])
+    def change_integrator(self, event = None):  # change the transcription of the dynamics between the knot points (euler, trapezoidal, Hermite-Simpson or RK4)
+        self.integrator = self.alternate_matrix_elements(self.integrator_values, self.integrator)
+        self.change_integrator_button.configure(text = self.integrator_degrees[self.integrator_values.index(self.integrator)])
+        if self.integrator != "euler" and self.hessian_approximation == "exact":  # the exact Hessian is available only for euler
+            self.hessian_approximation = "limited-memory"
+            self.change_hessian_approximation_button.configure(text = self.hessian_approximation_degrees[self.hessian_approximation_values.index(self.hessian_approximation)])
     def change_quadruped_initial_position(self, event = None):  # change the initial position of the quadruped robot
         initial_center_of_mass_x = sd.askfloat("Change c.o.m. initial position", "Enter the center of mass initial x position (m):", initialvalue = self.initial_com_position[0], minvalue = self.feet_pos_bounds[0], maxvalue = self.feet_pos_bounds[1], parent = self.root)
         if initial_center_of_mass_x != None: self.initial_com_position[0] = initial_center_of_mass_x
@@ -585,13 +744,88 @@ class quadruped_robot_api():
             self.chosen_cycle_tens = 0; self.chosen_cycle_units = 1; self.change_chosen_cycle_tens_button.configure(text = self.chosen_cycle_tens); self.change_chosen_cycle_units_button.configure(text = self.chosen_cycle_units)
             current_gaits_number = int(self.current_total_time / self.current_gaits_period); current_cycles_number = int(self.current_total_time / self.current_cycles_period)
             gait_button_width = self.gaits_sequence_background_width / current_gaits_number; gait_button_height = self.gaits_sequence_background_height / self.feet_number
-            self.gaits_sequence = []
+            self.gaits_sequence = []  # a new clear contact schedule
+            self.gaits_schedule = np.zeros((self.feet_number, current_gaits_number), dtype = bool)
             for i in range(self.feet_number):
                 cycle_gaits = []
                 for j in range(current_gaits_number):
-                    cycle_gaits.append(gait_button(self.gaits_sequence_background, gait_button_width, gait_button_height, i, j, j // int(current_gaits_number / current_cycles_number)))
+                    cycle_gaits.append(gait_button(self.gaits_sequence_background, gait_button_width, gait_button_height, i, j,
+                                                   j // int(current_gaits_number / current_cycles_number), self.gaits_schedule))
                     cycle_gaits[-1].set_button_on_grid(i, j)
                 self.gaits_sequence.append(cycle_gaits)
+    def current_scenario(self, name = "scenario"):  # the scenario defined by the current options of the GUI
+        return quadruped_scenario(name, self.quadruped_model().parameters(), self.initial_com_position, self.initial_body_orientation, self.final_com_position,
+                                  self.final_body_orientation, self.dt, self.current_total_time, self.current_cycles_period, self.current_gaits_period,
+                                  self.gaits_schedule.copy(), self.chosen_move_type, self.hessian_approximation, integrator = self.integrator,
+                                  cost_weights = self.cost_weights)
+    def export_scenario(self, event = None):  # save the current scenario to a JSON or a TOML file
+        path = fd.asksaveasfilename(parent = self.root, title = "Export scenario", defaultextension = ".json", filetypes = [("JSON scenarios", "*.json"), ("TOML scenarios", "*.toml")])
+        if not path: return
+        try: self.current_scenario(os.path.splitext(os.path.basename(path))[0]).save(path)
+        except (OSError, ValueError) as error: ms.showerror("Export scenario", f"The scenario could not be saved: {error}")
+    def import_scenario(self, event = None):  # load a scenario from a JSON or a TOML file and apply it to the GUI
+        path = fd.askopenfilename(parent = self.root, title = "Import scenario", filetypes = [("Scenarios", "*.json *.toml"), ("All files", "*")])
+        if not path: return
+        try: scenario = load_scenario(path)
+        except (OSError, ValueError, TypeError, ImportError) as error:
+            ms.showerror("Import scenario", f"The scenario could not be loaded: {error}")
+            return
+        for value, values, option in [(scenario.dt, self.dt_values, "dt"), (scenario.total_time, self.total_time_values, "total time"),
+                                      (scenario.cycles_period, self.cycles_period_values, "cycles period"), (scenario.gaits_period, self.gaits_period_values, "gaits period"),
+                                      (scenario.hessian_approximation, self.hessian_approximation_values, "Hessian")]:
+            if value not in values:
+                ms.showerror("Import scenario", f"The {option} {value} of the scenario is not one of the GUI options {values}!")
+                return
+        # the quadruped robot model
+        model = scenario.robot_model()
+        self.mass = model.mass
+        self.g = model.g
+        self.I = np.copy(model.I)
+        self.feet_pos = np.copy(model.feet_pos)
+        self.feet_height = model.feet_height
+        self.feet_x_dist = model.feet_x_dist
+        self.feet_y_dist = model.feet_y_dist
+        self.body_length_x = model.body_length_x
+        self.body_length_y = model.body_length_y
+        self.body_length_z = model.body_length_z
+        self.calculate_draw_new_quadruped_model()
+        # the initial and final states, the timing and the solver options
+        self.initial_com_position = np.array(scenario.initial_com_position)
+        self.initial_body_orientation = np.array(scenario.initial_body_orientation)
+        self.final_com_position = np.array(scenario.final_com_position)
+        self.final_body_orientation = np.array(scenario.final_body_orientation)
+        self.dt = self.dt_values[self.dt_values.index(scenario.dt)]
+        self.total_time = self.total_time_values[self.total_time_values.index(scenario.total_time)]
+        self.cycles_period = self.cycles_period_values[self.cycles_period_values.index(scenario.cycles_period)]
+        self.gaits_period = self.gaits_period_values[self.gaits_period_values.index(scenario.gaits_period)]
+        self.hessian_approximation = scenario.hessian_approximation
+        self.integrator = scenario.integrator
+        self.cost_weights = dict(scenario.cost_weights)
+        self.change_integrator_button.configure(text = self.integrator_degrees[self.integrator_values.index(self.integrator)])
+        self.change_dt_button.configure(text = self.dt)
+        self.change_total_time_button.configure(text = self.total_time)
+        self.change_cycles_period_button.configure(text = self.cycles_period)
+        self.change_gaits_period_button.configure(text = self.gaits_period)
+        self.change_hessian_approximation_button.configure(text = self.hessian_approximation_degrees[self.hessian_approximation_values.index(self.hessian_approximation)])
+        self.calculate_cycles_number()
+        self.calculate_gaits_number()
+        # the gaits sequence grid
+        self.make_gaits_sequence_grid()
+        self.gaits_schedule[:] = scenario.gaits_schedule
+        self.update_gaits_sequence_grid()
+        self.visualize_quadruped_initial_state()
+    def change_cost_weights(self, event = None):  # change the weights of the cost terms of the optimizer (zero weights give the pure feasibility problem)
+        for term in self.cost_weights:
+            weight = sd.askfloat("Change cost weights", f"Enter the weight of the {term.replace('_', ' ')} cost term:", initialvalue = self.cost_weights[term], minvalue = 0, parent = self.root)
+            if weight != None: self.cost_weights[term] = weight
+    def change_trajectory_cache(self, event = None):  # turn on the on-disk cache of the solved trajectories (in a directory chosen by the user), or turn it off
+        if self.trajectory_cache is None:
+            directory = fd.askdirectory(parent = self.root, title = "Choose the directory of the trajectory cache", mustexist = False)
+            if not directory: return
+            self.trajectory_cache = trajectory_cache(directory)
+        else:
+            self.trajectory_cache = None
+        self.trajectory_cache_button.configure(text = "cache: off" if self.trajectory_cache is None else "cache: on")
     def change_chosen_cycle_tens(self, event = None):  # change the tens digit of the chosen cycle
         self.chosen_cycle_units = 0; self.chosen_cycle_tens = self.alternate_matrix_elements(list(range(0, 10)), self.chosen_cycle_tens)
         while 10 * self.chosen_cycle_tens + self.chosen_cycle_units > int(self.current_total_time / self.current_cycles_period):
@@ -609,20 +843,13 @@ class quadruped_robot_api():
     def apply_move_type_to_cycle(self, event = None):  # apply the chosen move type to the chosen cycle
         cycles_number = int(self.current_total_time / self.current_cycles_period)
         gaits_number_per_cycle = int(self.current_total_time / self.current_gaits_period / cycles_number)
-        current_cycle = 10 * self.chosen_cycle_tens + self.chosen_cycle_units - 1
-        current_move_type_feet_seq = self.move_types_list.index(self.chosen_move_type)
-        for foot in range(self.feet_number):
-            contact_gaits = []
-            contact_phases = self.move_types_contact_phases[current_move_type_feet_seq][foot]
-            for contact_interval in contact_phases:
-                contact_gaits += list(range(int(contact_interval[0] * gaits_number_per_cycle), int(contact_interval[1] * gaits_number_per_cycle)))
-            for gait in range(gaits_number_per_cycle):
-                if gait in contact_gaits:
-                    if self.gaits_sequence[foot][current_cycle * gaits_number_per_cycle + gait].gait_button_is_pressed == False:
-                        self.gaits_sequence[foot][current_cycle * gaits_number_per_cycle + gait].press_button()
-                else:
-                    if self.gaits_sequence[foot][current_cycle * gaits_number_per_cycle + gait].gait_button_is_pressed == True:
-                        self.gaits_sequence[foot][current_cycle * gaits_number_per_cycle + gait].press_button()
+        current_cycle = (10 * self.chosen_cycle_tens + self.chosen_cycle_units - 1) % cycles_number  # the cycle 0 is the last cycle
+        cycle_gaits = slice(current_cycle * gaits_number_per_cycle, (current_cycle + 1) * gaits_number_per_cycle)  # the gaits of the chosen cycle
+        self.gaits_schedule[:, cycle_gaits] = move_type_cycle_contacts(self.chosen_move_type, gaits_number_per_cycle, self.feet_number)
+        self.update_gaits_sequence_grid(cycle_gaits)
+    def update_gaits_sequence_grid(self, gaits = slice(None)):  # show the current contact schedule on the gait buttons of the gaits (all the gaits by default)
+        for foot_gaits in self.gaits_sequence:
+            for gait in foot_gaits[gaits]: gait.update_button()
     def apply_move_type_to_all_cycles(self, event = None):  # apply the chosen move type to all the cycles
         current_cycles_number = int(self.current_total_time / self.current_cycles_period)
         for cycle in range(current_cycles_number):
@@ -632,6 +859,231 @@ class quadruped_robot_api():
     def alternate_matrix_elements(self, matrix, index_element):  # alternate the parametres that are inside the matrix based on the current index_element
         return (matrix[1:] + [matrix[0]])[matrix.index(index_element)]
 
+    def run_optimization_simulation(self, event = None):  # run the simulation and calculate the optimal trajectory for the quadruped robot, or cancel the running optimization
+        if self.solver_process is not None:  # the optimization is running, so the button cancels it
+            self.solver_cancel_event.set()
+            self.optimization_progress_label.configure(text = "Cancelling the optimization...")
+            return
+        if ms.askyesno("Run optimization/simulation", "Are you sure you want to run the optimization procedure?"):
+            # find the gaits sequence / feet phases for each foot and each time step of the simulation
+            self.K = round(self.current_total_time / self.dt) + 1  # the total number of the knot points
+            # the gaits sequence / feet phases for each foot and each time step of the simulation
+            self.feet_phases = gaits_sequence_to_feet_phases(self.gaits_schedule, self.current_gaits_period, self.dt, self.K)
+
+            # solve the trajectory optimization problem in a background process (with the same planner that is used without the GUI), so the GUI keeps repainting during the solve
+            solver_context = multiprocessing.get_context("spawn")  # a fresh process, that does not inherit the Tk state of this one
+            self.solver_result_queue = solver_context.Queue()  # the queues of the result and of the per-iteration progress, and the event that cancels the solve
+            self.solver_progress_queue = solver_context.Queue()
+            self.solver_cancel_event = solver_context.Event()
+            self.solver_process = solver_context.Process(target = plan_quadruped_trajectory_worker,
+                                                         args = (self.solver_result_queue, self.quadruped_model(), self.initial_com_position, self.initial_body_orientation,
+                                                                 self.final_com_position, self.final_body_orientation, self.feet_phases, self.dt),
+                                                         kwargs = {"hessian_approximation": self.hessian_approximation, "cache": self.trajectory_cache, "progress_queue": self.solver_progress_queue,
+                                                                   "cancel_event": self.solver_cancel_event, "integrator": self.integrator, "cost_weights": dict(self.cost_weights)},
+                                                         daemon = True)
+            self.solver_process.start()
+            self.solver_dt = self.dt  # the time step and the model of the solved trajectory
+            self.solver_model = self.quadruped_model()
+            self.run_optimization_simulation_button.configure(text = "CANCEL")
+            self.optimization_progress_label.configure(text = "Starting the optimization...")
+            self.root.after(100, self.poll_optimization_progress)
+    def poll_optimization_progress(self, event = None):  # show the progress of the running optimization and get its result when it finishes
+        progress = None
+        while True:  # keep only the latest progress of the optimization
+            try: progress = self.solver_progress_queue.get_nowait()
+            except queue.Empty: break
+        if progress is not None: self.optimization_progress_label.configure(text = "iter: {}, objective: {:.4g}, inf_pr: {:.2e}, inf_du: {:.2e}".format(*progress))
+        try: result = self.solver_result_queue.get_nowait()
+        except queue.Empty:
+            if self.solver_process.is_alive(): self.root.after(100, self.poll_optimization_progress)
+            else:
+                self.solver_process = None
+                self.run_optimization_simulation_button.configure(text = "START")
+                self.optimization_progress_label.configure(text = "")
+                ms.showerror("Optimization Info", "The optimization process stopped unexpectedly!")
+            return
+        self.solver_process.join()
+        self.solver_process = None
+        self.run_optimization_simulation_button.configure(text = "START")
+        if result[0] == "error":
+            self.optimization_progress_label.configure(text = "")
+            ms.showerror("Optimization Info", f"The optimization failed: {result[1]}")
+        else:
+            self.show_optimization_result(*result[1:])
+    def show_optimization_result(self, states, inputs, info):  # keep the optimal trajectory, inform the user about the optimization status and move the quadruped robot
+        if info["status"] == 5:  # the user cancelled the optimization (IPOPT user requested stop)
+            self.optimization_progress_label.configure(text = "The optimization was cancelled.")
+            return
+        self.optimization_progress_label.configure(text = "iterations: {}, objective: {:.4g}".format(info["iterations"], info["obj_val"]))
+        self.K = len(states)  # the total number of the knot points and the time step of the optimal trajectory
+        self.trajectory_dt = self.solver_dt
+        self.trajectory_states = states  # the arrays and the details of the trajectory, needed to save it
+        self.trajectory_inputs = inputs
+        self.trajectory_feet_phases = self.feet_phases
+        self.trajectory_model = self.solver_model
+        self.trajectory_info = info
+        self.trajectory_states_list = [states[k] for k in range(self.K)]  # the states of the optimal trajectory
+        self.inputs_list = [inputs[k] for k in range(self.K - 1)]  # the control inputs of the optimal trajectory
+        
+        # inform the user about the optimization status
+        if info['status'] == 0:
+            ms.showinfo("Optimization Info", f"Successful optimization!")
+        else:
+            ms.showinfo("Optimization Info", f"The maximum number of iterations done. Unsuccessful optimization!")
+        
+        # # print some of the important states of the optimal trajectory
+        # for state in self.trajectory_states_list:
+        #     com_pos = state[:self.body_position_dim]
+        #     q = state[self.body_com_dim : self.body_com_dim + 4]
+        #     feet_pos = state[self.body_state_dim : self.N]
+        #     print(f"com pos: {com_pos}")
+        #     print(f"q norm: {np.linalg.norm(q)}")
+        #     print(f"feet pos: {feet_pos}")
+        
+        # move the quadruped robot from the initial state to the final state
+        self.quadruped_traj_com_locations = []
+        self.quadruped_traj_body_orientations = []
+        self.quadruped_traj_feet_positions = []
+        for state in self.trajectory_states_list:
+            self.quadruped_traj_com_locations.append(state[:self.body_position_dim])
+            self.quadruped_traj_body_orientations.append(state[self.body_com_dim : self.body_com_dim + 4])
+            self.quadruped_traj_feet_positions.append(state[self.body_state_dim : self.N])
+        self.compute_trajectory_robot_points()  # precompute the points of the quadruped robot for all the knot points
+        self.trajectory_steps_counter = 0
+        self.show_quadruped_trajectory()
+
+    def save_trajectory_to_file(self, event = None):  # save the last trajectory to a trajectory file
+        if self.K == 0:
+            ms.showinfo("Save trajectory", "There is no trajectory to save!")
+            return
+        path = fd.asksaveasfilename(parent = self.root, title = "Save trajectory", defaultextension = ".traj", filetypes = [("Trajectory files", "*.traj")])
+        if path: save_trajectory(path, self.trajectory_states, self.trajectory_inputs, self.trajectory_dt, self.trajectory_feet_phases, model = self.trajectory_model, info = self.trajectory_info)
+    def load_trajectory_from_file(self, event = None):  # load a trajectory file and replay it
+        path = fd.askopenfilename(parent = self.root, title = "Load trajectory", filetypes = [("Trajectory files", "*.traj"), ("All files", "*")])
+        if not path: return
+        try: states, inputs, header = load_trajectory(path)
+        except (OSError, ValueError) as error:
+            ms.showerror("Load trajectory", f"The trajectory could not be loaded: {error}")
+            return
+        self.K = len(states)
+        self.trajectory_dt = header["dt"]
+        self.trajectory_states = states
+        self.trajectory_inputs = inputs
+        self.trajectory_feet_phases = np.array(header["feet_phases"], dtype = bool)
+        self.trajectory_info = header["solver"]
+        self.trajectory_model = quadruped_robot_model(**header["model"]) if header["model"] is not None else self.quadruped_model()  # the model of the trajectory
+        self.trajectory_states_list = [states[k] for k in range(self.K)]  # the states and the control inputs (views of the memory-mapped arrays)
+        self.inputs_list = [inputs[k] for k in range(self.K - 1)]
+        self.compute_trajectory_robot_points()  # precompute the points of the quadruped robot for all the knot points
+        self.show_quadruped_trajectory()
+    def compute_trajectory_robot_points(self):  # precompute the points of the quadruped robot (K, points, 4) for all the knot points of the trajectory, in one batched pass
+        states = np.asarray(self.trajectory_states).reshape((self.K, self.N))  # the states of the trajectory
+        R = q_to_R_batch(states[:, self.body_com_dim : self.body_com_dim + 4])  # the rotation matrices of the body at all the knot points
+        robot_transformation_matrices = np.zeros((self.K, 4, 4))  # the robot pose transformations, the rotation around the center of mass followed by the transfer of the center of mass
+        robot_transformation_matrices[:, :3, :3] = R
+        robot_transformation_matrices[:, 3, 3] = 1.
+        robot_transformation_matrices[:, :3, 3] = states[:, : self.body_position_dim] - R @ self.center_of_mass
+        self.trajectory_robot_points = self.quadruped_robot_points @ np.swapaxes(robot_transformation_matrices, 1, 2)  # the points of the quadruped robot at all the knot points
+        self.trajectory_robot_points[:, : self.feet_number, :3] = states[:, self.body_state_dim : self.N].reshape((self.K, self.feet_number, 3))  # the feet positions of the trajectory
+        self.trajectory_robot_points_source = self.quadruped_robot_points  # the robot points the trajectory points were computed from
+        self.trajectory_final_pose = (states[-1, : self.body_position_dim] - self.center_of_mass, R[-1])  # the transfer of the center of mass and the rotation of the body at the last knot point
+    def show_quadruped_trajectory(self, event = None):  # (re)start the playback of the trajectory, the frames of the workspace loop move the quadruped robot according to the wall-clock time
+        if self.K > 0 and len(self.trajectory_states_list) == self.K:
+            if self.trajectory_robot_points_source is not self.quadruped_robot_points: self.compute_trajectory_robot_points()  # the quadruped robot model has changed since the last computation
+            self.simulation_is_running = True
+            self.trajectory_steps_counter = 0; self.playback_time = 0.  # the playback time, measured in knot points
+    def seek_trajectory_frame(self, playback_time):  # move the quadruped robot to any (fractional) knot point of the trajectory, O(1) since the robot points are precomputed
+        self.playback_time = min(max(playback_time, 0.), self.K - 1)
+        k = min(int(self.playback_time), self.K - 2)  # the knot point before the sample and the fraction of the way to the next knot point
+        fraction = self.playback_time - k
+        self.trajectory_steps_counter = int(round(self.playback_time))  # the nearest knot point of the sample
+        np.multiply(self.trajectory_robot_points[k], 1. - fraction, out = self.transformed_quadruped_robot_points)  # the interpolated points of the quadruped robot
+        self.transformed_quadruped_robot_points += fraction * self.trajectory_robot_points[k + 1]
+        self.apply_workspace_transformation()
+    def update_trajectory_playback(self, elapsed_time):  # advance the playback by the elapsed wall-clock time (in sec) and move the quadruped robot to the interpolated trajectory sample
+        self.seek_trajectory_frame(self.playback_time + elapsed_time * self.simulation_speed / self.trajectory_dt)
+        if self.playback_time >= self.K - 1:  # the playback has finished, the quadruped robot stays at the final pose of the trajectory
+            self.trajectory_steps_counter = 0
+            self.simulation_is_running = False
+            self.x_transfer_quadruped_com, self.y_transfer_quadruped_com, self.z_transfer_quadruped_com = self.trajectory_final_pose[0]
+            self.rotate_quadruped_matrix = self.trajectory_final_pose[1]
+
+# this class holds the technical features and the dynamics of the quadruped robot model, it does not need any GUI (Tk root), so it can be used headless
+class quadruped_robot_model():
+    default_mass = 30.4213964625  # the default mass of the quadruped robot in kg
+    default_g = 9.81  # the default gravitational acceleration in m/s^2
+    # the default inertia tensor of the quadruped robot in kg*m^2
+    default_I = np.array([[0.88201174, -0.00137526, -0.00062895], [-0.00137526, 1.85452968, -0.00018922], [-0.00062895, -0.00018922, 1.97309185]])
+    default_feet_pos = np.array([[0.34, 0.19, -0.42],
+                                [-0.34, 0.19, -0.42],
+                                [0.34, -0.19, -0.42],
+                                [-0.34, -0.19, -0.42]])  # the default relative positions (in m) of left fore foot, left hind foot, right fore foot and right hind foot respectively
+    default_feet_x_dist = abs(default_feet_pos[0][0] - default_feet_pos[1][0])  # the default distance in x axis between the left fore foot and the left hind foot in m
+    default_feet_y_dist = abs(default_feet_pos[0][1] - default_feet_pos[2][1])  # the default distance in y axis between the left fore foot and the right fore foot in m
+    default_feet_height = 4/5 * abs(default_feet_pos[0][2])  # the default height of the quadruped robot in m (the default height of the center of mass of the quadruped robot)
+    default_body_length_x = default_feet_x_dist * 3/2  # the x length of the quadruped body in m
+    default_body_length_y = default_feet_y_dist * 3/2  # the y length of the quadruped body in m
+    default_body_length_z = default_feet_height / 2  # the z length of the quadruped body in m
+    move_types_list = ["walk", "trot", "pace", "run", "jump", "all C", "all S"]  # the list of the possible movement types of the quadruped robot
+    move_types_contact_phases = [[[[0.0, 0.2], [0.3, 0.7], [0.8, 1.0]], [[0.0, 0.1], [0.2, 0.6], [0.7, 1.0]], [[0.1, 0.5], [0.6, 1.0]], [[0.0, 0.4], [0.5, 0.9]]],
+                                  [[[0.0, 0.1], [0.4, 1.0]], [[0.0, 0.6], [0.9, 1.0]], [[0.0, 0.6], [0.9, 1.0]], [[0.0, 0.1], [0.4, 1.0]]],
+                                  [[[0.0, 0.6], [0.9, 1.0]], [[0.0, 0.6], [0.9, 1.0]], [[0.0, 0.1], [0.4, 1.0]], [[0.0, 0.1], [0.4, 1.0]]],
+                                  [[[0.5, 0.9]], [[0.0, 0.4]], [[0.5, 0.9]], [[0.0, 0.4]]],
+                                  [[[0.0, 0.4], [0.8, 1.0]], [[0.0, 0.4], [0.8, 1.0]], [[0.0, 0.4], [0.8, 1.0]], [[0.0, 0.4], [0.8, 1.0]]],
+                                  [[[0.0, 1.0]], [[0.0, 1.0]], [[0.0, 1.0]], [[0.0, 1.0]]],
+                                  [[[0.0, 0.0]], [[0.0, 0.0]], [[0.0, 0.0]], [[0.0, 0.0]]]]  # the list of the contact phases (feet sequences) for every movement type
+    # the parameters that are None get their default values
+    def __init__(self, mass = None, g = None, I = None, left_fore_foot_pos = None, feet_height = None, feet_x_dist = None, feet_y_dist = None, body_length_x = None,
+                 body_length_y = None, body_length_z = None):
+        self.mass = float(quadruped_robot_model.default_mass if mass is None else mass)  # the mass of the quadruped robot in kg
+        self.g = float(quadruped_robot_model.default_g if g is None else g)  # the gravitational acceleration in m/s^2
+        self.I = np.array(quadruped_robot_model.default_I if I is None else I, dtype = float)  # the inertia tensor of the quadruped robot in kg*m^2
+        # the relative position of the left fore foot in m
+        left_fore_foot_pos = np.array(quadruped_robot_model.default_feet_pos[0] if left_fore_foot_pos is None else left_fore_foot_pos, dtype = float)
+        self.feet_height = float(quadruped_robot_model.default_feet_height if feet_height is None else feet_height)  # the height of the quadruped robot in m
+        self.feet_x_dist = float(quadruped_robot_model.default_feet_x_dist if feet_x_dist is None else feet_x_dist)  # the distance in x axis between the left fore foot and the left hind foot in m
+        self.feet_y_dist = float(quadruped_robot_model.default_feet_y_dist if feet_y_dist is None else feet_y_dist)  # the distance in y axis between the left fore foot and the right fore foot in m
+        self.body_length_x = float(quadruped_robot_model.default_body_length_x if body_length_x is None else body_length_x)  # the x length of the quadruped body in m
+        self.body_length_y = float(quadruped_robot_model.default_body_length_y if body_length_y is None else body_length_y)  # the y length of the quadruped body in m
+        self.body_length_z = float(quadruped_robot_model.default_body_length_z if body_length_z is None else body_length_z)  # the z length of the quadruped body in m
+        self.feet_number = 4  # the number of feet of the quadruped robot
+        self.body_state_dim = 13  # the number of the body state variables
+        self.body_com_dim = 6  # the number of the body center of mass variables (position and velocity)
+        self.body_position_dim = 3  # the number of the body position variables
+        self.feet_state_dim = 3 * self.feet_number  # the number of the feet state variables
+        self.N = self.body_state_dim + self.feet_state_dim  # the total number of the state variables
+        self.M = 3 * self.feet_number  # the total number of the control input variables
+        self.feet_pos = np.zeros((self.feet_number, 3))  # the relative positions of left fore foot, left hind foot, right fore foot and right hind foot in m
+        for foot in range(self.feet_number):  # calculate the feet positions based on the left fore foot position and the distances from the left fore foot to the other feet
+            self.feet_pos[foot][0] = left_fore_foot_pos[0] - (foot%2) * self.feet_x_dist
+            self.feet_pos[foot][1] = left_fore_foot_pos[1] - (foot//2) * self.feet_y_dist
+            self.feet_pos[foot][2] = left_fore_foot_pos[2]
+        # the position of the center of mass of the quadruped robot in m
+        self.center_of_mass = np.array([self.feet_pos[0][0] - self.feet_x_dist/2, self.feet_pos[0][1] - self.feet_y_dist/2, self.feet_pos[0][2] + self.feet_height + self.body_length_z/2])
+        self.legs_bounds_x = []  # the feet/legs bounds along the x, y and z axis, relative to the center of mass and in the body frame
+        self.legs_bounds_y = []
+        self.legs_bounds_z = []
+        for foot in range(self.feet_number):
+            # the feet/legs bounds along the x-axis
+            self.legs_bounds_x.append([self.feet_pos[foot][0] - self.center_of_mass[0] - self.body_length_x/2, self.feet_pos[foot][0] - self.center_of_mass[0] + self.body_length_x/2])
+            # the feet/legs bounds along the y-axis
+            self.legs_bounds_y.append([self.feet_pos[foot][1] - self.center_of_mass[1] - self.body_length_y/2, self.feet_pos[foot][1] - self.center_of_mass[1] + self.body_length_y/2])
+            self.legs_bounds_z.append([-1.3*(self.feet_height + self.body_length_z/2), -0.7*(self.feet_height + self.body_length_z/2)])  # the feet/legs bounds along the z-axis
+        self.inv_I = np.linalg.inv(self.I)  # the cached inverse of the inertia tensor and the inertia tensor it was calculated from
+        self.inv_I_source = np.copy(self.I)
+
+    def parameters(self):  # the parameters of the model (the keyword arguments of the constructor), as plain python values
+        return {"mass": self.mass, "g": self.g, "I": self.I.tolist(), "left_fore_foot_pos": self.feet_pos[0].tolist(), "feet_height": self.feet_height,
+                "feet_x_dist": self.feet_x_dist, "feet_y_dist": self.feet_y_dist, "body_length_x": self.body_length_x, "body_length_y": self.body_length_y,
+                "body_length_z": self.body_length_z}
+    # the world positions of the feet (feet_number, 3) when the center of mass is at com_position and the body has the ZYX Euler angles body_orientation (in degrees)
+    def feet_positions(self, com_position, body_orientation):
+        R_body = ZYX_to_R(body_orientation[0], body_orientation[1], body_orientation[2])  # the rotation matrix of the body
+        return np.asarray(com_position, dtype = float) + (self.feet_pos - self.center_of_mass) @ R_body.T  # rotate the feet around the center of mass and move them with it
+    def state(self, com_position, body_orientation):  # the state x_quad (N,) of the quadruped robot standing still at com_position with the ZYX Euler angles body_orientation (in degrees)
+        q_body = R_to_q(ZYX_to_R(body_orientation[0], body_orientation[1], body_orientation[2]))  # the quaternion-based representation of the body orientation
+        return np.concatenate((np.asarray(com_position, dtype = float), np.zeros(3), q_body, np.zeros(3), self.feet_positions(com_position, body_orientation).ravel()))
+
     def quadruped_dynamics(self, x_quad, u, contacts):  # the dynamics of the quadruped robot, based on the contacts or not (swings) of the feet with the ground
         # x_quad = [pcom, pcom_dot, q, omega, p1, p2, p3, p4]^T
         # pcom is the center of mass (body position), pcom_dot is the center of mass velocity, q is the quaternion-based representation of the body orientation, omega is the body angular velocity
@@ -653,7 +1105,7 @@ class quadruped_robot_api():
         pcom_ddot = F_total / self.mass  # calculate the center of mass acceleration (body acceleration)
         q_dot = 1/2 * L_matrix(q) @ np.concatenate([np.zeros((1, 1)), omega], axis = 0)  # calculate the quaternion-based representation of the body orientation derivative
         Rw = q_to_R(q)  # rotation matrix of the body orientation (equivalent to the quaternion-based representation of the body orientation)
-        omega_dot = np.linalg.inv(self.I) @ (Rw.T @ T_total - hat(omega) @ (self.I @ omega))  # calculate the body angular acceleration
+        omega_dot = self.inverse_inertia() @ (Rw.T @ T_total - hat(omega) @ (self.I @ omega))  # calculate the body angular acceleration
         return np.concatenate((pcom_dot, pcom_ddot, q_dot, omega_dot), axis = 0).reshape((self.body_state_dim, 1))  # return the body state derivative
     def quadruped_dynamics_dxquad(self, x_quad, u, contacts):  # the partial derivative of the quadruped robot dynamics with respect to the state x_quad
         x_quad = x_quad.reshape((self.N, -1)); u = u.reshape((self.M, -1))  # reshape the state and the control input vectors
@@ -667,7 +1119,7 @@ class quadruped_robot_api():
         T_total = sum(hat(pi[3 * foot : 3 * (foot + 1)].reshape((3, 1)) - pcom) @ fi[3 * foot : 3 * (foot + 1)].reshape((3, 1)) for foot in range(self.feet_number))  # calculate the total torque applied to the quadruped robot
         Rw = q_to_R(q)  # rotation matrix of the body orientation (equivalent to the quaternion-based representation of the body orientation)
         H = np.concatenate([np.zeros((1, 3)), np.eye(3)], axis = 0)  # the H matrix used in the quaternions operations
-        inv_I = np.linalg.inv(self.I)  # the inverse of the inertia tensor
+        inv_I = self.inverse_inertia()  # the cached inverse of the inertia tensor
         body_dyn_dxquad = np.zeros((self.body_state_dim, self.N))  # initialize the partial derivative of the quadruped robot body dynamics with respect to the state x_quad
         body_dyn_dxquad[: self.body_position_dim, self.body_position_dim : self.body_com_dim] = np.eye(self.body_position_dim)  # the partial derivative of the body velocity with respect to the body position
         body_dyn_dxquad[self.body_com_dim : self.body_com_dim + 4, self.body_com_dim: self.body_com_dim + 4] = 1/2 * np.block([[0, -omega.T], [omega, -hat(omega)]])  # the partial derivative of the quaternion derivative with respect to the quaternion
@@ -686,181 +1138,177 @@ class quadruped_robot_api():
         for foot in range(self.feet_number):  # calculate the forces applied to the feet based on the contacts
             if not contacts[foot]: fi[3 * foot : 3 * (foot + 1)] = np.zeros((3, 1))  # if the foot is in contact with the ground, the force applied to the foot is non-zero, otherwise it is zero
         Rw = q_to_R(q)  # rotation matrix of the body orientation (equivalent to the quaternion-based representation of the body orientation)
-        inv_I = np.linalg.inv(self.I)  # the inverse of the inertia tensor
+        inv_I = self.inverse_inertia()  # the cached inverse of the inertia tensor
         body_dyn_du = np.zeros((self.body_state_dim, self.M))  # initialize the partial derivative of the quadruped robot body dynamics with respect to the control input u
         for foot in range(self.feet_number): body_dyn_du[self.body_position_dim : self.body_com_dim, 3 * foot : 3 * (foot + 1)] = np.eye(3) / self.mass * contacts[foot]  # the partial derivative of the body acceleration with respect to the force applied to each foot
         for foot in range(self.feet_number): body_dyn_du[self.body_com_dim + 4 : self.body_state_dim, 3 * foot : 3 * (foot + 1)] = inv_I @ Rw.T @ hat(pi[3 * foot : 3 * (foot + 1)].reshape((3, 1)) - pcom)  # the partial derivative of the body angular acceleration with respect to the force applied to each foot
         return body_dyn_du  # return the partial derivative of the body dynamics with respect to the control input u
 
-    def run_optimization_simulation(self, event = None):  # run the simulation and calculate the optimal trajectory for the quadruped robot
-        if ms.askyesno("Run optimization/simulation", "Are you sure you want to run the optimization procedure?"):
-            # calculate the initial x0 and the target x_target states
-            initial_R_body = ZYX_to_R(self.initial_body_orientation[0], self.initial_body_orientation[1], self.initial_body_orientation[2])  # the initial rotation matrix of the quadruped robot's body
-            initial_q_body = R_to_q(initial_R_body)  # the initial quaternion-based representation of the quadruped robot's body orientation
-            self.visualize_quadruped_initial_state()  # visualize the initial state of the quadruped robot in order to set the initial state of the optimization problem
-            initial_LF_foot_pos = self.workspace_points[8, :-1].reshape((3, 1))  # the initial position of the left fore foot in m
-            initial_LH_foot_pos = self.workspace_points[9, :-1].reshape((3, 1))  # the initial position of the left hind foot in m
-            initial_RF_foot_pos = self.workspace_points[10, :-1].reshape((3, 1))  # the initial position of the right fore foot in m
-            initial_RH_foot_pos = self.workspace_points[11, :-1].reshape((3, 1))  # the initial position of the right hind foot in m
-            x0 = np.block([self.initial_com_position[0], self.initial_com_position[1], self.initial_com_position[2], 0., 0., 0., initial_q_body[0], initial_q_body[1], initial_q_body[2], initial_q_body[3], 0., 0., 0., initial_LF_foot_pos.T, initial_LH_foot_pos.T, initial_RF_foot_pos.T, initial_RH_foot_pos.T]).reshape((self.N, 1))
-            final_R_body = ZYX_to_R(self.final_body_orientation[0], self.final_body_orientation[1], self.final_body_orientation[2])  # the final rotation matrix of the quadruped robot's body
-            final_q_body = R_to_q(final_R_body)  # the final quaternion-based representation of the quadruped robot's body orientation
-            self.visualize_quadruped_final_state()  # visualize the final state of the quadruped robot in order to set the final state of the optimization problem
-            final_LF_foot_pos = self.workspace_points[8, :-1].reshape((3, 1))  # the final position of the left fore foot in m
-            final_LH_foot_pos = self.workspace_points[9, :-1].reshape((3, 1))  # the final position of the left hind foot in m
-            final_RF_foot_pos = self.workspace_points[10, :-1].reshape((3, 1))  # the final position of the right fore foot in m
-            final_RH_foot_pos = self.workspace_points[11, :-1].reshape((3, 1))  # the final position of the right hind foot in m
-            x_target = np.block([self.final_com_position[0], self.final_com_position[1], self.final_com_position[2], 0., 0., 0., final_q_body[0], final_q_body[1], final_q_body[2], final_q_body[3], 0., 0., 0., final_LF_foot_pos.T, final_LH_foot_pos.T, final_RF_foot_pos.T, final_RH_foot_pos.T]).reshape((self.N, 1))
+    # the dynamics of the quadruped robot evaluated at many knot points at once, x_quads is (K, N), us is (K, M) and contacts is (K, feet_number)
+    def quadruped_dynamics_batch(self, x_quads, us, contacts):
+        pcom = x_quads[:, : self.body_position_dim]  # center of mass positions (body positions)
+        pcom_dot = x_quads[:, self.body_position_dim : self.body_com_dim]  # center of mass velocities (body velocities)
+        q = x_quads[:, self.body_com_dim : self.body_com_dim + 4]  # quaternion-based representations of the body orientations
+        omega = x_quads[:, self.body_com_dim + 4 : self.body_state_dim]  # body angular velocities
+        pi = x_quads[:, self.body_state_dim : self.N].reshape((-1, self.feet_number, 3))  # feet positions
+        fi = np.where(np.asarray(contacts, dtype = bool)[:, :, None], us.reshape((-1, self.feet_number, 3)), 0.)  # the forces applied to the feet are zero for the swing feet
+        F_total = sum(fi[:, foot] for foot in range(self.feet_number)) + np.array([0., 0., -self.mass * self.g])  # calculate the total forces applied to the quadruped robot
+        T_total = sum((hat_batch(pi[:, foot] - pcom) @ fi[:, foot, :, None])[:, :, 0] for foot in range(self.feet_number))  # calculate the total torques applied to the quadruped robot
+        pcom_ddot = F_total / self.mass  # calculate the center of mass accelerations (body accelerations)
+        q_dot = (1/2 * L_matrix_batch(q) @ np.concatenate([np.zeros((len(q), 1)), omega], axis = 1)[:, :, None])[:, :, 0]  # calculate the quaternion derivatives
+        Rw = q_to_R_batch(q)  # rotation matrices of the body orientations
+        omega_dot = (self.inverse_inertia() @ (np.swapaxes(Rw, 1, 2) @ T_total[:, :, None] - hat_batch(omega) @ (self.I @ omega[:, :, None])))[:, :, 0]  # calculate the body angular accelerations
+        return np.concatenate((pcom_dot, pcom_ddot, q_dot, omega_dot), axis = 1)  # return the body state derivatives (K, body_state_dim)
 
-            # find the gaits sequence / feet phases for each foot and each time step of the simulation
-            self.K = round(self.current_total_time / self.dt) + 1  # the total number of the knot points
-            self.feet_phases = np.zeros((self.feet_number, self.K), dtype = bool)  # the gaits sequence / feet phases for each foot and each time step of the simulation
-            current_gaits_number = int(self.current_total_time / self.current_gaits_period)  # the current number of gaits (per foot)
-            time_steps_per_gait = int(self.current_gaits_period / self.dt)  # the number of time steps per gait
-            for foot in range(self.feet_number):
-                for gait in range(current_gaits_number):
-                    for k in range(time_steps_per_gait):
-                        self.feet_phases[foot][gait * time_steps_per_gait + k] = self.gaits_sequence[foot][gait].gait_button_is_pressed  # if the gait button is pressed, the foot is in contact with the ground, otherwise it is in swing
-
-            # find the indexes of the contact and the swing feet phases, and the number of the feet equality and inequality constraints
-            contact_indexes = [[index for index, phase in enumerate(self.feet_phases[foot]) if phase == True] for foot in range(self.feet_number)]  # the indexes of the contact feet phases
-            swing_indexes = [[index for index, phase in enumerate(self.feet_phases[foot]) if phase == False] for foot in range(self.feet_number)]  # the indexes of the swing feet phases
-            fix_feet_dim = 0  # initialize the number of the feet equality constraints to fix the feet positions when the feet are in contact with the ground
-            feet_forces_dim = 0  # initialize the number of the feet inequality constraints to define the friction cones for the feet forces
-            for foot in range(self.feet_number):
-                feet_forces_dim += 4 * len(contact_indexes[foot])  # for every foot and every knot point k in contact phase, there are two friction forces (fx and fy), each of them carrying two inequality constraints
-                for k in range(len(contact_indexes[foot])):
-                    contact_index = contact_indexes[foot][k]
-                    if contact_index < self.K - 1 and self.feet_phases[foot][contact_index + 1] == True:  # if the contact phase is not the last phase and the next phase is also a contact phase
-                        fix_feet_dim += 2  # I care only about the x and y coordinates of the feet positions
-
-            # calculate the total number of the optimization variables, the equality constraints, and the inequality constraints
-            x_dim = self.K * self.N + (self.K - 1) * self.M  # the total number of the optimization variables
-            eq_dim = (self.K - 1) * self.body_state_dim + fix_feet_dim + self.K  # the number of the equality constraints
-            ineq_dim = feet_forces_dim + self.K * (3 * self.feet_number)  # the number of the inequality constraints
-
-            # initialize the optimization variables (not considering the body translational and angular velocities)
-            xopt0 = np.zeros((x_dim, 1))  # the initial guess for the optimization variables
-            dq = (L_matrix(initial_q_body).T @ final_q_body).reshape((4, 1))  # the quaternion-based representation of the body orientation difference between the initial and the target states
-            if np.abs(dq[0]) != 0.: phi_total = dq[1:] / dq[0]  # phi_total is the 3D rotation difference vector between the initial and the target states
-            else: phi_total = dq[1:]
-            for k in range(self.K):
-                xopt0[k * self.N : k * self.N + self.body_position_dim] = x0[:self.body_position_dim] + (x_target[:self.body_position_dim] - x0[:self.body_position_dim]) * k / (self.K - 1)  # the initial guess for the body positions (center of mass) during time
-                xopt0[k * self.N + self.body_state_dim : (k + 1)* self.N] = x0[self.body_state_dim : self.N] + (x_target[self.body_state_dim : self.N] - x0[self.body_state_dim : self.N]) * k / (self.K - 1)  # the initial guess for the feet positions during time
-                phik = phi_total * k / (self.K - 1)  # the initial guess for the 3D rotation difference vector between the state at time k and the initial state
-                dqk = np.ones((4, 1)); dqk[1:] = phik; dqk = dqk / np.linalg.norm(dqk)  # dqk is the quaternion-based representation of the body orientation difference between the state at time k and the initial state
-                xopt0[k * self.N + self.body_com_dim : k * self.N + self.body_com_dim + 4] = L_matrix(initial_q_body) @ dqk  # the initial guess for the quaternion-based representation of the body orientation during time
-
-            # define the bounds of the optimization variables
-            opt_lb = x_dim * [None]  # initialize the lower bounds of the optimization variables
-            opt_ub = x_dim * [None]  # initialize the upper bounds of the optimization variables
-            for k in range(self.N):  # the bounds of the state optimization variables for the initial state
-                opt_lb[k] = float(x0[k])
-                opt_ub[k] = float(x0[k])
-            for k in list(range(self.body_state_dim - 3)) + list(range(self.body_state_dim, self.N)):  # the bounds of the state optimization variables for the target state (not considering the body angular velocity)
-                opt_lb[(self.K - 1) * self.N + k] = float(x_target[k])
-                opt_ub[(self.K - 1) * self.N + k] = float(x_target[k])
-            for foot in range(self.feet_number):  # the bounds of the state optimization variables for the z component of the feet positions
-                for k in range(self.K):  # the z component of the current foot position at the current knot point must be non-negative (the foot can not penetrate the ground)
-                    opt_lb[k * self.N + self.body_state_dim + 3 * foot + 2] = 0.
-            for foot in range(self.feet_number):  # the bounds of the state optimization variables for the feet positions when the feet are in contact with the ground
-                for k in range(len(contact_indexes[foot])):  # z component of the current foot position at the current knot point must be zero (the foot is in contact with the ground)
-                    contact_index = contact_indexes[foot][k]
-                    opt_lb[contact_index * self.N + self.body_state_dim + 3 * foot + 2] = 0.
-                    opt_ub[contact_index * self.N + self.body_state_dim + 3 * foot + 2] = 0.
-            for k in range(self.K - 1):  # the bounds of the control input optimization variables for the feet forces
-                for force in range(self.M):
-                    opt_lb[self.K * self.N + k * self.M + force] = float(-10 * self.mass * self.g)
-                    opt_ub[self.K * self.N + k * self.M + force] = float(10 * self.mass * self.g)
-            for foot in range(self.feet_number):  # the bounds of the control input optimization variables for the contact feet forces
-                for k in range(len(contact_indexes[foot])):
-                    contact_index = contact_indexes[foot][k]
-                    opt_lb[self.K * self.N + contact_index * self.M + 3 * foot + 2] = 0.  # z component of the force applied to the current foot at the current knot point must be non-negative (the ground pushes the foot upwards)
-            for foot in range(self.feet_number):  # the bounds of the control input optimization variables for the swing feet forces
-                for k in range(len(swing_indexes[foot])):
-                    swing_index = swing_indexes[foot][k]
-                    if swing_index != self.K - 1:
-                        for force in range(3 * foot, 3 * (foot + 1)):  # the forces applied to the swing feet are zero
-                            opt_lb[self.K * self.N + swing_index * self.M + force] = 0.
-                            opt_ub[self.K * self.N + swing_index * self.M + force] = 0.
-            
-            # define the bounds of the constraints
-            c_lb = (eq_dim + ineq_dim) * [0.]  # initialize the lower bounds of the constraints
-            c_ub = (eq_dim + ineq_dim) * [0.]  # initialize the upper bounds of the constraints
-            c_index = eq_dim  # initialize the index of the inequality constraints
-            for k in range(feet_forces_dim):  # the bounds of the inequality constraints for the feet forces (the friction cones)
-                c_lb[c_index + k] = None
-                c_ub[c_index + k] = 0.
-            c_index = eq_dim + feet_forces_dim  # the index of the constraints for the feet positions
-            for foot in range(self.feet_number):  # the bounds of the constraints for the feet positions with respect to the body positions (center of mass)
-                for k in range(self.K):
-                    c_lb[c_index + k * (3 * self.feet_number) + 3 * foot] = float(self.legs_bounds_x[foot][0])
-                    c_ub[c_index + k * (3 * self.feet_number) + 3 * foot] = float(self.legs_bounds_x[foot][1])
-                    c_lb[c_index + k * (3 * self.feet_number) + 3 * foot + 1] = float(self.legs_bounds_y[foot][0])
-                    c_ub[c_index + k * (3 * self.feet_number) + 3 * foot + 1] = float(self.legs_bounds_y[foot][1])
-                    c_lb[c_index + k * (3 * self.feet_number) + 3 * foot + 2] = float(self.legs_bounds_z[foot][0])
-                    c_ub[c_index + k * (3 * self.feet_number) + 3 * foot + 2] = float(self.legs_bounds_z[foot][1])
-            
-            # use the cyipopt library to solve the trajectory optimization problem
-            nltopt_solver = cyipopt.Problem(n = x_dim, m = eq_dim + ineq_dim, problem_obj = trajectory_optimization(self.quadruped_dynamics, self.quadruped_dynamics_dxquad, self.quadruped_dynamics_du, x0, x_target, self.K, self.dt, self.feet_phases), lb = opt_lb, ub = opt_ub, cl = c_lb, cu = c_ub)
-            nltopt_solver.add_option("jacobian_approximation", "exact")  # or "finite-difference-values"
-            nltopt_solver.add_option("print_level", 3)
-            nltopt_solver.add_option("nlp_scaling_method", "none")
-            nltopt_solver.add_option("tol", 1e-5)  # the tolerance for the convergence of the optimization algorithm
-            nltopt_solver.add_option("max_iter", 100)  # the maximum number of iterations for the optimization algorithm
-            xopt, info = nltopt_solver.solve(xopt0)  # solve the trajectory optimization problem and save the states that follow the optimal trajectory and obey the constraints
-            self.trajectory_states_list = [xopt[k * self.N : (k + 1) * self.N] for k in range(self.K)]  # the states of the optimal trajectory
-            self.inputs_list = [xopt[self.K * self.N + k * self.M : self.K * self.N + (k + 1) * self.M] for k in range(self.K - 1)]  # the control inputs of the optimal trajectory
-            
-            # inform the user about the optimization status
-            if info['status'] == 0:
-                ms.showinfo("Optimization Info", f"Successful optimization!")
-            else:
-                ms.showinfo("Optimization Info", f"The maximum number of iterations done. Unsuccessful optimization!")
-            
-            # # print some of the important states of the optimal trajectory
-            # for state in self.trajectory_states_list:
-            #     com_pos = state[:self.body_position_dim]
-            #     q = state[self.body_com_dim : self.body_com_dim + 4]
-            #     feet_pos = state[self.body_state_dim : self.N]
-            #     print(f"com pos: {com_pos}")
-            #     print(f"q norm: {np.linalg.norm(q)}")
-            #     print(f"feet pos: {feet_pos}")
-            
-            # move the quadruped robot from the initial state to the final state
-            self.quadruped_traj_com_locations = []
-            self.quadruped_traj_body_orientations = []
-            self.quadruped_traj_feet_positions = []
-            for state in self.trajectory_states_list:
-                self.quadruped_traj_com_locations.append(state[:self.body_position_dim])
-                self.quadruped_traj_body_orientations.append(state[self.body_com_dim : self.body_com_dim + 4])
-                self.quadruped_traj_feet_positions.append(state[self.body_state_dim : self.N])
-            self.trajectory_steps_counter = 0
-            self.show_quadruped_trajectory()
+    # the partial derivatives of the quadruped robot dynamics with respect to the states, for many knot points at once, returns (K, body_state_dim, N)
+    def quadruped_dynamics_dxquad_batch(self, x_quads, us, contacts):
+        pcom = x_quads[:, : self.body_position_dim]  # center of mass positions (body positions)
+        q = x_quads[:, self.body_com_dim : self.body_com_dim + 4]  # quaternion-based representations of the body orientations
+        omega = x_quads[:, self.body_com_dim + 4 : self.body_state_dim]  # body angular velocities
+        pi = x_quads[:, self.body_state_dim : self.N].reshape((-1, self.feet_number, 3))  # feet positions
+        fi = np.where(np.asarray(contacts, dtype = bool)[:, :, None], us.reshape((-1, self.feet_number, 3)), 0.)  # the forces applied to the feet are zero for the swing feet
+        hat_fi = hat_batch(fi)  # the skew-symmetric matrices of the feet forces, (K, feet_number, 3, 3)
+        T_total = np.einsum("kfij,kfj->ki", hat_batch(pi - pcom[:, None, :]), fi)  # calculate the total torques applied to the quadruped robot
+        inv_I_RwT = np.einsum("ij,kjl->kil", self.inverse_inertia(), np.swapaxes(q_to_R_batch(q), 1, 2))  # the inverse inertia tensor times the transposed rotation matrices of the body orientations
+        body_dyn_dxquad = np.zeros((len(x_quads), self.body_state_dim, self.N))  # initialize the partial derivatives of the quadruped robot body dynamics with respect to the states
+        # the partial derivative of the body velocity with respect to the body position
+        body_dyn_dxquad[:, : self.body_position_dim, self.body_position_dim : self.body_com_dim] = np.eye(self.body_position_dim)
+        body_dyn_dxquad[:, self.body_com_dim, self.body_com_dim + 1 : self.body_com_dim + 4] = -1/2 * omega  # the partial derivative of the quaternion derivative with respect to the quaternion
+        body_dyn_dxquad[:, self.body_com_dim + 1 : self.body_com_dim + 4, self.body_com_dim] = 1/2 * omega
+        body_dyn_dxquad[:, self.body_com_dim + 1 : self.body_com_dim + 4, self.body_com_dim + 1 : self.body_com_dim + 4] = -1/2 * hat_batch(omega)
+        # the partial derivative of the quaternion derivative with respect to the body angular velocity
+        body_dyn_dxquad[:, self.body_com_dim : self.body_com_dim + 4, self.body_com_dim + 4 : self.body_state_dim] = 1/2 * L_matrix_batch(q)[:, :, 1:]
+        # the partial derivative of the body angular acceleration with respect to the body position
+        body_dyn_dxquad[:, self.body_com_dim + 4 : self.body_state_dim, : self.body_position_dim] = np.einsum("kij,kjl->kil", inv_I_RwT, hat_fi.sum(axis = 1))
+        # the partial derivative of the body angular acceleration with respect to the quaternion
+        body_dyn_dxquad[:, self.body_com_dim + 4 : self.body_state_dim, self.body_com_dim : self.body_com_dim + 4] = np.einsum("ij,kjl->kil", self.inverse_inertia(), dRTt_dq_batch(q, T_total))
+        # the partial derivative of the body angular acceleration with respect to the body angular velocity
+        body_dyn_dxquad[:, self.body_com_dim + 4 : self.body_state_dim,
+                        self.body_com_dim + 4 : self.body_state_dim] = np.einsum("ij,kjl->kil", self.inverse_inertia(),
+                                                                                 hat_batch(omega @ self.I.T) - np.einsum("kij,jl->kil", hat_batch(omega), self.I))
+        # the partial derivative of the body angular acceleration with respect to each foot position
+        body_dyn_dxquad[:, self.body_com_dim + 4 : self.body_state_dim, self.body_state_dim : self.N] = -np.einsum("kij,kfjl->kifl", inv_I_RwT, hat_fi).reshape((-1, 3, self.feet_state_dim))
+        return body_dyn_dxquad  # return the partial derivatives of the body dynamics with respect to the states
+    # the partial derivatives of the quadruped robot dynamics with respect to the control inputs, for many knot points at once, returns (K, body_state_dim, M)
+    def quadruped_dynamics_du_batch(self, x_quads, us, contacts):
+        pcom = x_quads[:, : self.body_position_dim]  # center of mass positions (body positions)
+        q = x_quads[:, self.body_com_dim : self.body_com_dim + 4]  # quaternion-based representations of the body orientations
+        pi = x_quads[:, self.body_state_dim : self.N].reshape((-1, self.feet_number, 3))  # feet positions
+        inv_I_RwT = np.einsum("ij,kjl->kil", self.inverse_inertia(), np.swapaxes(q_to_R_batch(q), 1, 2))  # the inverse inertia tensor times the transposed rotation matrices of the body orientations
+        body_dyn_du = np.zeros((len(x_quads), self.body_state_dim, self.M))  # initialize the partial derivatives of the quadruped robot body dynamics with respect to the control inputs
+        # the partial derivative of the body acceleration with respect to the force applied to each foot
+        body_dyn_du[:, self.body_position_dim : self.body_com_dim] = np.einsum("ij,kf->kifj", np.eye(3) / self.mass, np.asarray(contacts, dtype = float)).reshape((-1, 3, self.M))
+        # the partial derivative of the body angular acceleration with respect to the force applied to each foot
+        body_dyn_du[:, self.body_com_dim + 4 : self.body_state_dim] = np.einsum("kij,kfjl->kifl", inv_I_RwT, hat_batch(pi - pcom[:, None, :])).reshape((-1, 3, self.M))
+        return body_dyn_du  # return the partial derivatives of the body dynamics with respect to the control inputs
+    # the second derivatives of the weighted body dynamics weights^T * f(x_quad, u) with respect to (x_quad, u), for many knot points at once, weights is (K, body_state_dim),
+    # returns (K, N + M, N + M)
+    def quadruped_dynamics_hessian_batch(self, x_quads, us, contacts, weights):
+        pcom = x_quads[:, : self.body_position_dim]  # center of mass positions (body positions)
+        q = x_quads[:, self.body_com_dim : self.body_com_dim + 4]  # quaternion-based representations of the body orientations
+        pi = x_quads[:, self.body_state_dim : self.N].reshape((-1, self.feet_number, 3))  # feet positions
+        contacts = np.asarray(contacts, dtype = bool)  # the contacts of the feet
+        fi = np.where(contacts[:, :, None], us.reshape((-1, self.feet_number, 3)), 0.)  # the forces applied to the feet are zero for the swing feet
+        ri = pi - pcom[:, None, :]  # the feet positions relative to the center of mass
+        T_total = np.einsum("kfij,kfj->ki", hat_batch(ri), fi)  # the total torques applied to the quadruped robot
+        w_q = weights[:, self.body_com_dim : self.body_com_dim + 4]  # the weights of the quaternion derivatives
+        a = weights[:, self.body_com_dim + 4 : self.body_state_dim] @ self.inverse_inertia()  # the weights of the body angular accelerations, moved before the inverse inertia tensor
+        b = np.einsum("kij,kj->ki", q_to_R_batch(q), a)  # the same weights rotated to the world frame, b = R * a
+        iq = slice(self.body_com_dim, self.body_com_dim + 4)  # the quaternion, body angular velocity and body position variables
+        iw = slice(self.body_com_dim + 4, self.body_state_dim)
+        ip = slice(0, self.body_position_dim)
+        H = np.zeros((len(x_quads), self.N + self.M, self.N + self.M))  # initialize the second derivatives
+        # the off-diagonal blocks, filled once and mirrored below
+        H[:, iq, iw] = 1/2 * np.einsum("ki,jil->kjl", w_q, L_matrix_batch(np.eye(4))[:, :, 1:])  # the quaternion derivative is bilinear in the quaternion and the body angular velocity
+        # the derivative of the gradient of a^T * R^T * T with respect to the quaternion, per component of the total torque T
+        Gq = np.einsum("ki,kmiz->kzm", a, dRTt_dq_batch(q[:, None, :], np.eye(3)[None]))
+        hat_fi = hat_batch(fi); hat_b = hat_batch(b)
+        H[:, iq, ip] = Gq @ hat_fi.sum(axis = 1)  # the quaternion with the body position, through the total torque
+        for foot in range(self.feet_number):
+            i_foot = slice(self.body_state_dim + 3 * foot, self.body_state_dim + 3 * (foot + 1))  # the position and force variables of the current foot
+            i_force = slice(self.N + 3 * foot, self.N + 3 * (foot + 1))
+            H[:, iq, i_foot] = -Gq @ hat_fi[:, foot]  # the quaternion with the foot position
+            H[:, iq, i_force] = contacts[:, foot, None, None] * (Gq @ hat_batch(ri[:, foot]))  # the quaternion with the force applied to the foot
+            H[:, i_force, i_foot] = contacts[:, foot, None, None] * hat_b  # the force applied to the foot with the foot position, b^T * (r x f) is bilinear in r and f
+            H[:, i_force, ip] = -(contacts[:, foot, None, None] * hat_b)  # the force applied to the foot with the body position
+        H += np.swapaxes(H, 1, 2)  # mirror the off-diagonal blocks
+        # the diagonal blocks
+        H[:, iq, iq] = np.einsum("ki,kjim->kmj", a, dRTt_dq_batch(np.eye(4)[None], T_total[:, None, :]))  # a^T * R^T(q) * T is quadratic in the quaternion
+        I_hat_a = np.einsum("ij,kjl->kil", self.I, hat_batch(a))
+        H[:, iw, iw] = -I_hat_a - np.swapaxes(I_hat_a, 1, 2)  # the gyroscopic term -a^T * (omega x I * omega) is quadratic in the body angular velocity
+        return H  # return the second derivatives of the weighted body dynamics
+    def inverse_inertia(self):  # the inverse of the inertia tensor, calculated again only when the inertia tensor has changed
+        if not np.array_equal(self.I, self.inv_I_source):
+            self.inv_I = np.linalg.inv(self.I); self.inv_I_source = np.copy(self.I)
+        return self.inv_I
+
+# this class holds the generated kernels of the body dynamics, of their jacobians and of the second derivatives of their weighted sum, they are derived symbolically once (with
+# sympy), written to disk as a python module of flattened common-subexpression-eliminated code and compiled with numba when it is installed
+class dynamics_kernels():
+    version = 2  # the version of the generated code, the kernels of another version are generated again
+    directory = os.path.join(os.path.expanduser("~"), ".quadruped_robot_api_kernels")  # the default directory of the generated module
+    names = ["dynamics", "dynamics_dx", "dynamics_du", "hessian"]  # the kernels of the module
+    vectorized_min_knots = 250  # without numba the vectorized kernels are faster than the numpy functions of the model only from about this number of knot points
+    def __init__(self, module, compiled = True):
+        self.module = module  # the generated module
+        self.compiled = compiled and numba is not None  # the per-knot loops compiled with numba, or else the vectorized numpy kernels
+        # the smallest number of knot points evaluated by the kernels (the numpy functions of the model evaluate the others)
+        self.min_knots = 0 if self.compiled else dynamics_kernels.vectorized_min_knots
+        self.functions = {name: numba.njit(cache = True)(getattr(module, name + "_loop")) if self.compiled else getattr(module, name) for name in dynamics_kernels.names}
+        # the shape of the result of every kernel at a knot point
+        self.shapes = {"dynamics": lambda model: (model.body_state_dim,), "dynamics_dx": lambda model: (model.body_state_dim, model.N),
+                       "dynamics_du": lambda model: (model.body_state_dim, model.M), "hessian": lambda model: (model.N + model.M, model.N + model.M)}
+    def parameters(self, model):  # the parameters of the model used by the kernels, the mass, the gravity, the inertia tensor and its inverse
+        return np.concatenate(([model.mass, model.g], model.I.ravel(), model.inverse_inertia().ravel()))
+    # evaluate the kernel name at many knot points at once, with the same arguments and results as the batch dynamics of the model
+    def evaluate(self, name, model, x_quads, us, contacts, weights = None):
+        x_quads = np.ascontiguousarray(x_quads, dtype = float)  # the kernels write only the nonzero elements
+        result = np.zeros((len(x_quads),) + self.shapes[name](model))
+        arguments = [x_quads, np.ascontiguousarray(us, dtype = float).reshape((len(x_quads), model.M)), np.ascontiguousarray(contacts, dtype = float).reshape((len(x_quads), model.feet_number))]
+        if weights is not None: arguments.append(np.ascontiguousarray(weights, dtype = float).reshape((len(x_quads), model.body_state_dim)))
+        self.functions[name](*arguments, self.parameters(model), result)
+        return result
 
-    def show_quadruped_trajectory(self, event = None):
-        if self.trajectory_steps_counter < self.K:
-            self.simulation_is_running = True
-            self.x_transfer_quadruped_com = self.quadruped_traj_com_locations[self.trajectory_steps_counter][0] - self.center_of_mass[0]
-            self.y_transfer_quadruped_com = self.quadruped_traj_com_locations[self.trajectory_steps_counter][1] - self.center_of_mass[1]
-            self.z_transfer_quadruped_com = self.quadruped_traj_com_locations[self.trajectory_steps_counter][2] - self.center_of_mass[2]
-            self.rotate_quadruped_matrix = q_to_R(self.quadruped_traj_body_orientations[self.trajectory_steps_counter])
-            self.apply_workspace_transformation()
-            self.trajectory_steps_counter += 1
-            self.workspace.after(int(1000 * self.dt / self.simulation_speed), self.show_quadruped_trajectory)
-        else:
-            self.trajectory_steps_counter = 0
-            self.simulation_is_running = False
 
 # this class is used to find the optimal trajectory for the quadruped robot using the IPOPT solver/optimizer
 class trajectory_optimization():
-    def __init__(self, dynamics, dynamics_dx, dynamics_du, x0, x_target, K, dt, feet_phases):
-        self.dynamics, self.dynamics_dx, self.dynamics_du = dynamics, dynamics_dx, dynamics_du  # the dynamics of the quadruped robot and their jacobians 
+    # the weights of the quadratic cost terms, the squared feet forces (in units of the robot weight), their squared rates, the squared body angular velocity and the squared
+    # deviation from the target state, all integrated over time (all zero by default, the pure feasibility problem)
+    default_cost_weights = {"effort": 0., "smoothness": 0., "angular_velocity": 0., "tracking": 0.}
+    # the scaling of the problem given to IPOPT, the factors computed from the model (the characteristic length, force and acceleration of the robot), the IPOPT gradient-based
+    # scaling or none
+    scaling_methods = ["model", "gradient-based", "none"]
+    integrators = ["euler", "trapezoidal", "hermite-simpson", "rk4"]  # the transcriptions of the dynamics between the knot points (the exact Hessian of the Lagrangian is available only for euler)
+    hessian_approximations = ["exact", "limited-memory"]  # the Hessian modes of the solver, the exact sparse Hessian of the Lagrangian or the limited-memory (L-BFGS) approximation
+    bounds_templates = {}  # the bounds templates of the recent solves, keyed by the number of knot points, the contact schedule, the maximum force and the legs bounds
+    bounds_templates_size = 8  # the maximum number of the kept bounds templates
+    bounds_templates_lock = threading.Lock()  # the bounds templates are shared by the problems of all the threads (e.g. the solves of a program that plans in several threads)
+    def __init__(self, dynamics, dynamics_dx, dynamics_du, x0, x_target, K, dt, feet_phases, dynamics_batch = None, dynamics_dx_batch = None, dynamics_du_batch = None,
+                 dynamics_hess_batch = None, verbose = True, progress_queue = None, cancel_event = None, integrator = "euler", profiler = None, cost_weights = None,
+                 force_scale = 1., hessian_approximation = None):
+        if integrator not in trajectory_optimization.integrators: raise ValueError(f"unknown integrator {integrator}, it must be one of {trajectory_optimization.integrators}")
+        self.hessian_approximation = solver_hessian_approximation(integrator, hessian_approximation)  # the Hessian mode of the solver, the hessian callback is used only with the exact Hessian (euler)
+        if integrator != "euler" and dynamics_batch is None: raise ValueError(f"the {integrator} integrator needs the batch dynamics and their jacobians")
+        self.integrator = integrator  # the transcription of the dynamics between the knot points
+        self.verbose = verbose  # print the objective value at every iteration
+        self.progress_queue = progress_queue  # the queue that receives the progress (iteration, objective, inf_pr, inf_du) of every iteration (if not None)
+        self.cancel_event = cancel_event  # the event that stops the solver when it is set (if not None)
+        self.iterations = 0  # the number of the iterations done by the solver
+        self.profiler = profiler  # the solve_profiler that records the dynamics and the iterations (None disables the profiling at no cost), the callbacks are timed by a profiled_problem
+        timed = lambda name, function: function if profiler is None or function is None else profiler.timed(name, function)  # the given dynamics functions are timed when the solve is profiled
+        # the dynamics of the quadruped robot and their jacobians
+        self.dynamics, self.dynamics_dx, self.dynamics_du = timed("dynamics", dynamics), timed("dynamics_dx", dynamics_dx), timed("dynamics_du", dynamics_du)
+        # the dynamics of the quadruped robot for all the knot points at once (if None, the constraints are evaluated knot point by knot point)
+        self.dynamics_batch = timed("dynamics_batch", dynamics_batch)
+        # the jacobians of the dynamics for all the knot points at once (if None, the jacobian is evaluated knot point by knot point)
+        self.dynamics_dx_batch, self.dynamics_du_batch = timed("dynamics_dx_batch", dynamics_dx_batch), timed("dynamics_du_batch", dynamics_du_batch)
+        # the weighted second derivatives of the dynamics for all the knot points at once (needed for the exact Hessian of the Lagrangian)
+        self.dynamics_hess_batch = timed("dynamics_hess_batch", dynamics_hess_batch)
         self.x0 = x0  # the initial state of the quadruped robot
         self.x_target = x_target  # the target state of the quadruped robot
         self.dt = dt  # the time step of the simulation
         self.K = K  # the total number of the knot points
-        self.feet_phases = feet_phases  # the gaits sequence / feet phases for each foot and each time step of the simulation
+        self.feet_phases = np.asarray(feet_phases, dtype = bool)  # the gaits sequence / feet phases for each foot and each time step of the simulation
         self.feet_number = len(self.feet_phases)  # the number of the feet of the quadruped robot
         self.body_state_dim = 13  # the number of the body state variables
         self.body_com_dim = 6  # the number of the body center of mass variables (position and velocity)
@@ -868,38 +1316,263 @@ class trajectory_optimization():
         self.feet_state_dim = 3 * self.feet_number  # the number of the feet state variables
         self.N = self.body_state_dim + self.feet_state_dim  # the total number of the state variables
         self.M = 3 * self.feet_number  # the total number of the control input variables
+        # the state variables that are fixed to the target state at the last knot point (not considering the body angular velocity)
+        self.target_indexes = np.r_[0 : self.body_state_dim - 3, self.body_state_dim : self.N]
+        self.bounds_template_key = self.last_bounds_template = None  # the key and the template of the last bounds of this problem
         
         # find the indexes of the contact and the swing feet phases, and the number of the feet equality and inequality constraints
-        self.contact_indexes = [[index for index, phase in enumerate(self.feet_phases[foot]) if phase == True] for foot in range(self.feet_number)]  # the indexes of the contact feet phases
-        self.swing_indexes = [[index for index, phase in enumerate(self.feet_phases[foot]) if phase == False] for foot in range(self.feet_number)]  # the indexes of the swing feet phases
-        self.fix_feet_dim = 0  # initialize the number of the feet equality constraints to fix the feet positions when the feet are in contact with the ground
-        self.feet_forces_dim = 0  # initialize the number of the feet inequality constraints to define the friction cones for the feet forces
-        for foot in range(self.feet_number):
-            self.feet_forces_dim += 4 * len(self.contact_indexes[foot])  # for every foot and every knot point k in contact phase, there are two friction forces (fx and fy), each of them carrying two inequality constraints
-            for k in range(len(self.contact_indexes[foot])):
-                contact_index = self.contact_indexes[foot][k]
-                if contact_index < self.K - 1 and self.feet_phases[foot][contact_index + 1]:  # if the contact phase is not the last phase and the next phase is also a contact phase
-                    self.fix_feet_dim += 2  # I care only about the x and y coordinates of the feet positions
+        self.contact_indexes = [np.flatnonzero(self.feet_phases[foot]) for foot in range(self.feet_number)]  # the indexes of the contact feet phases
+        self.swing_indexes = [np.flatnonzero(~self.feet_phases[foot]) for foot in range(self.feet_number)]  # the indexes of the swing feet phases
+        self.fix_feet_mask = self.feet_phases[:, :-1] & self.feet_phases[:, 1:]  # the contact phases (foot, knot point) that are not the last phase and whose next phase is also a contact phase
+        # the number of the feet equality constraints to fix the feet positions (only the x and y coordinates) when the feet are in contact with the ground
+        self.fix_feet_dim = 2 * int(np.count_nonzero(self.fix_feet_mask))
+        # the number of the feet inequality constraints, for every foot and every knot point k in contact phase (but the last knot point, which has no control input) there are two
+        # friction forces (fx and fy), each of them carrying two inequality constraints
+        self.feet_forces_dim = 4 * int(np.count_nonzero(self.feet_phases[:, :-1]))
 
         # define the dimensions of the optimization variables and the equality and inequality constraints
         self.x_dim = self.K * self.N + (self.K - 1) * self.M  # the size of the optimization variables
         self.eq_dim = (self.K - 1) * self.body_state_dim + self.fix_feet_dim + self.K  # the number of the equality constraints
         self.ineq_dim = self.feet_forces_dim + self.K * (3 * self.feet_number)  # the number of the inequality constraints
+
+        # the weights of the cost terms, the feet forces are divided by force_scale (the weight of the robot) so that the default weights suit any robot
+        self.cost_weights = full_cost_weights(cost_weights)  # the weights of all the cost terms
+        self.cost_enabled = any(self.cost_weights.values())  # a zero cost gives the pure feasibility problem
+        self.input_cost = self.cost_weights["effort"] * self.dt / force_scale**2  # the weight of the squared feet forces of every knot point
+        # the weight of the squared changes of the feet forces between consecutive knot points (the squared force rates integrated over dt)
+        self.rate_cost = self.cost_weights["smoothness"] / (self.dt * force_scale**2)
         
         # variables for the contacts and the friction cones
         self.mu = 1.0  # the friction coefficient
         self.tx = np.array([1., 0., 0.]).reshape((3, 1))  # the tangent vector of the contact plane of the friction cone along the x-axis
         self.ty = np.array([0., 1., 0.]).reshape((3, 1))  # the tangent vector of the contact plane of the friction cone along the y-axis
         self.nz = np.array([0., 0., 1.]).reshape((3, 1))  # the normal vector of the contact plane
-        
+
+        # the pairs (foot, knot point) of the feet equality constraints and of the friction cones inequality constraints, in the order the constraints are stacked
+        self.fix_feet_pairs = np.argwhere(self.fix_feet_mask)  # np.argwhere returns the pairs foot by foot, in the order of the knot points
+        self.friction_pairs = np.argwhere(self.feet_phases[:, :-1])  # the last knot point has no control input (a window of the receding horizon can end in a contact phase)
+        # the nonzero elements of the Jacobian blocks of the dynamics equality constraints at every knot point k (the euler integration identity plus the non zero partial
+        # derivatives of the body dynamics)
+        self.dyn_fx_mask = np.zeros((self.body_state_dim, self.N), dtype = bool)  # the nonzero partial derivatives of the body dynamics with respect to the state
+        self.dyn_fx_mask[: self.body_position_dim, self.body_position_dim : self.body_com_dim] = True  # the body position derivative with respect to the body velocity
+        # the quaternion derivative with respect to the quaternion and the body angular velocity
+        self.dyn_fx_mask[self.body_com_dim : self.body_com_dim + 4, self.body_com_dim : self.body_state_dim] = True
+        self.dyn_fx_mask[self.body_com_dim + 4 : self.body_state_dim, : self.body_position_dim] = True  # the body angular acceleration with respect to the body position
+        # the body angular acceleration with respect to the quaternion, the body angular velocity and the feet positions
+        self.dyn_fx_mask[self.body_com_dim + 4 : self.body_state_dim, self.body_com_dim :] = True
+        self.dyn_fu_mask = np.zeros((self.body_state_dim, self.M), dtype = bool)  # the nonzero partial derivatives of the body dynamics with respect to the control input
+        for foot in range(self.feet_number):  # the body acceleration with respect to the force applied to each foot
+            self.dyn_fu_mask[self.body_position_dim : self.body_com_dim, 3 * foot : 3 * (foot + 1)] = np.eye(3, dtype = bool)
+        self.dyn_fu_mask[self.body_com_dim + 4 : self.body_state_dim, :] = True  # the body angular acceleration with respect to the forces applied to the feet
+        # the nonzero elements of the Jacobian blocks with respect to the state xk0, the state xk1 and the control input uk
+        self.dyn_dx_mask, self.dyn_dx1_mask, self.dyn_du_mask = self.integrator_masks()
+        self.jac_rows, self.jac_cols = self.jacobian_sparsity_structure()  # the row and column indexes of the nonzero elements of the Jacobian of the constraints, declared once for the solver
+        self.jac_nnz = len(self.jac_rows)  # the number of the nonzero elements of the Jacobian of the constraints
+        # the nonzero elements of the Hessian of the Lagrangian, which is block-diagonal per knot point k over the variables (xk, uk)
+        iq = slice(self.body_com_dim, self.body_com_dim + 4)
+        iw = slice(self.body_com_dim + 4, self.body_state_dim)
+        ip = slice(0, self.body_position_dim)
+        i_feet = slice(self.body_state_dim, self.N)
+        i_forces = slice(self.N, self.N + self.M)
+        hess_mask = np.zeros((self.N + self.M, self.N + self.M), dtype = bool)  # the nonzero elements of the Hessian block of every knot point k
+        for block in [(iq, iq), (iq, iw), (iw, iw), (iq, ip), (iq, i_feet), (iq, i_forces), (ip, i_forces)]:
+            hess_mask[block] = True
+            hess_mask[block[::-1]] = True
+        for foot in range(self.feet_number):
+            hess_mask[self.body_state_dim + 3 * foot : self.body_state_dim + 3 * (foot + 1), self.N + 3 * foot : self.N + 3 * (foot + 1)] = True
+            hess_mask[self.N + 3 * foot : self.N + 3 * (foot + 1), self.body_state_dim + 3 * foot : self.body_state_dim + 3 * (foot + 1)] = True
+        if self.cost_enabled:  # the quadratic cost terms are diagonal in every block, the coupling of the forces of consecutive knot points is added to the structure
+            hess_mask[np.diag_indices(self.N + self.M)] = True
+        self.hess_mask = np.tril(hess_mask)  # only the lower triangle is given to the solver
+        self.hess_mask_last = self.hess_mask[: self.N, : self.N]  # the last knot point has no control input
+        self.hess_rows, self.hess_cols = self.hessian_sparsity_structure()  # the row and column indexes of the nonzero elements of the Hessian of the Lagrangian, declared once for the solver
+
+    def initial_guess(self):  # the initial guess for the optimization variables, the states of initial_guess_states and zero control inputs
+        xopt0 = np.zeros((self.x_dim, 1))  # the initial guess for the optimization variables
+        xopt0[: self.K * self.N, 0] = initial_guess_states(self.x0, self.x_target, self.K, self.N).ravel()
+        return xopt0  # return the initial guess
+
+    # the bounds of the optimization variables (opt_lb, opt_ub) and of the constraints (c_lb, c_ub), max_force bounds every foot force component, the infinite bounds are -inf/inf
+    def bounds(self, max_force, legs_bounds_x, legs_bounds_y, legs_bounds_z):
+        # the bounds template depends only on these, not on the initial and the target states
+        key = (self.K, self.feet_phases.tobytes(), float(max_force), np.asarray([legs_bounds_x, legs_bounds_y, legs_bounds_z], dtype = float).tobytes())
+        if self.bounds_template_key == key: template = self.last_bounds_template  # the same problem solved again (e.g. a receding horizon window)
+        else:
+            with trajectory_optimization.bounds_templates_lock:
+                template = trajectory_optimization.bounds_templates.pop(key, None)
+            if template is None:  # built outside the lock, the templates are never modified after they are built
+                template = self.bounds_template(max_force, legs_bounds_x, legs_bounds_y, legs_bounds_z)
+            with trajectory_optimization.bounds_templates_lock:
+                trajectory_optimization.bounds_templates[key] = template  # the most recently used template is the last one
+                while len(trajectory_optimization.bounds_templates) > trajectory_optimization.bounds_templates_size:
+                    trajectory_optimization.bounds_templates.pop(next(iter(trajectory_optimization.bounds_templates)))  # drop the least recently used template
+            self.bounds_template_key, self.last_bounds_template = key, template
+        opt_lb, opt_ub, c_lb, c_ub = [np.copy(bound) for bound in template]  # the solver gets its own copies
+        X_lb = opt_lb[: self.K * self.N].reshape((self.K, self.N))  # views of the bounds of the states (K, N)
+        X_ub = opt_ub[: self.K * self.N].reshape((self.K, self.N))
+        X_lb[0] = X_ub[0] = self.x0[:, 0]  # the bounds of the state optimization variables for the initial state
+        X_lb[-1, self.target_indexes] = X_ub[-1, self.target_indexes] = self.x_target[self.target_indexes, 0]  # the bounds of the state optimization variables for the target state
+        feet_z = self.body_state_dim + 3 * np.arange(self.feet_number) + 2  # the z components of the feet positions, the initial and the final knot points
+        ends = [0, self.K - 1]
+        X_lb[np.ix_(ends, feet_z)] = 0.  # the z component of the feet positions must be non-negative, and zero in contact, also at the initial and the final knot points
+        X_ub[np.ix_(ends, feet_z)] = np.where(self.feet_phases[:, ends].T, 0., X_ub[np.ix_(ends, feet_z)])
+        return opt_lb, opt_ub, c_lb, c_ub  # return the bounds
+    # the scaling factors of the optimization variables (x_dim,) and of the constraints (eq_dim + ineq_dim,) for the characteristic length (the body size), force (the weight) and
+    # acceleration (the gravity) of the robot, so that the scaled variables and constraints are of order one
+    def scaling(self, length, force, g):
+        velocity, angular_velocity = np.sqrt(g * length), np.sqrt(g / length)  # the characteristic velocities of a pendulum of the body size
+        # the time step dt is not used, the dynamics defects x_k+1 - x_k - f(x_k, u_k) * dt are differences of states and are scaled as the states, and the velocities of the
+        # robot are set by its size and the gravity, not by dt (the scales length / dt or g * dt solve in as many or more iterations)
+        # the scaling factor of every state variable
+        state = np.concatenate((np.full(self.body_position_dim, 1 / length), np.full(self.body_com_dim - self.body_position_dim, 1 / velocity), np.ones(4),
+                                np.full(3, 1 / angular_velocity), np.full(self.feet_state_dim, 1 / length)))
+        x_scaling = np.concatenate((np.tile(state, self.K), np.full((self.K - 1) * self.M, 1 / force)))
+        # every dynamics constraint is scaled as its state variable, so the scaled identity blocks stay identities
+        g_scaling = np.concatenate((np.tile(state[: self.body_state_dim], self.K - 1), np.full(self.fix_feet_dim, 1 / length), np.ones(self.K),
+                                    np.full(self.feet_forces_dim, 1 / force), np.full(self.K * self.feet_state_dim, 1 / length)))
+        return x_scaling, g_scaling
+    def bounds_template(self, max_force, legs_bounds_x, legs_bounds_y, legs_bounds_z):  # the bounds that do not depend on the initial and the target states, built with array assignments
+        # define the bounds of the optimization variables
+        opt_lb = np.full(self.x_dim, -np.inf)  # initialize the bounds of the optimization variables
+        opt_ub = np.full(self.x_dim, np.inf)
+        X_lb = opt_lb[: self.K * self.N].reshape((self.K, self.N))  # views of the bounds of the states (K, N)
+        X_ub = opt_ub[: self.K * self.N].reshape((self.K, self.N))
+        U_lb = opt_lb[self.K * self.N :].reshape((self.K - 1, self.feet_number, 3))  # views of the bounds of the control inputs (K - 1, feet, 3)
+        U_ub = opt_ub[self.K * self.N :].reshape((self.K - 1, self.feet_number, 3))
+        feet_z = self.body_state_dim + 3 * np.arange(self.feet_number) + 2  # the z components of the feet positions
+        X_lb[:, feet_z] = 0.  # the z component of the feet positions must be non-negative (the feet can not penetrate the ground)
+        X_ub[:, feet_z] = np.where(self.feet_phases.T, 0., np.inf)  # the z component of the feet positions must be zero when the feet are in contact with the ground
+        U_lb[:] = -max_force; U_ub[:] = max_force  # the bounds of the feet forces
+        contacts = self.feet_phases[:, : self.K - 1].T  # the contact phases of the knot points with control inputs (K - 1, feet)
+        U_lb[..., 2][contacts] = 0.  # the z component of the forces applied to the contact feet must be non-negative (the ground pushes the feet upwards)
+        U_lb[~contacts] = 0.; U_ub[~contacts] = 0.  # the forces applied to the swing feet are zero
+        # define the bounds of the constraints
+        c_lb = np.zeros(self.eq_dim + self.ineq_dim)  # the equality constraints are zero
+        c_ub = np.zeros(self.eq_dim + self.ineq_dim)
+        c_lb[self.eq_dim : self.eq_dim + self.feet_forces_dim] = -np.inf  # the inequality constraints for the feet forces (the friction cones) are non-positive
+        legs_bounds = np.asarray([legs_bounds_x, legs_bounds_y, legs_bounds_z], dtype = float)  # (3, feet, 2)
+        # the bounds of the constraints for the feet positions with respect to the body positions (center of mass), (x, y, z) for every foot at every knot point
+        c_lb[self.eq_dim + self.feet_forces_dim :] = np.tile(legs_bounds[..., 0].T.ravel(), self.K)
+        c_ub[self.eq_dim + self.feet_forces_dim :] = np.tile(legs_bounds[..., 1].T.ravel(), self.K)
+        return opt_lb, opt_ub, c_lb, c_ub  # return the template of the bounds
+
     def objective(self, x):  # define the objective/cost function
-        return 0.  # return the objective/cost function
+        if not self.cost_enabled: return 0.
+        x = np.ravel(x)  # the states and the control inputs at all the knot points
+        X = x[: self.K * self.N].reshape((self.K, self.N))
+        U = x[self.K * self.N :].reshape((self.K - 1, self.M))
+        state_weights, reference = self.state_cost_weights()
+        return float(np.sum(state_weights * (X - reference)**2) + self.input_cost * np.sum(U**2) + self.rate_cost * np.sum(np.diff(U, axis = 0)**2))  # return the objective/cost function
 
     def gradient(self, x):  # compute the gradient of the objective/cost function
-        grad = np.zeros((self.x_dim, 1))
+        grad = np.zeros(self.x_dim)
+        if not self.cost_enabled: return grad
+        x = np.ravel(x)
+        X = x[: self.K * self.N].reshape((self.K, self.N))
+        U = x[self.K * self.N :].reshape((self.K - 1, self.M))
+        state_weights, reference = self.state_cost_weights()
+        grad[: self.K * self.N] = (2 * state_weights * (X - reference)).ravel()
+        dU = 2 * self.input_cost * U  # the effort and the smoothness terms
+        rate = 2 * self.rate_cost * np.diff(U, axis = 0)
+        dU[1:] += rate; dU[:-1] -= rate
+        grad[self.K * self.N :] = dU.ravel()
         return grad  # return the gradient of the objective/cost function
 
+    # the weight of the squared deviation of every state variable (N,) from its reference (N,), the reference is the target state for the tracked variables (the target indexes) and
+    # zero for the body angular velocity
+    def state_cost_weights(self):
+        weights, reference = np.zeros(self.N), np.zeros(self.N)
+        weights[self.body_state_dim - 3 : self.body_state_dim] = self.cost_weights["angular_velocity"] * self.dt
+        weights[self.target_indexes] += self.cost_weights["tracking"] * self.dt
+        reference[self.target_indexes] = np.ravel(self.x_target)[self.target_indexes]
+        return weights, reference
+
     def constraints(self, x):  # define the constraints (equality and inequality constraints)
+        if self.dynamics_batch is not None: return self.constraints_batch(x)  # evaluate all the knot points at once with array operations
+        return self.constraints_per_knot(x)
+
+    # define the constraints (equality and inequality constraints), viewing x as (K, N) states and (K - 1, M) control inputs, gives the same results as constraints_per_knot
+    def constraints_batch(self, x):
+        x = x.reshape((self.x_dim,))  # the optimization variables vector x
+        X = x[: self.K * self.N].reshape((self.K, self.N))  # the states at all the knot points
+        U = x[self.K * self.N :].reshape((self.K - 1, self.M))  # the control inputs at all the knot points (except the last one)
+
+        # the dynamics equality constraints, using the integrator
+        c_dyn = self.dynamics_defects(X[:-1], X[1:], U, self.feet_phases[:, :-1].T)
+
+        # the feet equality constraints to fix the feet (x, y) positions on the terrain when the feet are in contact with the ground
+        feet_cols = self.body_state_dim + 3 * self.fix_feet_pairs[:, :1] + np.arange(2)  # the columns of the (x, y) positions of the feet
+        c_fix = X[self.fix_feet_pairs[:, 1:] + 1, feet_cols] - X[self.fix_feet_pairs[:, 1:], feet_cols]
+
+        # the quaternion normalization equality constraints
+        Q = X[:, self.body_com_dim : self.body_com_dim + 4]  # the quaternions at all the knot points
+        c_quat = (Q[:, None, :] @ Q[:, :, None])[:, 0, 0] - 1.
+
+        # the inequality constraints for the friction cones
+        F = U[self.friction_pairs[:, 1:], 3 * self.friction_pairs[:, :1] + np.arange(3)][:, None, :]  # the forces applied to the contact feet, (pairs, 1, 3)
+        friction_force_x = (F @ self.tx)[:, 0, 0]  # the x and y components of the friction forces
+        friction_force_y = (F @ self.ty)[:, 0, 0]
+        max_static_friction_force = self.mu * (F @ self.nz)[:, 0, 0]  # the maximum static friction forces
+        c_friction = np.stack((friction_force_x - max_static_friction_force, -friction_force_x - max_static_friction_force, friction_force_y - max_static_friction_force,
+                               -friction_force_y - max_static_friction_force), axis = 1)
+
+        # the inequality constraints for the feet/legs bounds
+        c_bounds = self.legs_bounds_constraints(X)
+
+        return np.concatenate((c_dyn.ravel(), c_fix.ravel(), c_quat, c_friction.ravel(), c_bounds.ravel())).reshape((-1, 1))  # return the constraints
+
+    # the nonzero elements of the Jacobian blocks of the dynamics defects with respect to the state xk0, the state xk1 and the control input uk, found by chaining the masks of the
+    # body dynamics through the stages of the integrator
+    def integrator_masks(self):
+        eye = np.eye(self.body_state_dim, self.N, dtype = bool)  # the body state part of the state, the state identity
+        I = np.eye(self.N, dtype = bool)
+        product = lambda A, B: (A.astype(int) @ B.astype(int)) > 0  # the nonzero elements of the product of two matrices
+        fx, fu = self.dyn_fx_mask, self.dyn_fu_mask
+        if self.integrator == "euler": return eye | fx, eye.copy(), fu.copy()
+        if self.integrator == "trapezoidal": return eye | fx, eye | fx, fu.copy()  # the dynamics at both knot points
+        if self.integrator == "hermite-simpson":  # the dynamics at both knot points and at the midpoint, which depends on both knot points
+            fm_x = product(fx, I | product(eye.T, fx)); fm_u = product(fx, product(eye.T, fu)) | fu
+            return eye | fx | fm_x, eye | fx | fm_x, fu | fm_u
+        kx, ku = fx.copy(), fu.copy(); dx, du = fx.copy(), fu.copy()  # rk4, every stage depends on the previous one
+        for stage in range(3):
+            kx, ku = product(fx, I | product(eye.T, kx)), product(fx, product(eye.T, ku)) | fu
+            dx |= kx; du |= ku
+        return eye | dx, eye.copy(), du
+
+    # the increments of the body states over the intervals (knots, body_state_dim), from the states X0 (knots, N) to X1 (knots, N) with the control inputs U (knots, M) and contacts
+    # (knots, feet_number) of the first knot point of every interval
+    def dynamics_increments(self, X0, X1, U, contacts):
+        # the control inputs and the contacts are a zero-order hold over every interval (as in the euler transcription, the inputs of the last knot point are not variables), so the
+        # trapezoidal and Hermite-Simpson increments evaluate f(x_{k+1}) and the midpoint with u_k and the contacts of the knot point k, instead of the interpolated inputs of the textbook schemes
+        f = lambda X: self.dynamics_batch(X, U, contacts)  # the body dynamics at the states X
+        stage = self.moved_body_states
+        if self.integrator == "euler": return f(X0) * self.dt
+        if self.integrator == "trapezoidal": return (f(X0) + f(X1)) * (self.dt / 2)
+        if self.integrator == "hermite-simpson":
+            f0, f1 = f(X0), f(X1)
+            Xm = stage((X0 + X1) / 2, (f0 - f1) * (self.dt / 8))  # the midpoint state of the cubic interpolation
+            return (f0 + 4 * f(Xm) + f1) * (self.dt / 6)
+        k1 = f(X0)  # rk4
+        k2 = f(stage(X0, k1 * (self.dt / 2)))
+        k3 = f(stage(X0, k2 * (self.dt / 2)))
+        k4 = f(stage(X0, k3 * self.dt))
+        return (k1 + 2 * k2 + 2 * k3 + k4) * (self.dt / 6)
+
+    def moved_body_states(self, X, increment):  # the states X (knots, N) with their body states moved by increment (knots, body_state_dim), the feet are held
+        return np.concatenate((X[:, : self.body_state_dim] + increment, X[:, self.body_state_dim :]), axis = 1)
+
+    def dynamics_defects(self, X0, X1, U, contacts):  # the dynamics equality constraints of the intervals, xk1 - xk0 - increment
+        if self.integrator == "euler":
+            x_new = X0[:, : self.body_state_dim] + self.dynamics_batch(X0, U, contacts) * self.dt  # the new states at the knot points k + 1
+            return X1[:, : self.body_state_dim] - x_new
+        return X1[:, : self.body_state_dim] - X0[:, : self.body_state_dim] - self.dynamics_increments(X0, X1, U, contacts)
+
+    def legs_bounds_constraints(self, X):  # the feet positions relative to the center of mass in the body frame, R^T(q) * (foot - com), for the states X (knots, N)
+        R = q_to_R_batch(X[:, self.body_com_dim : self.body_com_dim + 4])  # the rotation matrices of the body orientations at the knot points
+        feet_rel = X[:, self.body_state_dim : self.N].reshape((len(X), self.feet_number, 3)) - X[:, None, : self.body_position_dim]  # the feet positions relative to the center of mass
+        return np.swapaxes(R, 1, 2)[:, None] @ feet_rel[:, :, :, None]
+
+    def constraints_per_knot(self, x):  # define the constraints (equality and inequality constraints), knot point by knot point
         x = x.reshape((self.x_dim, 1))  # reshape the optimization variables vector x to a column vector
         c = np.zeros((self.eq_dim + self.ineq_dim, 1))  # initialize the equality and inequality constraints
         
@@ -937,6 +1610,7 @@ class trajectory_optimization():
         for foot in range(self.feet_number):
             for k in range(len(self.contact_indexes[foot])):
                 contact_index = self.contact_indexes[foot][k]  # the indexes for the contact feet phases of the current foot
+                if contact_index == self.K - 1: continue  # the last knot point has no control input
                 u = x[self.K * self.N + contact_index * self.M + 3 * foot : self.K * self.N + contact_index * self.M + 3 * (foot + 1)]  # the force applied to the current foot at the current knot point contact_index
                 friction_force_x = np.sum(self.tx.T @ u)  # the x component of the friction force
                 friction_force_y = np.sum(self.ty.T @ u)  # the y component of the friction force
@@ -960,77 +1634,517 @@ class trajectory_optimization():
         
         return c  # return the constraints
 
-    def jacobian(self, x):  # compute the Jacobian of the constraints
+    def jacobian_sparsity_structure(self):  # find the row and column indexes of the nonzero elements of the Jacobian of the constraints (block-banded, linear in the number of knot points)
+        rows_list = []  # the row and column indexes of every group of constraints, in the order their values are returned by the jacobian method
+        cols_list = []
+
+        # the structure for the dynamics equality constraints, with respect to the state xk0, the state xk1 and the control input uk of every knot point k
+        knots = np.arange(self.K - 1).reshape((-1, 1))  # the knot points of the dynamics equality constraints
+        dx_rows, dx_cols = np.nonzero(self.dyn_dx_mask)  # the nonzero elements of the blocks (the block with respect to the state xk1 is the identity for the explicit integrators)
+        dx1_rows, dx1_cols = np.nonzero(self.dyn_dx1_mask)
+        du_rows, du_cols = np.nonzero(self.dyn_du_mask)
+        rows_list.append((knots * self.body_state_dim + np.concatenate((dx_rows, dx1_rows, du_rows))).ravel())
+        cols_list.append(np.concatenate((knots * self.N + dx_cols, (knots + 1) * self.N + dx1_cols, self.K * self.N + knots * self.M + du_cols), axis = 1).ravel())
+
+        # the structure for the feet equality constraints, with respect to the feet x and y positions at the knot points contact_index and contact_index + 1
+        c_index = (self.K - 1) * self.body_state_dim  # the index of the feet equality constraints
+        feet, indexes = self.fix_feet_pairs[:, 0].reshape((-1, 1)), self.fix_feet_pairs[:, 1].reshape((-1, 1))
+        pair_rows = c_index + 2 * np.arange(len(self.fix_feet_pairs)).reshape((-1, 1))
+        rows_list.append((pair_rows + np.array([0, 1, 0, 1])).ravel())
+        cols_list.append((indexes * self.N + self.body_state_dim + 3 * feet + np.array([0, 1, self.N, self.N + 1])).ravel())
+
+        # the structure for the quaternion normalization equality constraints, with respect to the quaternion at every knot point k
+        c_index = (self.K - 1) * self.body_state_dim + self.fix_feet_dim  # the index of the quaternion normalization equality constraints
+        knots = np.arange(self.K).reshape((-1, 1))
+        rows_list.append(np.repeat(c_index + knots.ravel(), 4))
+        cols_list.append((knots * self.N + self.body_com_dim + np.arange(4)).ravel())
+
+        # the structure for the friction cones inequality constraints, with respect to the force applied to the current foot at the current knot point contact_index
+        c_index = self.eq_dim  # the index of the inequality constraints for the friction cones
+        feet, indexes = self.friction_pairs[:, 0].reshape((-1, 1)), self.friction_pairs[:, 1].reshape((-1, 1))
+        pair_rows = c_index + 4 * np.arange(len(self.friction_pairs)).reshape((-1, 1))
+        rows_list.append((pair_rows + np.repeat(np.arange(4), 3)).ravel())
+        cols_list.append((self.K * self.N + indexes * self.M + 3 * feet + np.tile(np.arange(3), 4)).ravel())
+
+        # the structure for the feet/legs bounds inequality constraints, with respect to the body position, the foot position and the quaternion at every knot point k
+        c_index = self.eq_dim + self.feet_forces_dim  # the index of the inequality constraints for the feet/legs bounds
+        feet = np.arange(self.feet_number).reshape((1, -1, 1))
+        bound_rows = c_index + knots.reshape((-1, 1, 1)) * self.feet_state_dim + 3 * feet  # the first row of the bounds of every knot point k and every foot
+        block_rows = np.concatenate((np.repeat(np.arange(3), 3), np.repeat(np.arange(3), 3), np.repeat(np.arange(3), 4)))  # the rows of the body position, foot position and quaternion blocks
+        # the columns of the same blocks (relative to the first state variable of the knot point)
+        block_cols = np.concatenate((np.tile(np.arange(3), 3), np.tile(np.arange(3), 3) + self.body_state_dim, np.tile(np.arange(4), 3) + self.body_com_dim))
+        block_feet = np.concatenate((np.zeros(9, dtype = int), 3 * np.ones(9, dtype = int), np.zeros(12, dtype = int)))  # only the foot position block moves with the foot
+        rows_list.append((bound_rows + block_rows).ravel())
+        cols_list.append((knots.reshape((-1, 1, 1)) * self.N + block_cols + block_feet * feet).ravel())
+
+        return np.concatenate(rows_list).astype(int), np.concatenate(cols_list).astype(int)  # return the row and column indexes of the nonzero elements
+
+    def jacobianstructure(self):  # return the sparsity structure of the Jacobian of the constraints
+        return self.jac_rows, self.jac_cols
+
+    def jacobian(self, x):  # compute the nonzero elements of the Jacobian of the constraints, in the order of the sparsity structure
         x = x.reshape((self.x_dim, 1))  # reshape the optimization variables vector x to a column vector
-        J = np.zeros((self.eq_dim + self.ineq_dim, self.x_dim))  # initialize the Jacobian of the constraints
+        values_list = []  # the values of every group of constraints, in the order of the sparsity structure
 
         # compute the Jacobian for the dynamics equality constraints
-        for k in range(self.K - 1):
-            contactsk = self.feet_phases[:, k]  # the contacts of the feet at the current knot point k
-            xk0 = x[k * self.N : (k + 1) * self.N]  # the state at the current knot point k
-            uk = x[self.K * self.N + k * self.M : self.K * self.N + (k + 1) * self.M]  # the control input at the current knot point k
-            # the Jacobian for the dynamics equality constraints with respect to the state xk0
-            J[k * self.body_state_dim : (k + 1) * self.body_state_dim, k * self.N : (k + 1) * self.N] = -np.eye(self.body_state_dim, self.N) - self.dynamics_dx(xk0, uk, contactsk) * self.dt
-            # the Jacobian for the dynamics equality constraints with respect to the state xk1
-            J[k * self.body_state_dim : (k + 1) * self.body_state_dim, (k + 1) * self.N : (k + 2) * self.N] = np.eye(self.body_state_dim, self.N)
-            # the Jacobian for the dynamics equality constraints with respect to the control input uk
-            J[k * self.body_state_dim : (k + 1) * self.body_state_dim, self.K * self.N + k * self.M : self.K * self.N + (k + 1) * self.M] = -self.dynamics_du(xk0, uk, contactsk) * self.dt
+        if self.dynamics_dx_batch is not None and self.dynamics_du_batch is not None:  # all the knot points at once
+            X = x[: self.K * self.N].reshape((self.K, self.N))  # the states and the control inputs at all the knot points
+            U = x[self.K * self.N :].reshape((self.K - 1, self.M))
+            contacts = self.feet_phases[:, :-1].T  # the contacts of the feet at all the knot points
+            dyn_values = self.dynamics_jacobian_values(X[:-1], X[1:], U, contacts)
+        else:  # knot point by knot point
+            dyn_values = np.zeros((self.K - 1, np.count_nonzero(self.dyn_dx_mask) + self.body_state_dim + np.count_nonzero(self.dyn_du_mask)))  # the nonzero elements for every knot point k
+            for k in range(self.K - 1):
+                contactsk = self.feet_phases[:, k]  # the contacts of the feet at the current knot point k
+                xk0 = x[k * self.N : (k + 1) * self.N]  # the state at the current knot point k
+                uk = x[self.K * self.N + k * self.M : self.K * self.N + (k + 1) * self.M]  # the control input at the current knot point k
+                dxk0 = -np.eye(self.body_state_dim, self.N) - self.dynamics_dx(xk0, uk, contactsk) * self.dt  # the Jacobian for the dynamics equality constraints with respect to the state xk0
+                duk = -self.dynamics_du(xk0, uk, contactsk) * self.dt  # the Jacobian for the dynamics equality constraints with respect to the control input uk
+                dyn_values[k] = np.concatenate((dxk0[self.dyn_dx_mask], np.ones(self.body_state_dim), duk[self.dyn_du_mask]))  # the Jacobian with respect to the state xk1 is the identity
+        values_list.append(dyn_values.ravel())
 
         # compute the Jacobian for the feet equality constraints to fix the feet positions when the feet are in contact with the ground
-        c_index = (self.K - 1) * self.body_state_dim  # the index of the feet equality constraints
-        counter = 0  # the counter for the feet equality constraints
-        for foot in range(self.feet_number):
-            for k in range(len(self.contact_indexes[foot])):
-                contact_index = self.contact_indexes[foot][k]  # the indexes for the contact feet phases of the current foot
-                if contact_index < self.K - 1 and self.feet_phases[foot][contact_index + 1] == True:  # if the contact phase is not the last phase and the next phase is also a contact phase
-                    # the Jacobian for the fix feet equality constraints with respect to the feet x and y positions at the current knot point contact_index
-                    J[c_index + 2 * counter : c_index + 2 * (counter + 1), contact_index * self.N + self.body_state_dim + 3 * foot : contact_index * self.N + self.body_state_dim + 3 * foot + 2] = -np.eye(2)
-                    # the Jacobian for the fix feet equality constraints with respect to the feet x and y positions at the next knot point contact_index + 1
-                    J[c_index + 2 * counter : c_index + 2 * (counter + 1), (contact_index + 1) * self.N + self.body_state_dim + 3 * foot : (contact_index + 1) * self.N + self.body_state_dim + 3 * foot + 2] = np.eye(2)
-                    counter += 1  # increase by 1 the counter for the feet equality constraints
+        values_list.append(np.tile(np.array([-1., -1., 1., 1.]), len(self.fix_feet_pairs)))
 
         # compute the Jacobian for quaternion normalization equality constraints
-        c_index = (self.K - 1) * self.body_state_dim + self.fix_feet_dim  # the index of the quaternion normalization equality constraints
-        for k in range(self.K):
-            xk = x[k * self.N : (k + 1) * self.N]  # the state at the current knot point k
-            qk = xk[self.body_com_dim : self.body_com_dim + 4]  # the quaternion-based representation of the body orientation at the current knot point k
-            # the Jacobian for the quaternion normalization equality constraints with respect to the quaternion-based representation of the body orientation at the current knot point k
-            J[c_index + k, k * self.N + self.body_com_dim : k * self.N + self.body_com_dim + 4] = 2 * qk.T
+        knots = np.arange(self.K).reshape((-1, 1))
+        values_list.append(2 * x[knots * self.N + self.body_com_dim + np.arange(4), 0].ravel())
 
         # compute the Jacobian for the inequality constraints for the friction cones
-        c_index = self.eq_dim  # the index of the inequality constraints for the friction cones
-        counter = 0  # the counter for the inequality constraints for the friction cones
-        for foot in range(self.feet_number):
-            for k in range(len(self.contact_indexes[foot])):
-                contact_index = self.contact_indexes[foot][k]  # the indexes for the contact feet phases of the current foot
-                # the Jacobian for the inequality constraints for the friction cones with respect to the force applied to the current foot at the current knot point contact_index
-                J[c_index + 4 * counter, self.K * self.N + contact_index * self.M + 3 * foot : self.K * self.N + contact_index * self.M + 3 * (foot + 1)] = (self.tx - self.mu * self.nz).T
-                J[c_index + 4 * counter + 1, self.K * self.N + contact_index * self.M + 3 * foot : self.K * self.N + contact_index * self.M + 3 * (foot + 1)] = (-self.tx - self.mu * self.nz).T
-                J[c_index + 4 * counter + 2, self.K * self.N + contact_index * self.M + 3 * foot : self.K * self.N + contact_index * self.M + 3 * (foot + 1)] = (self.ty - self.mu * self.nz).T
-                J[c_index + 4 * counter + 3, self.K * self.N + contact_index * self.M + 3 * foot : self.K * self.N + contact_index * self.M + 3 * (foot + 1)] = (-self.ty - self.mu * self.nz).T
-                counter += 1  # increase by 1 the counter for the inequality constraints for the friction cones
+        # the same for every foot and contact knot point
+        friction_cone = np.concatenate(((self.tx - self.mu * self.nz).T, (-self.tx - self.mu * self.nz).T, (self.ty - self.mu * self.nz).T, (-self.ty - self.mu * self.nz).T), axis = 0)
+        values_list.append(np.tile(friction_cone.ravel(), len(self.friction_pairs)))
 
         # compute the Jacobian for the inequality constraints for the feet/legs bounds
+        values_list.append(self.legs_bounds_jacobian_values(x[: self.K * self.N, 0].reshape((self.K, self.N))).ravel())
+
+        return np.concatenate(values_list)  # return the nonzero elements of the Jacobian of the constraints
+
+    # the nonzero elements of the Jacobian of the dynamics equality constraints for the states X0 (knots, N) and X1 (knots, N), the control inputs U (knots, M) and the contacts
+    # (knots, feet_number)
+    def dynamics_jacobian_values(self, X0, X1, U, contacts):
+        if self.integrator == "euler":
+            dX = -np.eye(self.body_state_dim, self.N) - self.dynamics_dx_batch(X0, U, contacts) * self.dt  # the Jacobian for the dynamics equality constraints with respect to the states xk0
+            dU = -self.dynamics_du_batch(X0, U, contacts) * self.dt  # the Jacobian for the dynamics equality constraints with respect to the control inputs uk
+            return np.concatenate((dX[:, self.dyn_dx_mask], np.ones((len(X0), self.body_state_dim)), dU[:, self.dyn_du_mask]), axis = 1)  # the Jacobian with respect to the states xk1 is the identity
+        f = lambda X: self.dynamics_batch(X, U, contacts)  # the body dynamics and their partial derivatives at the states X
+        fx = lambda X: self.dynamics_dx_batch(X, U, contacts)
+        fu = lambda X: self.dynamics_du_batch(X, U, contacts)
+        eye = np.eye(self.body_state_dim, self.N)  # the body state part of the state
+        # the derivatives of a moved state, identity plus the derivatives G of the body increment
+        embed = lambda G, identity: np.concatenate((G + identity[: self.body_state_dim], np.broadcast_to(identity[self.body_state_dim :], (len(G),) + identity[self.body_state_dim :].shape)), axis = 1)
+        zeros_u = np.zeros((self.N, self.M)); I = np.eye(self.N)
+        if self.integrator == "trapezoidal":  # the dynamics at both knot points
+            G0 = fx(X0) * (self.dt / 2); G1 = fx(X1) * (self.dt / 2); Gu = (fu(X0) + fu(X1)) * (self.dt / 2)
+        elif self.integrator == "hermite-simpson":  # the dynamics at both knot points and at the midpoint of the cubic interpolation
+            A0, A1, B0, B1 = fx(X0), fx(X1), fu(X0), fu(X1)
+            Xm = self.moved_body_states((X0 + X1) / 2, (f(X0) - f(X1)) * (self.dt / 8))  # the midpoint states
+            Am = fx(Xm)
+            dfm_dx0 = Am @ embed(A0 * (self.dt / 8), I / 2)  # the derivatives of the midpoint dynamics
+            dfm_dx1 = Am @ embed(-A1 * (self.dt / 8), I / 2)
+            dfm_du = Am @ embed((B0 - B1) * (self.dt / 8), zeros_u) + fu(Xm)
+            G0 = (A0 + 4 * dfm_dx0) * (self.dt / 6)
+            G1 = (A1 + 4 * dfm_dx1) * (self.dt / 6)
+            Gu = (B0 + 4 * dfm_du + B1) * (self.dt / 6)
+        else:  # rk4, the stages are chained from the state xk0
+            S, dS_dx, dS_du = X0, np.broadcast_to(I, (len(X0), self.N, self.N)), np.zeros((len(X0), self.N, self.M))  # the stage states and their derivatives
+            G0 = np.zeros((len(X0), self.body_state_dim, self.N)); Gu = np.zeros((len(X0), self.body_state_dim, self.M))
+            for stage_step, weight in zip([self.dt / 2, self.dt / 2, self.dt, None], [1, 2, 2, 1]):
+                A = fx(S); dk_dx = A @ dS_dx; dk_du = A @ dS_du + fu(S)  # the derivatives of the stage dynamics
+                G0 += weight * (self.dt / 6) * dk_dx; Gu += weight * (self.dt / 6) * dk_du
+                if stage_step is not None: S, dS_dx, dS_du = self.moved_body_states(X0, f(S) * stage_step), embed(stage_step * dk_dx, I), embed(stage_step * dk_du, zeros_u)
+            G1 = np.zeros((len(X0), self.body_state_dim, self.N))  # the state xk1 appears only in the identity
+        dX0 = -eye - G0; dX1 = eye - G1; dU = -Gu  # the Jacobian blocks of xk1 - xk0 - increment
+        return np.concatenate((dX0[:, self.dyn_dx_mask], dX1[:, self.dyn_dx1_mask], dU[:, self.dyn_du_mask]), axis = 1)
+
+    def legs_bounds_jacobian_values(self, X):  # the nonzero elements of the Jacobian of the feet/legs bounds inequality constraints for the states X (knots, N)
+        Q = X[:, self.body_com_dim : self.body_com_dim + 4]  # the quaternions at the knot points
+        RT = np.swapaxes(q_to_R_batch(Q), 1, 2)  # the transposed rotation matrices of the body orientations at the knot points
+        feet_rel = X[:, self.body_state_dim : self.N].reshape((len(X), self.feet_number, 3)) - X[:, None, : self.body_position_dim]  # the feet positions relative to the center of mass
+        RT_feet = np.broadcast_to(RT[:, None], (len(X), self.feet_number, 3, 3)).reshape((len(X), self.feet_number, 9))
+        # with respect to the body position (3x3), the foot position (3x3) and the quaternion (3x4), for every knot point k and every foot
+        return np.concatenate((-RT_feet, RT_feet, dRTt_dq_batch(Q[:, None, :], feet_rel).reshape((len(X), self.feet_number, 12))), axis = 2)
+
+    def hessian_sparsity_structure(self):  # find the row and column indexes of the nonzero elements of the lower triangle of the Hessian of the Lagrangian (block-diagonal per knot point)
+        local_rows, local_cols = np.nonzero(self.hess_mask)  # the indexes inside the block (xk, uk) of every knot point k
+        last_rows, last_cols = np.nonzero(self.hess_mask_last)
+        knots = np.arange(self.K - 1).reshape((-1, 1))
+        # the index of the variable local of the knot point knot in the optimization variables vector x
+        to_global = lambda knot, local: np.where(local < self.N, knot * self.N + local, self.K * self.N + knot * self.M + local - self.N)
+        # the forces of the knot points k coupled with the forces of k + 1 by the smoothness cost
+        coupling = self.K * self.N + np.arange((self.K - 2) * self.M) if self.rate_cost and self.K > 2 else np.zeros(0, dtype = int)
+        rows = np.concatenate((to_global(knots, local_rows).ravel(), (self.K - 1) * self.N + last_rows, coupling + self.M))
+        cols = np.concatenate((to_global(knots, local_cols).ravel(), (self.K - 1) * self.N + last_cols, coupling))
+        return rows.astype(int), cols.astype(int)  # return the row and column indexes of the nonzero elements
+
+    def hessianstructure(self):  # return the sparsity structure of the Hessian of the Lagrangian
+        return self.hess_rows, self.hess_cols
+
+    def hessian(self, x, lagrange, obj_factor):  # compute the nonzero elements of the lower triangle of the Hessian of the Lagrangian, in the order of the sparsity structure
+        x = x.reshape((self.x_dim,)); lagrange = np.asarray(lagrange).reshape((-1,))
+        X = x[: self.K * self.N].reshape((self.K, self.N))  # the states and the control inputs at all the knot points
+        U = x[self.K * self.N :].reshape((self.K - 1, self.M))
+        lagrange_dyn = lagrange[: (self.K - 1) * self.body_state_dim].reshape((self.K - 1, self.body_state_dim))  # the multipliers of the dynamics equality constraints
+        c_index = (self.K - 1) * self.body_state_dim + self.fix_feet_dim  # the index of the quaternion normalization equality constraints
+        lagrange_quat = lagrange[c_index : c_index + self.K]  # the multipliers of the quaternion normalization equality constraints
         c_index = self.eq_dim + self.feet_forces_dim  # the index of the inequality constraints for the feet/legs bounds
-        for k in range(self.K):
-            xk = x[k * self.N : (k + 1) * self.N]  # the state at the current knot point k
-            qk = xk[self.body_com_dim : self.body_com_dim + 4]  # the quaternion-based representation of the body orientation at the current knot point k
-            Rk = q_to_R(qk)  # the rotation matrix of the body orientation at the current knot point k
-            comk = xk[:self.body_position_dim]  # the center of mass position (body position) at the current knot point k
-            for foot in range(self.feet_number):
-                footk = xk[self.body_state_dim + 3 * foot : self.body_state_dim + 3 * (foot + 1)]  # the position of the current foot at the current knot point k
-                # the Jacobian for the inequality constraints for the feet/legs bounds with respect to the body position at the current knot point k
-                J[c_index + k * self.feet_state_dim + 3 * foot : c_index + k * self.feet_state_dim + 3 * (foot + 1), k * self.N : k * self.N + self.body_position_dim] = -Rk.T
-                # the Jacobian for the inequality constraints for the feet/legs bounds with respect to the feet position at the current knot point k
-                J[c_index + k * self.feet_state_dim + 3 * foot : c_index + k * self.feet_state_dim + 3 * (foot + 1), k * self.N + self.body_state_dim + 3 * foot : k * self.N + self.body_state_dim + 3 * (foot + 1)] = Rk.T
-                # the Jacobian for the inequality constraints for the feet/legs bounds with respect to the quaternion-based representation of the body orientation at the current knot point k
-                J[c_index + k * self.feet_state_dim + 3 * foot : c_index + k * self.feet_state_dim + 3 * (foot + 1), k * self.N + self.body_com_dim : k * self.N + self.body_com_dim + 4] = dRTt_dq(qk, footk - comk)
-        
-        return J  # return the Jacobian of the constraints
+        lagrange_bounds = lagrange[c_index : c_index + self.K * self.feet_state_dim].reshape((self.K, self.feet_number, 3))  # the multipliers of the feet/legs bounds
+        H = self.knot_hessian_blocks(X, lagrange_quat, lagrange_bounds)  # the Hessian block of every knot point k over the variables (xk, uk), without the dynamics
+
+        # the dynamics equality constraints, xk1 - xk0 - dynamics(xk0, uk) * dt
+        H[:-1] += self.dynamics_hess_batch(X[:-1], U, self.feet_phases[:, :-1].T, -self.dt * lagrange_dyn)
+
+        # the quadratic cost terms, constant and diagonal in every block, plus the coupling of the forces of consecutive knot points
+        coupling = np.zeros(0)  # the coupling elements of the smoothness cost
+        if self.cost_enabled:
+            state_weights, reference = self.state_cost_weights(); diagonal = np.arange(self.N + self.M)
+            knots = np.arange(self.K - 1)  # the number of the neighbors of the forces of every knot point in the smoothness cost
+            neighbors = np.minimum(knots, 1) + np.minimum(knots[::-1], 1)
+            H[:, diagonal[: self.N], diagonal[: self.N]] += 2 * obj_factor * state_weights
+            H[:-1, diagonal[self.N :], diagonal[self.N :]] += 2 * obj_factor * (self.input_cost + self.rate_cost * neighbors)[:, None]
+            if self.rate_cost and self.K > 2: coupling = np.full((self.K - 2) * self.M, -2 * obj_factor * self.rate_cost)
+
+        return np.concatenate((H[:-1][:, self.hess_mask].ravel(), H[-1, : self.N, : self.N][self.hess_mask_last], coupling))  # return the nonzero elements of the Hessian of the Lagrangian
+
+    # the Hessian blocks (knots, N + M, N + M) of the quaternion normalization and of the feet/legs bounds constraints for the states X (knots, N) and their multipliers
+    def knot_hessian_blocks(self, X, lagrange_quat, lagrange_bounds):
+        H = np.zeros((len(X), self.N + self.M, self.N + self.M))  # the Hessian block of every knot point k over the variables (xk, uk)
+        iq = slice(self.body_com_dim, self.body_com_dim + 4)  # the quaternion variables
+
+        # the quaternion normalization equality constraints
+        H[:, iq, iq] += 2 * lagrange_quat[:, None, None] * np.eye(4)
+
+        # the inequality constraints for the feet/legs bounds, R^T(q) * (foot - com)
+        Q = X[:, iq]  # the quaternions at the knot points
+        feet_rel = X[:, self.body_state_dim : self.N].reshape((len(X), self.feet_number, 3)) - X[:, None, : self.body_position_dim]  # the feet positions relative to the center of mass
+        H[:, iq, iq] += np.einsum("kfi,kfjim->kmj", lagrange_bounds, dRTt_dq_batch(np.eye(4)[None, None], feet_rel[:, :, None, :]))  # quadratic in the quaternion
+        Gq = np.einsum("kfi,kmiz->kfzm", lagrange_bounds, dRTt_dq_batch(Q[:, None, :], np.eye(3)[None]))  # the quaternion with the foot position, for every foot
+        H[:, iq, : self.body_position_dim] -= Gq.sum(axis = 1)  # the quaternion with the body position
+        H[:, : self.body_position_dim, iq] -= np.swapaxes(Gq.sum(axis = 1), 1, 2)
+        Gq_feet = Gq.transpose((0, 2, 1, 3)).reshape((len(X), 4, self.feet_state_dim))  # the quaternion with all the feet positions
+        H[:, iq, self.body_state_dim : self.N] += Gq_feet
+        H[:, self.body_state_dim : self.N, iq] += np.swapaxes(Gq_feet, 1, 2)
+        return H
 
     def intermediate(self, alg_mod, iter_count, obj_value, inf_pr, inf_du, mu, d_norm, regularization_size, alpha_du, alpha_pr, ls_trials):  # print info
-        print("Objective value at iteration #%d is - %g" % (iter_count, obj_value))  # print the objective value for each iteration
+        self.iterations = iter_count  # the number of the iterations done so far
+        if self.profiler is not None: self.profiler.record_iteration(alg_mod, iter_count, obj_value, inf_pr, inf_du, mu, d_norm, regularization_size, alpha_du, alpha_pr, ls_trials)
+        if self.verbose: print("Objective value at iteration #%d is - %g" % (iter_count, obj_value))  # print the objective value for each iteration
+        if self.progress_queue is not None:  # stream the progress of the solver
+            self.progress_queue.put((iter_count, obj_value, inf_pr, inf_du))
+        return self.cancel_event is None or not self.cancel_event.is_set()  # returning False stops the solver (user requested stop)
+
+
+# this class records where a solve spends its time, the calls and the wall time of the solver callbacks and of the dynamics functions, and the progress of every iteration
+class solve_profiler():
+    callbacks = ["objective", "gradient", "constraints", "jacobian", "hessian"]  # the callbacks of the solver, the rest of the wall time of a solve is spent in IPOPT
+    def __init__(self):
+        self.calls, self.times = {}, {}  # the number of the calls and the accumulated wall time in sec of every profiled function
+        self.iterations = []  # the progress of every iteration (infeasibilities, barrier parameter, step sizes)
+        self.lock = threading.Lock()  # the profiled functions may be called from several threads
+        self.start_time = time.perf_counter()  # the wall time at the creation of the profiler
+    def timed(self, name, function):  # wrap the function so that its calls and its wall time are recorded under name
+        self.calls.setdefault(name, 0)
+        self.times.setdefault(name, 0.)
+        def timed_function(*args, **kwargs):
+            start_time = time.perf_counter()  # the wall time at the start of the call
+            try: return function(*args, **kwargs)
+            finally:
+                elapsed_time = time.perf_counter() - start_time
+                with self.lock:
+                    self.calls[name] += 1
+                    self.times[name] += elapsed_time
+        return timed_function
+    # record the progress of an iteration, as given to the intermediate callback
+    def record_iteration(self, alg_mod, iter_count, obj_value, inf_pr, inf_du, mu, d_norm, regularization_size, alpha_du, alpha_pr, ls_trials):
+        self.iterations.append({"iteration": int(iter_count), "time": time.perf_counter() - self.start_time, "mode": "restoration" if alg_mod == 1 else "regular",
+                                "objective": float(obj_value), "inf_pr": float(inf_pr), "inf_du": float(inf_du), "mu": float(mu), "d_norm": float(d_norm),
+                                "regularization_size": float(regularization_size), "alpha_du": float(alpha_du), "alpha_pr": float(alpha_pr), "ls_trials": int(ls_trials)})
+    def report(self, wall_time):  # the report of the solve as plain python values
+        functions = {name: {"calls": self.calls[name], "time": self.times[name], "mean_time": self.times[name] / self.calls[name] if self.calls[name] else 0.} for name in self.calls}
+        callbacks_time = sum(functions[name]["time"] for name in solve_profiler.callbacks if name in functions)  # the wall time spent outside IPOPT
+        return {"wall_time": wall_time, "ipopt_time": wall_time - callbacks_time, "callbacks": {name: functions[name] for name in solve_profiler.callbacks if name in functions},
+                "dynamics": {name: function for name, function in functions.items() if name not in solve_profiler.callbacks}, "iterations": self.iterations}
+
 
+# this class is the problem object given to the solver when a solve is profiled, it delegates every callback to the trajectory_optimization problem and times the calls of the
+# callbacks with a solve_profiler
+class profiled_problem():
+    def __init__(self, problem, profiler):
+        self.problem = problem  # the profiled trajectory_optimization problem
+        self.timed_callbacks = {name: profiler.timed(name, getattr(problem, name)) for name in solve_profiler.callbacks}  # the timed callbacks of the problem
+    def objective(self, x):
+        return self.timed_callbacks["objective"](x)
+    def gradient(self, x):
+        return self.timed_callbacks["gradient"](x)
+    def constraints(self, x):
+        return self.timed_callbacks["constraints"](x)
+    def jacobian(self, x):
+        return self.timed_callbacks["jacobian"](x)
+    def jacobianstructure(self):
+        return self.problem.jacobianstructure()
+    def hessian(self, x, lagrange, obj_factor):
+        return self.timed_callbacks["hessian"](x, lagrange, obj_factor)
+    def hessianstructure(self):
+        return self.problem.hessianstructure()
+    def intermediate(self, alg_mod, iter_count, obj_value, inf_pr, inf_du, mu, d_norm, regularization_size, alpha_du, alpha_pr, ls_trials):
+        return self.problem.intermediate(alg_mod, iter_count, obj_value, inf_pr, inf_du, mu, d_norm, regularization_size, alpha_du, alpha_pr, ls_trials)
+
+
+# this class is a persistent on-disk cache of solved trajectories (primal and dual solutions), used to skip or to warm start the solves of the trajectory optimization problem
+class trajectory_cache():
+    version = 2  # the format version of the entries, part of every key and of the metadata, the entries of the other versions are never used (and are evicted as the least recently used ones)
+    def __init__(self, directory, max_bytes = 500 * 2**20, max_entries = 200, max_distance = 1.):
+        self.directory = directory  # the directory of the cache, every entry is a pair of files <key>.npz (the solution) and <key>.json (the metadata used to find the near misses)
+        self.max_bytes = max_bytes  # the maximum size of the cache in bytes, the least recently used entries are evicted above it
+        self.max_entries = max_entries  # the maximum number of the cache entries
+        self.max_distance = max_distance  # the maximum distance (endpoints, total time and contact schedule mismatch) of a near miss from the new problem
+        os.makedirs(self.directory, exist_ok = True)
+    def model_signature(self, model):  # the hash of the parameters of the quadruped robot model
+        parameters = np.concatenate(([model.mass, model.g], model.I.ravel(), model.feet_pos.ravel(),
+                                     [model.feet_height, model.feet_x_dist, model.feet_y_dist, model.body_length_x, model.body_length_y, model.body_length_z]))
+        return hashlib.sha256(np.round(parameters, 12).tobytes()).hexdigest()
+    # the hash of the problem signature (format version, model parameters, contact schedule, K, dt, endpoints, integrator and cost weights)
+    def key(self, model, feet_phases, dt, x0, x_target, integrator = "euler", cost_weights = None):
+        feet_phases = np.asarray(feet_phases, dtype = bool)
+        signature = [str(trajectory_cache.version).encode(), self.model_signature(model).encode(), np.array(feet_phases.shape).tobytes(), feet_phases.tobytes(),
+                     np.round([dt], 12).tobytes(), np.round(np.ravel(x0), 12).tobytes(), np.round(np.ravel(x_target), 12).tobytes(), integrator.encode(),
+                     json.dumps(full_cost_weights(cost_weights), sort_keys = True).encode()]
+        return hashlib.sha256(b"".join(signature)).hexdigest()
+    def get(self, key):  # the cache entry of an exact hit, or None
+        path = os.path.join(self.directory, key + ".npz")
+        try:
+            with np.load(path) as data: entry = {name: data[name] for name in data.files}  # load the whole entry, the file may be evicted later
+        except (FileNotFoundError, OSError, ValueError): return None
+        self.touch(key)  # the entry is now the most recently used one
+        return entry
+    # the cache entry of the nearest solved problem of the same model (a near miss), or None if there is no entry closer than max_distance
+    def nearest(self, model, feet_phases, dt, x0, x_target, integrator = "euler", cost_weights = None):
+        feet_phases = np.asarray(feet_phases, dtype = bool); K = feet_phases.shape[1]
+        model_signature = self.model_signature(model); cost_weights = full_cost_weights(cost_weights)
+        nearest_key, nearest_distance = None, self.max_distance
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"): continue
+            try:
+                with open(os.path.join(self.directory, name)) as meta_file: meta = json.load(meta_file)
+            except (OSError, ValueError): continue  # the entry is being written or evicted by another process
+            if meta.get("version") != trajectory_cache.version: continue  # an entry of another format version
+            cached_phases = np.array(meta["feet_phases"], dtype = bool)
+            if meta["model_signature"] != model_signature or meta["integrator"] != integrator or meta["cost_weights"] != cost_weights or cached_phases.shape[0] != feet_phases.shape[0]: continue
+            cached_K = cached_phases.shape[1]
+            # the fraction of the contact schedule that differs, on the normalized time grid
+            phases_mismatch = np.mean(cached_phases[:, np.round(np.linspace(0., cached_K - 1, K)).astype(int)] != feet_phases)
+            distance = np.linalg.norm(np.ravel(x0) - meta["x0"]) + np.linalg.norm(np.ravel(x_target) - meta["x_target"]) + abs((K - 1) * dt - (cached_K - 1) * meta["dt"]) + phases_mismatch
+            if distance < nearest_distance: nearest_key, nearest_distance = name[:-5], distance
+        return None if nearest_key is None else self.get(nearest_key)
+    def put(self, key, model, feet_phases, dt, x0, x_target, problem, states, inputs, info):  # save the solution of a solved problem
+        entry = {"states": states, "inputs": inputs, "mult_g": np.ravel(info["mult_g"]), "mult_x_L": np.ravel(info["mult_x_L"]), "mult_x_U": np.ravel(info["mult_x_U"]),
+                 "fix_feet_pairs": problem.fix_feet_pairs, "friction_pairs": problem.friction_pairs, "status": info["status"],
+                 "status_msg": info["status_msg"].decode() if isinstance(info["status_msg"], bytes) else str(info["status_msg"]), "obj_val": info["obj_val"],
+                 "iterations": info.get("iterations", 0)}
+        meta = {"version": trajectory_cache.version, "model_signature": self.model_signature(model),
+                "feet_phases": np.asarray(feet_phases, dtype = bool).astype(int).tolist(), "dt": float(dt), "x0": np.ravel(x0).tolist(),
+                "x_target": np.ravel(x_target).tolist(), "integrator": problem.integrator, "cost_weights": problem.cost_weights}
+        with open(os.path.join(self.directory, key + ".npz.tmp"), "wb") as entry_file:
+            np.savez(entry_file, **entry)
+        with open(os.path.join(self.directory, key + ".json.tmp"), "w") as meta_file:
+            json.dump(meta, meta_file)
+        os.replace(os.path.join(self.directory, key + ".npz.tmp"), os.path.join(self.directory, key + ".npz"))  # the files are replaced atomically, so other processes never read half written entries
+        os.replace(os.path.join(self.directory, key + ".json.tmp"), os.path.join(self.directory, key + ".json"))
+        self.evict()
+    def touch(self, key):  # mark the entry as the most recently used one
+        try:
+            os.utime(os.path.join(self.directory, key + ".npz"))
+        except FileNotFoundError: pass
+    def evict(self):  # remove the least recently used entries until the cache is below its size cap and its maximum number of entries
+        entries = []  # the (last used time, size, key) of every entry
+        for name in os.listdir(self.directory):
+            if not name.endswith(".npz"): continue
+            try:
+                stats = os.stat(os.path.join(self.directory, name))
+                entries.append((stats.st_mtime, stats.st_size, name[:-4]))
+            except FileNotFoundError: continue
+        entries.sort()
+        total_bytes = sum(entry[1] for entry in entries)
+        while entries and (total_bytes > self.max_bytes or len(entries) > self.max_entries):
+            last_used, size, key = entries.pop(0)
+            total_bytes -= size
+            for extension in (".npz", ".json"):
+                try:
+                    os.remove(os.path.join(self.directory, key + extension))
+                except FileNotFoundError: pass
+    # resample the cached primal and dual solution onto the knot grid of the problem, returns the initial x, the constraints multipliers and the lower/upper bounds multipliers
+    def warm_start(self, entry, problem):
+        K, cached_K = problem.K, entry["states"].shape[0]
+        x_start = np.concatenate((resample_knot_values(entry["states"], K).ravel(), resample_knot_values(entry["inputs"], K - 1).ravel()))  # the resampled states and control inputs
+        Q = x_start[: K * problem.N].reshape((K, problem.N))[:, problem.body_com_dim : problem.body_com_dim + 4]  # the resampled quaternions are normalized again
+        Q /= np.linalg.norm(Q, axis = 1, keepdims = True)
+        mult_x = []  # the resampled lower and upper bounds multipliers
+        for mult in (entry["mult_x_L"], entry["mult_x_U"]):
+            mult_x.append(np.concatenate((resample_knot_values(mult[: cached_K * problem.N].reshape((cached_K, problem.N)), K).ravel(),
+                                          resample_knot_values(mult[cached_K * problem.N :].reshape((cached_K - 1, problem.M)), K - 1).ravel())))
+        mult_g = entry["mult_g"]  # the cached constraints multipliers and the pairs (foot, knot point) of their feet constraints
+        cached_fix, cached_friction = entry["fix_feet_pairs"].reshape((-1, 2)), entry["friction_pairs"].reshape((-1, 2))
+        dyn_end = (cached_K - 1) * problem.body_state_dim  # the ends of the constraints blocks of the cached problem
+        fix_end = dyn_end + 2 * len(cached_fix)
+        quat_end = fix_end + cached_K
+        friction_end = quat_end + 4 * len(cached_friction)
+        mult_g = np.concatenate((resample_knot_values(mult_g[: dyn_end].reshape((cached_K - 1, problem.body_state_dim)), K - 1).ravel(),
+                                 resample_feet_pairs_values(mult_g[dyn_end : fix_end].reshape((-1, 2)), cached_fix, cached_K, problem.fix_feet_pairs, K).ravel(),
+                                 resample_knot_values(mult_g[fix_end : quat_end], K),
+                                 resample_feet_pairs_values(mult_g[quat_end : friction_end].reshape((-1, 4)), cached_friction, cached_K, problem.friction_pairs, K).ravel(),
+                                 resample_knot_values(mult_g[friction_end :].reshape((cached_K, 3 * problem.feet_number)), K).ravel()))
+        return x_start, mult_g, mult_x[0], mult_x[1]  # return the warm start point
+
+# this class plans the trajectory in a receding horizon (MPC), it solves a short horizon trajectory_optimization problem from the current state at every knot point and applies only
+# its first control input
+class receding_horizon_planner():
+    def __init__(self, model, feet_phases, dt, horizon, hessian_approximation = None, tol = 1e-5, max_iter = 50, print_level = 0, problems_size = 64,
+                 integrator = "euler", cost_weights = None, scaling = "model", kernels = None):
+        self.model = model  # the quadruped robot model
+        self.feet_phases = np.asarray(feet_phases, dtype = bool)  # the gaits sequence / feet phases of the whole trajectory (feet_number, K)
+        self.K = self.feet_phases.shape[1]  # the total number of the knot points of the whole trajectory
+        self.dt = dt  # the time step in sec
+        self.horizon = max(2, int(horizon))  # the number of the knot points of every window
+        # the solver options of every window (by default the exact Hessian for euler and L-BFGS otherwise)
+        self.hessian_approximation, self.tol, self.max_iter, self.print_level = solver_hessian_approximation(integrator, hessian_approximation), tol, max_iter, print_level
+        self.integrator = integrator  # the transcription of the dynamics between the knot points
+        self.cost_weights = full_cost_weights(cost_weights)  # the weights of the cost terms of every window
+        self.scaling = scaling  # the scaling method of every window (one of trajectory_optimization.scaling_methods)
+        self.kernels = kernels  # the generated dynamics kernels of the windows (None uses the numpy functions of the model)
+        self.max_force = 10 * model.mass * model.g  # the bound of every foot force component
+        self.problems = {}  # the problems of the recent windows, keyed by their contact schedules (a periodic gait repeats its windows, so their sparsity structures are built once)
+        self.problems_size = problems_size  # the maximum number of the kept problems
+    def window_problem(self, k):  # the problem of the window that starts at the knot point k (the window is shorter at the end of the trajectory)
+        window_phases = self.feet_phases[:, k : k + self.horizon]  # the contact schedule of the window
+        key = window_phases.tobytes() + bytes([window_phases.shape[1]])  # the contact schedule and the length of the window
+        problem = self.problems.pop(key, None)
+        if problem is None:
+            x_dummy = np.zeros((self.model.N, 1))  # the initial and the target states are set before every solve
+            dynamics_batch, dynamics_dx_batch, dynamics_du_batch, dynamics_hess_batch = batch_dynamics_functions(self.model, window_phases.shape[1], self.kernels)
+            problem = trajectory_optimization(self.model.quadruped_dynamics, self.model.quadruped_dynamics_dxquad, self.model.quadruped_dynamics_du, x_dummy, x_dummy,
+                                              window_phases.shape[1], self.dt, window_phases, dynamics_batch = dynamics_batch, dynamics_dx_batch = dynamics_dx_batch,
+                                              dynamics_du_batch = dynamics_du_batch, dynamics_hess_batch = dynamics_hess_batch, verbose = self.print_level > 0,
+                                              integrator = self.integrator, hessian_approximation = self.hessian_approximation, cost_weights = self.cost_weights,
+                                              force_scale = self.model.mass * self.model.g)
+        self.problems[key] = problem  # the most recently used problem is the last one
+        if len(self.problems) > self.problems_size: self.problems.pop(next(iter(self.problems)))  # drop the least recently used problem
+        return problem
+    # solve the window that starts at the knot point k from the current state x_current (N, 1) to the reference state x_reference (N, 1), x_start is the warm start (or None for the
+    # default initial guess)
+    def solve_window(self, k, x_current, x_reference, x_start = None):
+        problem = self.window_problem(k)
+        problem.x0, problem.x_target, problem.iterations = x_current, x_reference, 0
+        if k + problem.K < self.K:  # an intermediate window only reaches the body pose of the reference, the last window reaches the whole target state
+            problem.target_indexes = np.r_[0 : problem.body_position_dim, problem.body_com_dim : problem.body_com_dim + 4]
+        else: problem.target_indexes = np.r_[0 : problem.body_state_dim - 3, problem.body_state_dim : problem.N]
+        # a copy of the cached bounds template with the new end states
+        opt_lb, opt_ub, c_lb, c_ub = problem.bounds(self.max_force, self.model.legs_bounds_x, self.model.legs_bounds_y, self.model.legs_bounds_z)
+        # the solver reuses the sparsity structure of the problem
+        nltopt_solver = cyipopt.Problem(n = problem.x_dim, m = problem.eq_dim + problem.ineq_dim, problem_obj = problem, lb = opt_lb, ub = opt_ub, cl = c_lb, cu = c_ub)
+        nltopt_solver.add_option("jacobian_approximation", "exact")
+        nltopt_solver.add_option("hessian_approximation", self.hessian_approximation)
+        nltopt_solver.add_option("print_level", self.print_level)
+        set_solver_scaling(nltopt_solver, problem, self.model, self.scaling)
+        nltopt_solver.add_option("tol", self.tol)
+        nltopt_solver.add_option("max_iter", self.max_iter)
+        if x_start is None: x_start = problem.initial_guess()
+        else: nltopt_solver.add_option("mu_init", 1e-4)  # the shifted solution of the previous window is already close to the solution
+        xopt, info = nltopt_solver.solve(np.clip(np.ravel(x_start), opt_lb, opt_ub))  # the warm start must obey the bounds of the new window
+        info["iterations"] = problem.iterations
+        # return the states, the control inputs and the solver info of the window
+        return xopt[: problem.K * problem.N].reshape((problem.K, problem.N)), xopt[problem.K * problem.N :].reshape((problem.K - 1, problem.M)), info
+    # run the receding horizon from the initial to the final state, returns the applied states (K, N), the applied control inputs (K - 1, M) and the info with the per window solve
+    # latencies
+    def run(self, initial_com_position, initial_body_orientation, final_com_position, final_body_orientation, reference_states = None, measure_state = None):
+        x_current = self.model.state(initial_com_position, initial_body_orientation).reshape((self.model.N, 1))  # the current state
+        x_target = self.model.state(final_com_position, final_body_orientation).reshape((self.model.N, 1))  # the target state of the whole trajectory
+        if reference_states is None:  # the reference is the initial guess of the whole trajectory (linear positions and slerp-like orientations), an offline solution can be given instead
+            reference_states = initial_guess_states(x_current, x_target, self.K, self.model.N)
+        states, inputs, latencies, iterations, statuses = [x_current[:, 0]], [], [], 0, []  # the applied states and control inputs, and the statistics of the windows
+        window_states = window_inputs = None  # the solution of the previous window
+        for k in range(self.K - 1):
+            x_reference = (x_target if k + self.horizon >= self.K else reference_states[k + self.horizon - 1].reshape((self.model.N, 1)))  # the reference state at the end of the window
+            x_start = None
+            if window_states is not None:  # shift the previous solution one knot point forward, repeating its last state and control input
+                window_K = min(self.horizon, self.K - k)  # the number of the knot points of this window
+                shifted_states = np.vstack([window_states[1:], window_states[-1:]])[:window_K]
+                shifted_inputs = np.vstack([window_inputs[1:], window_inputs[-1:]])[: window_K - 1]
+                shifted_states[0] = x_current[:, 0]
+                x_start = np.concatenate([shifted_states.ravel(), shifted_inputs.ravel()])
+            solve_start_time = time.perf_counter()  # the wall time at the start of the solve
+            window_states, window_inputs, info = self.solve_window(k, x_current, x_reference, x_start)
+            latencies.append(time.perf_counter() - solve_start_time)
+            iterations += info["iterations"]
+            statuses.append(int(info["status"]))
+            x_predicted = window_states[1].reshape((self.model.N, 1))  # the state after the first control input, as predicted by the window
+            # the measured (or the predicted) next state
+            x_current = x_predicted if measure_state is None else np.asarray(measure_state(k, x_current, window_inputs[0], x_predicted), dtype = float).reshape((self.model.N, 1))
+            states.append(x_current[:, 0])
+            inputs.append(window_inputs[0])
+        latencies = np.array(latencies)  # the solve latency of every window in sec
+        info = {"status": next((status for status in statuses if status not in (0, 1)), 0), "windows": len(latencies),
+                "failed_windows": sum(status not in (0, 1) for status in statuses), "iterations": iterations, "latency_mean": float(latencies.mean()),
+                "latency_p50": float(np.percentile(latencies, 50)), "latency_p90": float(np.percentile(latencies, 90)),
+                "latency_p99": float(np.percentile(latencies, 99)), "latency_max": float(latencies.max()), "wall_time": float(latencies.sum())}
+        return np.array(states), np.array(inputs), info  # return the applied trajectory and the info
+
+# this class holds a complete scenario (robot model, endpoints, timing, contact schedule and solver options), it can be saved to and loaded from JSON or TOML files for unattended runs
+class quadruped_scenario():
+    def __init__(self, name = "scenario", model = None, initial_com_position = None, initial_body_orientation = (0, 0, 0), final_com_position = None,
+                 final_body_orientation = (45, 0, 0), dt = 0.1, total_time = 2, cycles_period = 1, gaits_period = 0.1, gaits_schedule = None, move_type = "walk",
+                 hessian_approximation = None, tol = 1e-5, max_iter = 100, integrator = "euler", cost_weights = None, scaling = "model"):
+        self.name = str(name)  # the name of the scenario, also used for the names of its result files
+        # the parameters of the quadruped robot model (the keyword arguments of quadruped_robot_model)
+        self.model = quadruped_robot_model().parameters() if model is None else quadruped_robot_model(**model).parameters()
+        robot_model = self.robot_model()  # the height of the center of mass when the robot stands on the ground
+        standing_height = robot_model.feet_height + robot_model.body_length_z/2
+        self.initial_com_position = [1., 1., standing_height] if initial_com_position is None else [float(value) for value in initial_com_position]  # the initial position of the center of mass in m
+        self.initial_body_orientation = [float(value) for value in initial_body_orientation]  # the initial ZYX Euler angles of the body in degrees
+        self.final_com_position = [2.5, 2., standing_height] if final_com_position is None else [float(value) for value in final_com_position]  # the final position of the center of mass in m
+        self.final_body_orientation = [float(value) for value in final_body_orientation]  # the final ZYX Euler angles of the body in degrees
+        self.dt = float(dt)  # the timing of the scenario in sec
+        self.total_time = float(total_time)
+        self.cycles_period = float(cycles_period)
+        self.gaits_period = float(gaits_period)
+        self.move_type = move_type  # the movement type used for the contact schedule when no gaits schedule is given
+        # the contact (True) or swing (False) phase of every foot and every gait
+        self.gaits_schedule = move_type_gaits_schedule(move_type, self.total_time, self.cycles_period, self.gaits_period,
+                                                       robot_model.feet_number) if gaits_schedule is None else np.array(gaits_schedule, dtype = bool)
+        if self.gaits_schedule.shape != (robot_model.feet_number, int(self.total_time / self.gaits_period)):
+            raise ValueError(f"the gaits schedule of the scenario {self.name} must have the shape {(robot_model.feet_number, int(self.total_time / self.gaits_period))}")
+        if integrator not in trajectory_optimization.integrators: raise ValueError(f"the integrator of the scenario {self.name} must be one of {trajectory_optimization.integrators}")
+        self.hessian_approximation = solver_hessian_approximation(integrator, hessian_approximation)  # the solver options (by default the exact Hessian for euler and L-BFGS otherwise)
+        self.tol = float(tol)
+        self.max_iter = int(max_iter)
+        self.integrator = integrator  # the transcription of the dynamics between the knot points
+        self.cost_weights = full_cost_weights(cost_weights)  # the weights of the cost terms (the default weights for the missing terms)
+        if scaling not in trajectory_optimization.scaling_methods: raise ValueError(f"the scaling method of the scenario {self.name} must be one of {trajectory_optimization.scaling_methods}")
+        self.scaling = scaling  # the scaling of the problem given to IPOPT
+    def robot_model(self):  # the quadruped robot model of the scenario
+        return quadruped_robot_model(**self.model)
+    def K(self):  # the total number of the knot points
+        return round(self.total_time / self.dt) + 1
+    def feet_phases(self):  # the contact schedule of the knot points (feet_number, K)
+        return gaits_sequence_to_feet_phases(self.gaits_schedule, self.gaits_period, self.dt, self.K())
+    def to_dict(self):  # the scenario as plain python values
+        return {"name": self.name, "dt": self.dt, "total_time": self.total_time, "cycles_period": self.cycles_period, "gaits_period": self.gaits_period,
+                "move_type": self.move_type, "gaits_schedule": self.gaits_schedule.astype(int).tolist(), "initial_com_position": self.initial_com_position,
+                "initial_body_orientation": self.initial_body_orientation, "final_com_position": self.final_com_position,
+                "final_body_orientation": self.final_body_orientation, "hessian_approximation": self.hessian_approximation, "tol": self.tol, "max_iter": self.max_iter,
+                "integrator": self.integrator, "cost_weights": self.cost_weights, "scaling": self.scaling, "model": self.model}
+    def save(self, path):  # save the scenario to a JSON or a TOML file (chosen by the file extension)
+        # converted before the file is opened, so a scenario TOML can not hold leaves no empty file
+        text = dict_to_toml(self.to_dict()) if path.endswith(".toml") else json.dumps(self.to_dict(), indent = 4)
+        with open(path, "w") as scenario_file:
+            scenario_file.write(text)
+    # solve the trajectory optimization problem of the scenario (with the generated dynamics kernels if given), returns the optimal states, the optimal control inputs and the
+    # solver info (with the profile of the solve if profile is set)
+    def solve(self, cache = None, print_level = 0, profile = False, kernels = None):
+        return plan_quadruped_trajectory(self.robot_model(), self.initial_com_position, self.initial_body_orientation, self.final_com_position,
+                                         self.final_body_orientation, self.feet_phases(), self.dt, hessian_approximation = self.hessian_approximation, tol = self.tol,
+                                         max_iter = self.max_iter, print_level = print_level, cache = cache, integrator = self.integrator, profile = profile,
+                                         cost_weights = self.cost_weights, scaling = self.scaling, kernels = kernels)
 
 # this class creates instances of the gait (foot phase) buttons
 class gait_button():
@@ -1040,24 +2154,28 @@ class gait_button():
     enter_button_state = "highlight"
     continuous_paint_state = "mark"
     background_offset = 3
-    def __init__(self, grid_background, gait_button_width, gait_button_height, gait_foot_index, gait_time_index, gait_cycle_index):
+    def __init__(self, grid_background, gait_button_width, gait_button_height, gait_foot_index, gait_time_index, gait_cycle_index, gaits_schedule):
         self.grid_background = grid_background  # the frame that contains the sequence grid
+        self.gaits_schedule = gaits_schedule  # the contact schedule (feet_number, gaits_number) boolean array, the button is a view of its element (gait_foot_index, gait_time_index)
         self.gait_button_width = gait_button_width  # the width of the gait button
         self.gait_button_height = gait_button_height  # the height of the gait button
         self.gait_foot_index = gait_foot_index  # the foot (the sequence grid row too) to which the gait belongs
         self.gait_time_index = gait_time_index  # the time moment (the sequence grid column too) that the gait refers to
         self.gait_cycle_index = gait_cycle_index  # the moving cycle to which the gait belongs
         self.control_highlight = 0  # 0 for highlighting the gait button, 1 for not highlighting
-        self.gait_button_is_pressed = False  # indicator for the gait button pressing state, it also works as an indicator for the foot phase (False/0 for swing and True/1 for contact)
+    @property
+    def gait_button_is_pressed(self):  # indicator for the gait button pressing state, it also works as an indicator for the foot phase (False/0 for swing and True/1 for contact)
+        return bool(self.gaits_schedule[self.gait_foot_index, self.gait_time_index])
     def set_button_on_grid(self, row, column):  # set the gait button on the gaits sequence grid
         self.button = self.grid_background.create_rectangle([column * self.gait_button_width + gait_button.background_offset, row * self.gait_button_height + gait_button.background_offset, \
                                                             (column + 1) * self.gait_button_width + gait_button.background_offset, (row + 1) * self.gait_button_height + gait_button.background_offset], width = 1, \
-                                                            fill = gait_button.unpress_colors[self.gait_cycle_index % 2], outline = "black", tags = f"button{self.gait_cycle_index}_{self.gait_foot_index}_{self.gait_time_index}")
+                                                            fill = gait_button.press_colors[self.gait_foot_index] if self.gait_button_is_pressed else gait_button.unpress_colors[self.gait_cycle_index % 2], outline = "black", tags = f"button{self.gait_cycle_index}_{self.gait_foot_index}_{self.gait_time_index}")
         self.grid_background.tag_bind(f"button{self.gait_cycle_index}_{self.gait_foot_index}_{self.gait_time_index}", "<Button-1>", self.press_button)
         self.grid_background.tag_bind(f"button{self.gait_cycle_index}_{self.gait_foot_index}_{self.gait_time_index}", "<Button-2>", self.change_continuous_paint_state)
         self.grid_background.tag_bind(f"button{self.gait_cycle_index}_{self.gait_foot_index}_{self.gait_time_index}", "<Button-3>", self.change_enter_button_mode)
         self.grid_background.tag_bind(f"button{self.gait_cycle_index}_{self.gait_foot_index}_{self.gait_time_index}", "<Enter>", self.highlight_button_paint_continuously)
         self.grid_background.tag_bind(f"button{self.gait_cycle_index}_{self.gait_foot_index}_{self.gait_time_index}", "<Leave>", self.unhighlight_button)
+        self.control_highlight = int(self.gait_button_is_pressed)
     def change_enter_button_mode(self, event = None):  # change the gait button color mode (highlight or paint) when the right mouse button is pressed
         if gait_button.enter_button_state == "highlight":
             gait_button.enter_button_state = "paint"
@@ -1087,13 +2205,15 @@ class gait_button():
         except:
             pass
     def press_button(self, event = None):  # press the gait button (meaning contact) or unpress it (meaning swing) based on the current gait button pressing state
+        self.gaits_schedule[self.gait_foot_index, self.gait_time_index] = not self.gait_button_is_pressed
+        self.update_button()
+    def update_button(self, event = None):  # show the current state of the element of the contact schedule (after the contact schedule array has been changed)
         if self.gait_button_is_pressed:
-            self.grid_background.itemconfigure(self.button, fill = gait_button.unpress_colors[self.gait_cycle_index % 2])
-            self.control_highlight = 0
-        else:
             self.grid_background.itemconfigure(self.button, fill = gait_button.press_colors[self.gait_foot_index])
             self.control_highlight = 1
-        self.gait_button_is_pressed = not self.gait_button_is_pressed
+        else:
+            self.grid_background.itemconfigure(self.button, fill = gait_button.unpress_colors[self.gait_cycle_index % 2])
+            self.control_highlight = 0
 
 
 # this class creates instances of menu button units
@@ -1121,6 +2241,23 @@ def L_matrix(q):  # the L(q) function
     q = q.reshape((4, -1)); s = q[0]; v = q[1:]  # extract the elements of the quaternion q
     L = np.block([[s, -v.T], [v, s * np.eye(3) + hat(v)]])
     return L  # return the 4x4 matrix L(q)
+def hat_batch(vectors):  # skew-symmetric matrices of the stacked vectors (..., 3)
+    v = np.asarray(vectors); H = np.zeros(v.shape[:-1] + (3, 3))
+    H[..., 0, 1] = -v[..., 2]
+    H[..., 0, 2] = v[..., 1]
+    H[..., 1, 0] = v[..., 2]
+    H[..., 1, 2] = -v[..., 0]
+    H[..., 2, 0] = -v[..., 1]
+    H[..., 2, 1] = v[..., 0]
+    return H  # return the (..., 3, 3) skew-symmetric matrices
+def L_matrix_batch(q):  # the L(q) function for the stacked quaternions (..., 4)
+    q = np.asarray(q); s = q[..., 0]; v = q[..., 1:]  # extract the elements of the quaternions
+    L = np.zeros(q.shape[:-1] + (4, 4))
+    L[..., 0, 0] = s
+    L[..., 0, 1:] = -v
+    L[..., 1:, 0] = v
+    L[..., 1:, 1:] = s[..., None, None] * np.eye(3) + hat_batch(v)
+    return L  # return the (..., 4, 4) matrices L(q)
 def R_matrix(q):  # the R(q) function
     q = q.reshape((4, -1)); s = q[0]; v = q[1:]  # extract the elements of the quaternion q
     R = np.block([[s, -v.T], [v, s * np.eye(3) - hat(v)]])
@@ -1132,6 +2269,23 @@ def q_to_R(q):  # convert the quaternion q to the corresponding rotation matrix
     r10 = 2. * (v1 * v2 + s * v3); r11 = 2. * (s**2 + v2**2) - 1.; r12 = 2. * (v2 * v3 - s * v1)  # the second row of the rotation matrix
     r20 = 2. * (v1 * v3 - s * v2); r21 = 2. * (v2 * v3 + s * v1); r22 = 2. * (s**2 + v3**2) - 1.  # the third row of the rotation matrix
     return np.array([[r00, r01, r02], [r10, r11, r12], [r20, r21, r22]])  # return the 3x3 rotation matrix
+def q_to_R_batch(q):  # convert the stacked quaternions (..., 4) to the corresponding rotation matrices (..., 3, 3)
+    q = np.asarray(q)  # extract the elements of the quaternions
+    s = q[..., 0]
+    v1 = q[..., 1]
+    v2 = q[..., 2]
+    v3 = q[..., 3]
+    R = np.zeros(q.shape[:-1] + (3, 3))
+    R[..., 0, 0] = 2. * (s**2 + v1**2) - 1.  # the first rows of the rotation matrices
+    R[..., 0, 1] = 2. * (v1 * v2 - s * v3)
+    R[..., 0, 2] = 2. * (v1 * v3 + s * v2)
+    R[..., 1, 0] = 2. * (v1 * v2 + s * v3)  # the second rows of the rotation matrices
+    R[..., 1, 1] = 2. * (s**2 + v2**2) - 1.
+    R[..., 1, 2] = 2. * (v2 * v3 - s * v1)
+    R[..., 2, 0] = 2. * (v1 * v3 - s * v2)  # the third rows of the rotation matrices
+    R[..., 2, 1] = 2. * (v2 * v3 + s * v1)
+    R[..., 2, 2] = 2. * (s**2 + v3**2) - 1.
+    return R  # return the (..., 3, 3) rotation matrices
 def q_to_R_2(q):  # convert the quaternion q to the corresponding rotation matrix R
     H = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1]])
     return H.T @ L_matrix(q) @ R_matrix(q).T @ H  # return the 3x3 rotation matrix
@@ -1157,8 +2311,736 @@ def dRTt_dq(q, t):  # the partial derivative of the vector R^T(q)*t (where R^T(q
     deriv[2, 0] = 2. * v2 * t1 - 2. * v1 * t2 + 4. * s * t3; deriv[2, 1] = 2. * v3 * t1 - 2. * s * t2; deriv[2, 2] = 2. * s * t1 + 2. * v3 * t2; deriv[2, 3] = 2. * v1 * t1 + 2. * v2 * t2 + 4. * v3 * t3  # the third row
     return deriv  # return the partial derivative of the vector R^T(q)*t with respect to the quaternion q
 
+def resample_knot_values(values, K):  # linearly resample the values (cached_K, ...) of the knot points onto K knot points of the same (normalized) time grid
+    values = np.asarray(values, dtype = float)
+    if len(values) < 2: return np.repeat(values, K, axis = 0)  # a single knot point is repeated
+    position = np.linspace(0., len(values) - 1, K)  # the position of every new knot point on the cached grid
+    index = np.minimum(position.astype(int), len(values) - 2)
+    weight = (position - index).reshape((-1,) + (1,) * (values.ndim - 1))
+    return (1. - weight) * values[index] + weight * values[index + 1]
+# map the values (P, ...) of the cached pairs (foot, knot point) to the new pairs, using the cached pair of the same foot at the nearest normalized time (zero if there is no such
+# pair within one knot point)
+def resample_feet_pairs_values(values, pairs, cached_K, new_pairs, K):
+    new_values = np.zeros((len(new_pairs),) + values.shape[1:])
+    for foot in np.unique(new_pairs[:, 0]) if len(new_pairs) else []:
+        old_rows = np.flatnonzero(pairs[:, 0] == foot); new_rows = np.flatnonzero(new_pairs[:, 0] == foot)
+        if len(old_rows) == 0: continue
+        old_times = pairs[old_rows, 1] / max(cached_K - 1, 1)  # the normalized times of the pairs (the pairs of every foot are sorted by knot point)
+        new_times = new_pairs[new_rows, 1] / max(K - 1, 1)
+        nearest = np.clip(np.searchsorted(old_times, new_times), 1, len(old_rows)) - 1
+        nearest += (nearest + 1 < len(old_rows)) & (np.abs(old_times[np.minimum(nearest + 1, len(old_rows) - 1)] - new_times) < np.abs(old_times[nearest] - new_times))
+        close = np.abs(old_times[nearest] - new_times) <= 1. / max(cached_K - 1, 1)  # only the pairs within one cached knot point are mapped
+        new_values[new_rows[close]] = values[old_rows[nearest[close]]]
+    return new_values
+def dRTt_dq_batch(q, t):  # the partial derivatives of the vectors R^T(q)*t with respect to the quaternions q, for the stacked quaternions (..., 4) and vectors (..., 3)
+    q = np.asarray(q); t = np.asarray(t)
+    s = q[..., 0]  # extract the elements of the quaternions q and the vectors t
+    v1 = q[..., 1]
+    v2 = q[..., 2]
+    v3 = q[..., 3]
+    t1 = t[..., 0]
+    t2 = t[..., 1]
+    t3 = t[..., 2]
+    deriv = np.zeros(np.broadcast_shapes(q.shape[:-1], t.shape[:-1]) + (3, 4))
+    deriv[..., 0, 0] = 4. * s * t1 + 2. * v3 * t2 - 2. * v2 * t3  # the first rows
+    deriv[..., 0, 1] = 4. * v1 * t1 + 2. * v2 * t2 + 2. * v3 * t3
+    deriv[..., 0, 2] = 2. * v1 * t2 - 2. * s * t3
+    deriv[..., 0, 3] = 2. * s * t2 + 2. * v1 * t3
+    deriv[..., 1, 0] = -2. * v3 * t1 + 4. * s * t2 + 2. * v1 * t3  # the second rows
+    deriv[..., 1, 1] = 2. * v2 * t1 + 2. * s * t3
+    deriv[..., 1, 2] = 2. * v1 * t1 + 4. * v2 * t2 + 2. * v3 * t3
+    deriv[..., 1, 3] = -2. * s * t1 + 2. * v2 * t3
+    deriv[..., 2, 0] = 2. * v2 * t1 - 2. * v1 * t2 + 4. * s * t3  # the third rows
+    deriv[..., 2, 1] = 2. * v3 * t1 - 2. * s * t2
+    deriv[..., 2, 2] = 2. * s * t1 + 2. * v3 * t2
+    deriv[..., 2, 3] = 2. * v1 * t1 + 2. * v2 * t2 + 4. * v3 * t3
+    return deriv  # return the (..., 3, 4) partial derivatives
+
+# the global functions below are needed for the trajectory planning without the GUI (headless)
+# expand the contact schedule of the gaits (feet_number, gaits_number) to the contact schedule of the knot points (feet_number, K)
+def gaits_sequence_to_feet_phases(gaits_schedule, gaits_period, dt, K):
+    gaits_schedule = np.asarray(gaits_schedule, dtype = bool)  # True for contact and False for swing, for every foot and every gait
+    feet_phases = np.zeros((len(gaits_schedule), K), dtype = bool)  # the gaits sequence / feet phases for each foot and each time step of the simulation
+    time_steps_per_gait = int(gaits_period / dt)  # the number of time steps per gait
+    steps_number = min(K, gaits_schedule.shape[1] * time_steps_per_gait)  # the knot points covered by the gaits (the last knot point is after the last gait)
+    # every knot point of a contact gait is in contact with the ground, otherwise it is in swing
+    feet_phases[:, :steps_number] = np.repeat(gaits_schedule, time_steps_per_gait, axis = 1)[:, :steps_number]
+    return feet_phases  # return the feet phases
+# the initial guess of the states (K, N) from the state x0 to the state x_target (not considering the body translational and angular velocities), linear for the positions and
+# slerp-like for the body orientation, it needs no trajectory_optimization problem (the receding horizon uses it as the reference of the whole trajectory)
+def initial_guess_states(x0, x_target, K, N):
+    x0, x_target = np.ravel(x0), np.ravel(x_target)
+    body_position_dim, body_com_dim, body_state_dim = 3, 6, 13  # the body position, the body center of mass and the body state variables at the start of the state
+    states = np.zeros((K, N))
+    k = np.arange(K).reshape((K, 1))  # the knot points
+    states[:, :body_position_dim] = x0[:body_position_dim] + (x_target[:body_position_dim] - x0[:body_position_dim]) * k / max(K - 1, 1)  # the body positions (center of mass)
+    states[:, body_state_dim :] = x0[body_state_dim :] + (x_target[body_state_dim :] - x0[body_state_dim :]) * k / max(K - 1, 1)  # the feet positions
+    initial_q_body = x0[body_com_dim : body_com_dim + 4]  # the initial and the target quaternions of the body orientation
+    final_q_body = x_target[body_com_dim : body_com_dim + 4]
+    dq = L_matrix(initial_q_body).T @ final_q_body  # the quaternion-based representation of the body orientation difference between the initial and the target states
+    phi_total = dq[1:] / dq[0] if dq[0] != 0. else dq[1:]  # phi_total is the 3D rotation difference vector between the initial and the target states
+    dqk = np.ones((K, 4))  # the quaternion-based representation of the body orientation difference between the state at every knot point and the initial state
+    dqk[:, 1:] = phi_total * k / max(K - 1, 1)
+    dqk /= np.linalg.norm(dqk, axis = 1, keepdims = True)
+    states[:, body_com_dim : body_com_dim + 4] = dqk @ L_matrix(initial_q_body).T  # the body orientations
+    return states  # return the initial guess of the states
+# find the optimal trajectory without any GUI, returns the optimal states (K, N), the optimal control inputs (K - 1, M) and the solver info, a trajectory_cache can be used to skip
+# or to warm start the solve, the integrator is one of trajectory_optimization.integrators, cost_weights overrides trajectory_optimization.default_cost_weights, scaling is one of
+# trajectory_optimization.scaling_methods, profile adds the report of a solve_profiler to the info
+def plan_quadruped_trajectory(model, initial_com_position, initial_body_orientation, final_com_position, final_body_orientation, feet_phases, dt,
+                              hessian_approximation = None, tol = 1e-5, max_iter = 100, print_level = 3, cache = None, progress_queue = None, cancel_event = None,
+                              integrator = "euler", profile = False, cost_weights = None, scaling = "model", kernels = None):
+    feet_phases = np.asarray(feet_phases, dtype = bool)  # the gaits sequence / feet phases (feet_number, K)
+    # by default the exact Hessian for euler and L-BFGS otherwise, the exact Hessian with another integrator raises a ValueError
+    hessian_approximation = solver_hessian_approximation(integrator, hessian_approximation)
+    if scaling not in trajectory_optimization.scaling_methods: raise ValueError(f"unknown scaling method {scaling}, it must be one of {trajectory_optimization.scaling_methods}")
+    K = feet_phases.shape[1]  # the total number of the knot points
+    x0 = model.state(initial_com_position, initial_body_orientation).reshape((model.N, 1))  # the initial state
+    x_target = model.state(final_com_position, final_body_orientation).reshape((model.N, 1))  # the target state
+    if cache is not None:  # an exact hit of the cache returns the cached solution immediately
+        key = cache.key(model, feet_phases, dt, x0, x_target, integrator, cost_weights)  # the hash of the problem signature
+        entry = cache.get(key)
+        if entry is not None:
+            return entry["states"], entry["inputs"], {"status": int(entry["status"]), "status_msg": str(entry["status_msg"]), "obj_val": float(entry["obj_val"]),
+                                                      "iterations": int(entry["iterations"]), "wall_time": 0., "mult_g": entry["mult_g"], "mult_x_L": entry["mult_x_L"],
+                                                      "mult_x_U": entry["mult_x_U"], "cache": "hit"}
+    profiler = solve_profiler() if profile else None  # the profiler of the solve (if enabled)
+    dynamics_batch, dynamics_dx_batch, dynamics_du_batch, dynamics_hess_batch = batch_dynamics_functions(model, K, kernels)  # the generated kernels (if given) or the numpy functions of the model
+    problem = trajectory_optimization(model.quadruped_dynamics, model.quadruped_dynamics_dxquad, model.quadruped_dynamics_du, x0, x_target, K, dt, feet_phases,
+                                      dynamics_batch = dynamics_batch, dynamics_dx_batch = dynamics_dx_batch, dynamics_du_batch = dynamics_du_batch,
+                                      dynamics_hess_batch = dynamics_hess_batch, verbose = print_level > 0, progress_queue = progress_queue, cancel_event = cancel_event,
+                                      integrator = integrator, hessian_approximation = hessian_approximation, profiler = profiler, cost_weights = cost_weights,
+                                      force_scale = model.mass * model.g)
+    # the bounds of the optimization variables and the constraints
+    opt_lb, opt_ub, c_lb, c_ub = problem.bounds(10 * model.mass * model.g, model.legs_bounds_x, model.legs_bounds_y, model.legs_bounds_z)
+    # use the cyipopt library to solve the trajectory optimization problem
+    # a profiled solve times the callbacks through a profiled_problem
+    nltopt_solver = cyipopt.Problem(n = problem.x_dim, m = problem.eq_dim + problem.ineq_dim,
+                                    problem_obj = problem if profiler is None else profiled_problem(problem, profiler), lb = opt_lb, ub = opt_ub, cl = c_lb, cu = c_ub)
+    nltopt_solver.add_option("jacobian_approximation", "exact")  # or "finite-difference-values"
+    nltopt_solver.add_option("hessian_approximation", hessian_approximation)  # the exact sparse Hessian of the Lagrangian ("exact") or the L-BFGS approximation ("limited-memory")
+    nltopt_solver.add_option("print_level", print_level)
+    set_solver_scaling(nltopt_solver, problem, model, scaling)
+    nltopt_solver.add_option("tol", tol)  # the tolerance for the convergence of the optimization algorithm
+    nltopt_solver.add_option("max_iter", max_iter)  # the maximum number of iterations for the optimization algorithm
+    x_start, mult_g, mult_x_L, mult_x_U, cache_use = problem.initial_guess(), [], [], [], "miss"  # the initial point, by default the linear/slerp-like guess without multipliers
+    entry = cache.nearest(model, feet_phases, dt, x0, x_target, integrator, cost_weights) if cache is not None else None  # a near miss of the cache, resampled onto the new knot grid
+    if entry is not None:
+        x_start, mult_g, mult_x_L, mult_x_U = cache.warm_start(entry, problem); cache_use = "warm"
+        nltopt_solver.add_option("warm_start_init_point", "yes")  # start from the given primal and dual solution
+        # do not push the warm start point far from the bounds
+        for option in ["warm_start_bound_push", "warm_start_bound_frac", "warm_start_slack_bound_push", "warm_start_slack_bound_frac", "warm_start_mult_bound_push"]:
+            nltopt_solver.add_option(option, 1e-6)
+        nltopt_solver.add_option("mu_init", 1e-4)  # a small initial barrier parameter, the warm start point is already close to the solution
+    solve_start_time = time.perf_counter()  # the wall time at the start of the solve
+    # solve the trajectory optimization problem and save the states that follow the optimal trajectory and obey the constraints
+    xopt, info = nltopt_solver.solve(x_start, lagrange = mult_g, zl = mult_x_L, zu = mult_x_U)
+    info["wall_time"] = time.perf_counter() - solve_start_time  # the wall time of the solve in sec
+    if profiler is not None: info["profile"] = profiler.report(info["wall_time"])  # the calls and the wall time of the callbacks and of the dynamics, and the progress of every iteration
+    info["iterations"] = problem.iterations  # the number of the iterations done by the solver and the use of the cache (hit, warm or miss)
+    info["cache"] = cache_use
+    states = xopt[: K * model.N].reshape((K, model.N))  # the states of the optimal trajectory
+    inputs = xopt[K * model.N :].reshape((K - 1, model.M))  # the control inputs of the optimal trajectory
+    if cache is not None and info["status"] in (0, 1):  # only the solved (or acceptable) trajectories are cached
+        cache.put(key, model, feet_phases, dt, x0, x_target, problem, states, inputs, info)
+    return states, inputs, info  # return the optimal trajectory and the solver info
+# integrate the body dynamics of many states (B, N) at once over dt, in steps RK4 steps with the zero-order hold inputs (B, M) and contacts (B, feet_number), the feet are held and
+# the quaternions are normalized after every step, returns the final states (B, N)
+def integrate_body_dynamics(model, states, inputs, contacts, dt, steps):
+    states = np.array(states, dtype = float); h = dt / steps  # the integrated states and the internal time step
+    body, q = slice(0, model.body_state_dim), slice(model.body_com_dim, model.body_com_dim + 4)  # the body state and the quaternion variables
+    f = lambda X: model.quadruped_dynamics_batch(X, inputs, contacts)  # the body dynamics at the states X
+    moved = lambda increment: np.concatenate((states[:, body] + increment, states[:, model.body_state_dim :]), axis = 1)  # the states moved by the body increment
+    for step in range(steps):
+        k1 = f(states); k2 = f(moved(k1 * (h / 2))); k3 = f(moved(k2 * (h / 2))); k4 = f(moved(k3 * h))
+        states[:, body] += (k1 + 2 * k2 + 2 * k3 + k4) * (h / 6)
+        states[:, q] /= np.linalg.norm(states[:, q], axis = 1, keepdims = True)
+    return states
+# the local errors of a trajectory, every interval is integrated from its first knot point in fine RK4 steps and compared with its last knot point, returns the position errors (K -
+# 1,) in m and the orientation errors (K - 1,) in degrees
+def interval_errors(model, states, inputs, feet_phases, dt, substeps = 20):
+    predicted = integrate_body_dynamics(model, states[:-1], inputs, np.asarray(feet_phases, dtype = bool)[:, :-1].T, dt, substeps)  # the states at the end of every interval
+    position_errors = np.linalg.norm(predicted[:, : model.body_position_dim] - states[1:, : model.body_position_dim], axis = 1)
+    q_predicted, q_planned = predicted[:, model.body_com_dim : model.body_com_dim + 4],\
+                             states[1:, model.body_com_dim : model.body_com_dim + 4] / np.linalg.norm(states[1:, model.body_com_dim : model.body_com_dim + 4], axis = 1, keepdims = True)
+    orientation_errors = np.degrees(2 * np.arccos(np.clip(np.abs(np.sum(q_predicted * q_planned, axis = 1)), 0., 1.)))  # the angle between the predicted and the planned orientations
+    return position_errors, orientation_errors
+# roll out many planned trajectories at once from their initial states, every interval in substeps RK4 steps with the zero-order hold inputs (B, K - 1, M) and contacts (B,
+# feet_number, K) and with the planned feet positions (B, K, N) of its first knot point, returns the simulated states (B, K, N)
+def simulate_trajectories(model, planned_states, inputs, feet_phases, dt, substeps = 10):
+    planned_states = np.asarray(planned_states, dtype = float)  # the planned states and the number of the body state variables
+    body = model.body_state_dim
+    feet_phases = np.asarray(feet_phases, dtype = bool)
+    states = np.array(planned_states)  # the simulated states, the feet follow the plan
+    for k in range(planned_states.shape[1] - 1):
+        states[:, k + 1, :body] = integrate_body_dynamics(model, states[:, k], inputs[:, k], feet_phases[:, :, k], dt, substeps)[:, :body]
+    return states
+# the drift of the simulated states (B, K, N) from the planned states (B, K, N), returns the position drifts (B, K) in m and the orientation drifts (B, K) in degrees
+def trajectories_drift(model, simulated_states, planned_states):
+    q = slice(model.body_com_dim, model.body_com_dim + 4)  # the quaternion variables
+    position_drifts = np.linalg.norm(simulated_states[:, :, : model.body_position_dim] - planned_states[:, :, : model.body_position_dim], axis = 2)
+    q_simulated, q_planned = simulated_states[:, :, q], planned_states[:, :, q] / np.linalg.norm(planned_states[:, :, q], axis = 2, keepdims = True)
+    orientation_drifts = np.degrees(2 * np.arccos(np.clip(np.abs(np.sum(q_simulated * q_planned, axis = 2)), 0., 1.)))  # the angle between the simulated and the planned orientations
+    return position_drifts, orientation_drifts
+def trajectory_files(paths):  # the trajectory files of the given files and directories (the .traj files of every directory, sorted)
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(".traj"))
+        else: files.append(path)
+    return files
+# simulate the trajectory files (or the directories of trajectory files) at substeps internal steps per knot interval and measure their drift from the plan, the trajectories of the
+# same model, K and dt are simulated as one batch, returns a list of rows in the order of the files
+def verify_trajectory_files(paths, substeps = 10):
+    groups = {}  # the files of every batch, by model, K and dt
+    for path in trajectory_files(paths):
+        states, inputs, header = load_trajectory(path)
+        groups.setdefault((json.dumps(header["model"], sort_keys = True), header["K"], header["dt"]),
+                          []).append((path, np.array(states), np.array(inputs), np.array(header["feet_phases"], dtype = bool)))
+    rows = {}  # the rows of the files
+    for (model, K, dt), trajectories in groups.items():
+        start_time = time.perf_counter()  # the wall time at the start of the batch
+        model = quadruped_robot_model(**json.loads(model)) if model != "null" else quadruped_robot_model()
+        planned_states = np.stack([trajectory[1] for trajectory in trajectories])
+        simulated_states = simulate_trajectories(model, planned_states, np.stack([trajectory[2] for trajectory in trajectories]),
+                                                 np.stack([trajectory[3] for trajectory in trajectories]), dt, substeps)
+        position_drifts, orientation_drifts = trajectories_drift(model, simulated_states, planned_states)
+        wall_time = (time.perf_counter() - start_time) / len(trajectories)  # the wall time of the batch, shared by its trajectories
+        for b, trajectory in enumerate(trajectories):
+            rows[trajectory[0]] = {"trajectory_file": trajectory[0], "K": K, "dt": dt, "substeps": substeps, "max_position_drift": float(position_drifts[b].max()),
+                                   "final_position_drift": float(position_drifts[b, -1]), "max_orientation_drift": float(orientation_drifts[b].max()),
+                                   "final_orientation_drift": float(orientation_drifts[b, -1]), "wall_time": wall_time}
+    return [rows[path] for path in trajectory_files(paths) if path in rows]  # return the rows in the order of the files
+# solve the scenario with every integrator and every time step, and compare their accuracy (the local errors against fine RK4 integration) and their wall time, returns a list of
+# rows
+def integrators_report(scenario, integrators = None, dt_values = None, substeps = 20, kernels = None):
+    # all the integrators hold the control inputs and the contacts of the first knot point over every interval (a zero-order hold, see trajectory_optimization.dynamics_increments), and so does the
+    # reference integration, so the errors measure the integration of the dynamics under that hold (not the textbook trapezoidal/Hermite-Simpson schemes with interpolated inputs)
+    rows = []  # one row for every integrator and time step
+    for integrator, dt in itertools.product(integrators or trajectory_optimization.integrators, dt_values or [scenario.dt]):
+        # the same motion with the integrator and the time step of the row (and the default Hessian mode of the other integrators)
+        case = quadruped_scenario(**{**scenario.to_dict(), "dt": dt, "integrator": integrator, "hessian_approximation": scenario.hessian_approximation if integrator == scenario.integrator else None})
+        model, feet_phases = case.robot_model(), case.feet_phases()
+        states, inputs, info = case.solve(kernels = kernels)
+        position_errors, orientation_errors = interval_errors(model, states, inputs, feet_phases, dt, substeps)
+        rows.append({"integrator": integrator, "input_hold": "zero-order", "hessian_approximation": case.hessian_approximation, "dt": dt, "K": case.K(),
+                     "status": int(info["status"]), "iterations": int(info["iterations"]), "wall_time": float(info["wall_time"]),
+                     "max_position_error": float(position_errors.max()), "mean_position_error": float(position_errors.mean()),
+                     "max_orientation_error": float(orientation_errors.max()), "mean_orientation_error": float(orientation_errors.mean())})
+    return rows  # return the rows of the report
+# set the scaling method of the solver of the problem, the "model" method gives IPOPT the scaling factors of the problem for the body size, the weight and the gravity of the model
+def set_solver_scaling(nltopt_solver, problem, model, scaling):
+    if scaling == "model":
+        x_scaling, g_scaling = problem.scaling(max(model.body_length_x, model.body_length_y, model.body_length_z), model.mass * model.g, model.g)
+        nltopt_solver.set_problem_scaling(obj_scaling = 1., x_scaling = x_scaling, g_scaling = g_scaling)  # the cost is already of order one
+        nltopt_solver.add_option("nlp_scaling_method", "user-scaling")
+    else: nltopt_solver.add_option("nlp_scaling_method", scaling)
+def cost_weight_argument(text):  # the (term, weight) of a TERM=WEIGHT command-line argument
+    term, separator, weight = text.partition("=")
+    if not separator or term not in trajectory_optimization.default_cost_weights:
+        raise argparse.ArgumentTypeError(f"the cost weights are given as TERM=WEIGHT, the terms are {list(trajectory_optimization.default_cost_weights)}")
+    try: weight = float(weight)
+    except ValueError: raise argparse.ArgumentTypeError(f"the weight of the cost term {term} must be a number")
+    if weight < 0: raise argparse.ArgumentTypeError(f"the weight of the cost term {term} must not be negative")
+    return term, weight
+# the Hessian mode of the solver for the integrator, None gives the exact Hessian of the Lagrangian for euler and the limited-memory (L-BFGS) approximation for the other
+# integrators
+def solver_hessian_approximation(integrator, hessian_approximation = None):
+    if hessian_approximation is None: return "exact" if integrator == "euler" else "limited-memory"
+    if hessian_approximation not in trajectory_optimization.hessian_approximations:
+        raise ValueError(f"unknown Hessian approximation {hessian_approximation}, it must be one of {trajectory_optimization.hessian_approximations}")
+    if hessian_approximation == "exact" and integrator != "euler":
+        raise ValueError(f"the exact Hessian of the Lagrangian is available only for the euler integrator, use the limited-memory Hessian approximation with the {integrator} integrator")
+    return hessian_approximation
+def full_cost_weights(cost_weights = None):  # the weights of all the cost terms, the given weights (a dictionary by term) over the default weights
+    cost_weights = {**trajectory_optimization.default_cost_weights, **(cost_weights or {})}
+    unknown = set(cost_weights) - set(trajectory_optimization.default_cost_weights)  # the misspelled terms must not be silently ignored
+    if unknown: raise ValueError(f"unknown cost terms {sorted(unknown)}, the terms are {list(trajectory_optimization.default_cost_weights)}")
+    if any(weight < 0 for weight in cost_weights.values()): raise ValueError("the weights of the cost terms must not be negative")
+    return {term: float(weight) for term, weight in cost_weights.items()}
+# run plan_quadruped_trajectory in a background process and put its result ("done", states, inputs, info) or its error ("error", message) to result_queue
+def plan_quadruped_trajectory_worker(result_queue, *args, **kwargs):
+    try:
+        result_queue.put(("done",) + plan_quadruped_trajectory(*args, **kwargs))
+    except Exception as error:
+        result_queue.put(("error", repr(error)))
+# the contact schedule of the gaits of one cycle (feet_number, gaits_number_per_cycle) for the movement type move_type
+def move_type_cycle_contacts(move_type, gaits_number_per_cycle, feet_number = 4):
+    contact_phases = quadruped_robot_model.move_types_contact_phases[quadruped_robot_model.move_types_list.index(move_type)]  # the contact phases of every foot for the movement type
+    cycle_contacts = np.zeros((feet_number, gaits_number_per_cycle), dtype = bool)  # True for contact and False for swing, for every foot and every gait of the cycle
+    for foot in range(feet_number):
+        for contact_interval in contact_phases[foot]: cycle_contacts[foot, int(contact_interval[0] * gaits_number_per_cycle) : int(contact_interval[1] * gaits_number_per_cycle)] = True
+    return cycle_contacts
+# the contact schedule of the gaits (feet_number, gaits_number) when the movement type move_type is applied to all the cycles
+def move_type_gaits_schedule(move_type, total_time, cycles_period, gaits_period, feet_number = 4):
+    cycles_number = int(total_time / cycles_period)  # the number of cycles
+    gaits_number_per_cycle = int(total_time / gaits_period / cycles_number)  # the number of gaits per cycle
+    return np.tile(move_type_cycle_contacts(move_type, gaits_number_per_cycle, feet_number), cycles_number)  # every cycle has the same contact schedule
+def parameter_sweep_cases(sweep):  # expand the sweep specification (a dictionary of lists) to the list of the cases (dictionaries) of all the combinations
+    cases = []  # the cases of the sweep
+    for move_type, mass, dt, total_time, final_pose in itertools.product(sweep.get("move_types", ["walk"]), sweep.get("masses", [quadruped_robot_model.default_mass]),
+                                                                         sweep.get("dt_values", [0.1]), sweep.get("total_time_values", [2]),
+                                                                         sweep.get("final_poses", [[[1.5, 1, None], [45, 0, 0]]])):
+        cases.append({"index": len(cases), "move_type": move_type, "mass": float(mass), "dt": float(dt), "total_time": float(total_time),
+                      "cycles_period": float(sweep.get("cycles_period", 1)), "gaits_period": float(sweep.get("gaits_period", 0.1)),
+                      "initial_pose": sweep.get("initial_pose", [[0, 0, None], [0, 0, 0]]), "final_pose": final_pose,
+                      "hessian_approximation": sweep.get("hessian_approximation"), "tol": float(sweep.get("tol", 1e-5)), "max_iter": int(sweep.get("max_iter", 100)),
+                      "cost_weights": full_cost_weights(sweep.get("cost_weights")), "scaling": sweep.get("scaling", "model"),
+                      "cache_directory": sweep.get("cache_directory"), "kernels_directory": sweep.get("kernels_directory")})
+    return cases  # return the cases
+def solve_parameter_sweep_case(case):  # solve a single case of the sweep (it runs in a worker process of the pool), a None z component of a pose means the standing height of the robot
+    start_time = time.perf_counter()  # the wall time at the start of the solve
+    try:
+        model = quadruped_robot_model(mass = case["mass"])  # the quadruped robot model of the case
+        standing_height = model.feet_height + model.body_length_z/2  # the height of the center of mass when the robot stands on the ground
+        initial_com_position = [standing_height if value is None else value for value in case["initial_pose"][0]]
+        final_com_position = [standing_height if value is None else value for value in case["final_pose"][0]]
+        K = round(case["total_time"] / case["dt"]) + 1  # the total number of the knot points
+        # the feet phases of the case
+        feet_phases = gaits_sequence_to_feet_phases(move_type_gaits_schedule(case["move_type"], case["total_time"], case["cycles_period"], case["gaits_period"], model.feet_number),
+                                                    case["gaits_period"], case["dt"], K)
+        states, inputs, info = plan_quadruped_trajectory(model, initial_com_position, case["initial_pose"][1], final_com_position, case["final_pose"][1], feet_phases,
+                                                         case["dt"], hessian_approximation = case["hessian_approximation"], tol = case["tol"],
+                                                         max_iter = case["max_iter"], print_level = 0,
+                                                         cache = None if case["cache_directory"] is None else trajectory_cache(case["cache_directory"]),
+                                                         cost_weights = case["cost_weights"], scaling = case["scaling"],
+                                                         kernels = None if case.get("kernels_directory") is None else process_dynamics_kernels(case["kernels_directory"]))
+        return case, {"status": int(info["status"]), "status_msg": info["status_msg"].decode() if isinstance(info["status_msg"], bytes) else str(info["status_msg"]),
+                      "iterations": int(info["iterations"]), "objective": float(info["obj_val"]), "cache": info["cache"],
+                      "wall_time": time.perf_counter() - start_time}, {"states": states, "inputs": inputs, "feet_phases": feet_phases, "model": model}
+    except Exception as error:  # a failed case must not stop the rest of the sweep
+        return case, {"status": None, "status_msg": repr(error), "iterations": 0, "objective": None, "wall_time": time.perf_counter() - start_time}, None
+# solve all the cases of the sweep in a process pool (one solver per core) and stream the results to output_directory as they finish
+def solve_parameter_sweep(sweep, output_directory, processes = None):
+    os.makedirs(output_directory, exist_ok = True)
+    cases = parameter_sweep_cases(sweep)  # the cases of the sweep
+    results = []  # the results (status, iterations, wall time, trajectory file) of all the cases
+    with multiprocessing.Pool(processes or os.cpu_count()) as pool, open(os.path.join(output_directory, "results.jsonl"), "a") as results_file:
+        for case, result, trajectory in pool.imap_unordered(solve_parameter_sweep_case, cases):  # the cases are returned in the order they finish
+            if trajectory is not None:
+                result["trajectory_file"] = f"case_{case['index']}.traj"  # the file of the trajectory of the case
+                save_trajectory(os.path.join(output_directory, result["trajectory_file"]), trajectory["states"], trajectory["inputs"], case["dt"],
+                                trajectory["feet_phases"], model = trajectory["model"], info = result, metadata = {"case": case})
+            results.append({**case, **result})
+            results_file.write(json.dumps(results[-1]) + "\n")  # stream the result of the case to the disk
+            results_file.flush()
+    return sorted(results, key = lambda result: result["index"])  # return the results in the order of the cases
+
+# the global functions below generate and load the dynamics kernels (see the dynamics_kernels class)
+# derive the body dynamics, their jacobians and the second derivatives of their weighted sum symbolically, and write them to path as a python module of flattened
+# common-subexpression-eliminated kernels
+def generate_dynamics_kernels(path):
+    try: import sympy
+    except ImportError: raise ImportError("generating the dynamics kernels needs the sympy package")
+    # the states, the control inputs, the contacts (0 or 1), the weights of the dynamics and the parameters of the model
+    X, U, C, W, P = sympy.symbols("x0:25"), sympy.symbols("u0:12"), sympy.symbols("c0:4"), sympy.symbols("w0:13"), sympy.symbols("p0:20")
+    m, g, I, inv_I = P[0], P[1], sympy.Matrix(3, 3, P[2:11]), sympy.Matrix(3, 3, P[11:20])  # the mass, the gravity, the inertia tensor and its inverse
+    hat_symbolic = lambda v: sympy.Matrix([[0, -v[2], v[1]], [v[2], 0, -v[0]], [-v[1], v[0], 0]])  # the same functions as hat, L_matrix and q_to_R
+    pcom, pcom_dot, s, v, omega = sympy.Matrix(X[0:3]), sympy.Matrix(X[3:6]), X[6], sympy.Matrix(X[7:10]), sympy.Matrix(X[10:13])
+    fi = [C[foot] * sympy.Matrix(U[3 * foot : 3 * (foot + 1)]) for foot in range(4)]  # the forces applied to the feet are zero for the swing feet
+    ri = [sympy.Matrix(X[13 + 3 * foot : 16 + 3 * foot]) - pcom for foot in range(4)]  # the feet positions relative to the center of mass
+    F_total = sum(fi, sympy.zeros(3, 1)) + sympy.Matrix([0, 0, -m * g])
+    T_total = sum((hat_symbolic(ri[foot]) * fi[foot] for foot in range(4)), sympy.zeros(3, 1))
+    L = sympy.Matrix(sympy.BlockMatrix([[sympy.Matrix([[s]]), -v.T], [v, s * sympy.eye(3) + hat_symbolic(v)]]))
+    Rw = sympy.Matrix([[2 * (s**2 + v[0]**2) - 1, 2 * (v[0] * v[1] - s * v[2]), 2 * (v[0] * v[2] + s * v[1])],
+                       [2 * (v[0] * v[1] + s * v[2]), 2 * (s**2 + v[1]**2) - 1, 2 * (v[1] * v[2] - s * v[0])],
+                       [2 * (v[0] * v[2] - s * v[1]), 2 * (v[1] * v[2] + s * v[0]), 2 * (s**2 + v[2]**2) - 1]])
+    # the body dynamics, as in quadruped_robot_model.quadruped_dynamics
+    f = sympy.Matrix.vstack(pcom_dot, F_total / m, L * sympy.Matrix([0, *omega]) / 2, inv_I * (Rw.T * T_total - hat_symbolic(omega) * (I * omega)))
+    # the jacobian with respect to the forces as in quadruped_robot_model.quadruped_dynamics_du, the total force is masked by the contacts and the torque is taken from the
+    # unmasked forces (the swing feet keep their torque columns)
+    T_unmasked = sum((hat_symbolic(ri[foot]) * sympy.Matrix(U[3 * foot : 3 * (foot + 1)]) for foot in range(4)), sympy.zeros(3, 1))
+    f_du = sympy.Matrix.vstack(pcom_dot, F_total / m, L * sympy.Matrix([0, *omega]) / 2, inv_I * (Rw.T * T_unmasked - hat_symbolic(omega) * (I * omega)))
+    z = list(X) + list(U)  # the variables (x_quad, u) of the second derivatives
+    kernels = {"dynamics": (f, "X, U, C"), "dynamics_dx": (f.jacobian(X), "X, U, C"), "dynamics_du": (f_du.jacobian(U), "X, U, C"),
+               "hessian": (sympy.hessian((sympy.Matrix(W).T * f)[0], z), "X, U, C, W")}
+    # the array and the column of every per-knot symbol
+    arrays = {**{symbol: ("X", index) for index, symbol in enumerate(X)}, **{symbol: ("U", index) for index, symbol in enumerate(U)},
+              **{symbol: ("C", index) for index, symbol in enumerate(C)}, **{symbol: ("W", index) for index, symbol in enumerate(W)}}
+    lines = ["# the kernels of the quadruped robot body dynamics, generated by quadruped_robot_api.py, do not edit", f"kernels_version = {dynamics_kernels.version}"]
+    for name, (matrix, arguments) in kernels.items():
+        # the nonzero elements, by their flat index (the unexpanded expressions keep the structure of the dynamics for the common subexpressions)
+        entries = [(index, value) for index, value in enumerate(matrix) if sympy.expand(value) != 0]
+        shape = matrix.shape if matrix.shape[1] > 1 else (matrix.shape[0],)  # the dynamics are a vector
+        replacements, reduced = sympy.cse([value for index, value in entries], symbols = sympy.numbered_symbols("t"))
+        # the per-knot symbols used by the kernel
+        used = sorted(set().union(*[value.free_symbols for value in reduced], *[value.free_symbols for symbol, value in replacements]) & set(arrays),
+                      key = lambda symbol: (arrays[symbol][0], arrays[symbol][1]))
+        parameters = [f"p{index} = P[{index}]" for index in range(len(P)) if any(P[index] in value.free_symbols for value in reduced + [value for symbol, value in replacements])]
+        target = lambda index, knot: f"out[{knot}, {', '.join(str(i) for i in np.unravel_index(index, shape))}]"  # the element of the result
+        body = [f"{symbol} = {sympy.pycode(value)}" for symbol, value in replacements] + [f"{target(index, '{knot}')} = {sympy.pycode(value)}" for (index, _), value in zip(entries, reduced)]
+        lines += ["", f"def {name}({arguments}, P, out):  # the vectorized kernel, every symbol is a column over the knot points",
+                  *("    " + line for line in parameters), *(f"    {symbol} = {arrays[symbol][0]}[:, {arrays[symbol][1]}]" for symbol in used),
+                  *("    " + line.replace("{knot}", ":") for line in body)]
+        lines += ["", f"def {name}_loop({arguments}, P, out):  # the same kernel, knot point by knot point (compiled with numba)",
+                  *("    " + line for line in parameters), "    for k in range(X.shape[0]):",
+                  *(f"        {symbol} = {arrays[symbol][0]}[k, {arrays[symbol][1]}]" for symbol in used), *("        " + line.replace("{knot}", "k") for line in body)]
+    with open(path + ".tmp", "w") as kernels_file:
+        kernels_file.write("\n".join(lines) + "\n")
+    os.replace(path + ".tmp", path)  # other processes never load a half written module
+# load the dynamics kernels of directory (by default dynamics_kernels.directory), generating them first if they are missing and generate is set, returns None if they are not
+# available (the numpy functions are used instead)
+def load_dynamics_kernels(directory = None, generate = False, compiled = True):
+    path = os.path.join(directory or dynamics_kernels.directory, f"dynamics_kernels_v{dynamics_kernels.version}.py")  # the generated module
+    if not os.path.exists(path):
+        if not generate: return None
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        generate_dynamics_kernels(path)
+    spec = importlib.util.spec_from_file_location(f"dynamics_kernels_v{dynamics_kernels.version}", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module  # numba finds the module of the kernels by name when it loads them from its disk cache
+    try: spec.loader.exec_module(module)
+    except Exception:  # a broken module falls back to the numpy functions
+        del sys.modules[spec.name]
+        return None
+    return dynamics_kernels(module, compiled) if getattr(module, "kernels_version", None) == dynamics_kernels.version else None
+@functools.lru_cache(maxsize = None)
+def process_dynamics_kernels(directory):  # the kernels of directory loaded once in every process (the worker processes of the pools solve many problems), raises a ValueError if they are not generated
+    kernels = load_dynamics_kernels(directory)
+    if kernels is None: raise ValueError(f"the dynamics kernels of {directory} are not generated, run the kernels command first")
+    return kernels
+# the batch dynamics of the model and their derivatives for a problem of K knot points, evaluated by the kernels if they are given and K reaches their min_knots
+def batch_dynamics_functions(model, K, kernels = None):
+    if kernels is None or K < kernels.min_knots: return model.quadruped_dynamics_batch, model.quadruped_dynamics_dxquad_batch, model.quadruped_dynamics_du_batch, model.quadruped_dynamics_hessian_batch
+    return tuple(functools.partial(kernels.evaluate, name, model) for name in dynamics_kernels.names)  # in the order of dynamics_kernels.names
+# compare the kernels with the numpy functions of the model at random states, with all the feet in contact and with random swing feet, returns a list of rows with the largest
+# difference and the mean wall time of both
+def dynamics_kernels_report(kernels, model = None, knots = (10, 1000), repeat = 20):
+    model = model or quadruped_robot_model()  # the random states are the same in every report
+    rng = np.random.default_rng(0)
+    numpy_functions = batch_dynamics_functions(model, 0)  # the numpy functions of the model, in the order of dynamics_kernels.names
+    rows = []  # the rows of the report
+    for K in knots:
+        X = rng.normal(size = (K, model.N))
+        X[:, model.body_com_dim : model.body_com_dim + 4] /= np.linalg.norm(X[:, model.body_com_dim : model.body_com_dim + 4], axis = 1, keepdims = True)
+        us, weights = rng.normal(0., model.mass * model.g / 4, (K, model.M)), rng.normal(size = (K, model.body_state_dim))  # the feet forces and the multipliers of the hessian
+        # all the feet in contact, or about half of them in swing
+        for contacts_name, contacts in (("all", np.ones((K, model.feet_number), dtype = bool)), ("swing", rng.random((K, model.feet_number)) < 0.5)):
+            for name, numpy_function in zip(dynamics_kernels.names, numpy_functions):
+                values, times, arguments = [], [], [X, us, contacts] + ([weights] if name == "hessian" else [])  # the results and the wall times of the numpy function and of the kernel
+                for function in (numpy_function, functools.partial(kernels.evaluate, name, model)):
+                    values.append(function(*arguments))  # the first evaluation also compiles the kernel
+                    start_time = time.perf_counter()
+                    for run in range(repeat): function(*arguments)
+                    times.append((time.perf_counter() - start_time) / repeat)
+                rows.append({"kernel": name, "contacts": contacts_name, "K": K, "max_difference": float(np.abs(values[0] - values[1]).max()), "numpy_time": times[0], "kernel_time": times[1]})
+    return rows
+
+# the global functions below save and load the trajectories, the file holds a JSON header (model, dt, contact schedule, solver status and timing) followed by the contiguous (K, N)
+# states and (K - 1, M) control inputs
+trajectory_file_magic = b"QRTRAJ01"  # the first bytes of every trajectory file (format version 1)
+def save_trajectory(path, states, inputs, dt, feet_phases, model = None, info = None, metadata = None):  # save the trajectory to path with a single write
+    arrays = {"states": np.ascontiguousarray(states, dtype = "<f8"), "inputs": np.ascontiguousarray(inputs, dtype = "<f8")}  # the arrays of the trajectory, little-endian float64
+    # only the plain (JSON) values of the solver info are kept
+    header = {"dt": float(dt), "K": arrays["states"].shape[0], "feet_phases": np.asarray(feet_phases, dtype = bool).astype(int).tolist(),
+              "model": None if model is None else model.parameters(),
+              "solver": {key: (value.decode() if isinstance(value, bytes) else value) for key, value in (info or {}).items() if isinstance(value, (int, float, str, bytes, type(None)))},
+              "metadata": metadata or {}, "arrays": {}}
+    offset = 0  # the offset of every array from the start of the data section
+    for name, array in arrays.items():
+        header["arrays"][name] = {"offset": offset, "shape": list(array.shape), "dtype": "<f8"}
+        offset += array.nbytes
+    header_bytes = json.dumps(header).encode()
+    padding = -(len(trajectory_file_magic) + 8 + len(header_bytes)) % 64  # the data section starts at a 64-byte boundary
+    with open(path, "wb") as trajectory_file:
+        trajectory_file.write(b"".join([trajectory_file_magic, np.array([len(header_bytes) + padding], dtype = "<u8").tobytes(), header_bytes,
+                                        b" " * padding] + [array.tobytes() for array in arrays.values()]))
+def load_trajectory(path):  # load the trajectory of path, the states and the control inputs are memory-mapped (read only), so they are read from the disk only when they are used
+    with open(path, "rb") as trajectory_file:
+        if trajectory_file.read(len(trajectory_file_magic)) != trajectory_file_magic: raise ValueError(f"{path} is not a quadruped robot trajectory file")
+        header_length = int(np.frombuffer(trajectory_file.read(8), dtype = "<u8")[0])
+        header = json.loads(trajectory_file.read(header_length))
+    data_offset = len(trajectory_file_magic) + 8 + header_length  # the start of the data section
+    arrays = {name: np.memmap(path, dtype = array["dtype"], mode = "r", offset = data_offset + array["offset"],
+                              shape = tuple(array["shape"])) if np.prod(array["shape"]) > 0 else np.zeros(array["shape"]) for name, array in header["arrays"].items()}
+    return arrays["states"], arrays["inputs"], header  # return the states (K, N), the control inputs (K - 1, M) and the header
+
+# the global functions below load, save and run the scenario files
+def load_scenario(path):  # load a scenario from a JSON or a TOML file (chosen by the file extension)
+    if path.endswith(".toml"):
+        if tomllib is None: raise ImportError("reading TOML scenarios needs python 3.11+ (tomllib) or the tomli package")
+        with open(path, "rb") as scenario_file: scenario = tomllib.load(scenario_file)
+    else:
+        with open(path) as scenario_file: scenario = json.load(scenario_file)
+    scenario.setdefault("name", os.path.splitext(os.path.basename(path))[0])  # the name of the file is the default name of the scenario
+    return quadruped_scenario(**scenario)
+# write a dictionary of plain values (numbers, strings, booleans, lists and one level of tables) as TOML, the None values are left out (TOML has no null) and the other values TOML
+# can not hold raise a ValueError
+def dict_to_toml(dictionary):
+    def value_to_toml(value):
+        if isinstance(value, (bool, np.bool_)): return "true" if value else "false"
+        if isinstance(value, (list, tuple)): return "[" + ", ".join(value_to_toml(element) for element in value) + "]"
+        if isinstance(value, str): return json.dumps(value)  # the JSON strings are valid TOML basic strings
+        if isinstance(value, (int, np.integer)): return repr(int(value))
+        if isinstance(value, (float, np.floating)):
+            if not np.isfinite(value): raise ValueError(f"the TOML scenarios can not hold the number {value}")
+            return repr(float(value))
+        raise ValueError(f"the TOML scenarios can not hold the value {value!r} (only numbers, strings, booleans, lists and one level of tables)")
+    lines = [f"{key} = {value_to_toml(value)}" for key, value in dictionary.items() if value is not None and not isinstance(value, dict)]  # the keys/values first, the tables last
+    for key, table in dictionary.items():
+        if isinstance(table, dict):  # a nested table raises a ValueError
+            lines += ["", f"[{key}]"] + [f"{table_key} = {value_to_toml(value)}" for table_key, value in table.items() if value is not None]
+    return "\n".join(lines) + "\n"
+def scenario_files(paths):  # the scenario files of the given files and directories (the JSON and TOML files of every directory, sorted)
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith((".json", ".toml")))
+        else: files.append(path)
+    return files
+# solve the scenario of a file (it runs in a worker process of the pool), with the profile of the solve in the result if profile is set, cost_weights (if given) override the cost
+# weights of the scenario
+def solve_scenario_file(path, cache_directory = None, profile = False, cost_weights = None, kernels_directory = None):
+    start_time = time.perf_counter()  # the wall time at the start of the solve
+    try:
+        scenario = load_scenario(path)
+        if cost_weights is not None: scenario.cost_weights = full_cost_weights({**scenario.cost_weights, **cost_weights})
+        kernels = None if kernels_directory is None else process_dynamics_kernels(kernels_directory)  # loaded once in every worker process
+        states, inputs, info = scenario.solve(cache = None if cache_directory is None else trajectory_cache(cache_directory), profile = profile, kernels = kernels)
+        result = {"status": int(info["status"]), "status_msg": info["status_msg"].decode() if isinstance(info["status_msg"], bytes) else str(info["status_msg"]),
+                  "iterations": int(info["iterations"]), "objective": float(info["obj_val"]), "cache": info["cache"], "wall_time": time.perf_counter() - start_time}
+        if "profile" in info: result["profile"] = info["profile"]  # a cache hit is not profiled
+        return path, scenario, result, (states, inputs)
+    except Exception as error:  # a failed scenario must not stop the rest of the run
+        return path, None, {"status": None, "status_msg": repr(error), "iterations": 0, "objective": None, "wall_time": time.perf_counter() - start_time}, None
+# solve the scenario files (or the directories of scenario files) in a process pool and write their trajectories and results (and the profiles of the solves if profile is set) to
+# output_directory, cost_weights (if given) override the cost weights of every scenario
+def run_scenarios(paths, output_directory, processes = None, cache_directory = None, profile = False, cost_weights = None, kernels_directory = None):
+    os.makedirs(output_directory, exist_ok = True)
+    results = []  # the results of all the scenarios
+    with multiprocessing.Pool(processes or os.cpu_count()) as pool, open(os.path.join(output_directory, "results.jsonl"), "a") as results_file:
+        for path, scenario, result, trajectory in pool.starmap(solve_scenario_file, [(path, cache_directory, profile, cost_weights, kernels_directory) for path in scenario_files(paths)]):
+            result = {"scenario_file": path, **result}
+            if "profile" in result:  # the profile is written to its own file, next to the trajectory
+                result["profile_file"] = os.path.splitext(os.path.basename(path))[0] + ".profile.json"
+                with open(os.path.join(output_directory, result["profile_file"]), "w") as profile_file:
+                    json.dump(result["profile"], profile_file, indent = 4)
+                print(f"{path}: {result['profile']['wall_time']:.3f} s, IPOPT {result['profile']['ipopt_time']:.3f} s, " +
+                      ", ".join(f"{name} {function['calls']} calls {function['time']:.3f} s" for name, function in {**result["profile"]["callbacks"], **result.pop("profile")["dynamics"]}.items()))
+            if trajectory is not None:
+                result["trajectory_file"] = os.path.splitext(os.path.basename(path))[0] + ".traj"  # the file of the trajectory is named after the scenario file
+                save_trajectory(os.path.join(output_directory, result["trajectory_file"]), trajectory[0], trajectory[1], scenario.dt, scenario.feet_phases(),
+                                model = scenario.robot_model(), info = result, metadata = {"scenario": scenario.to_dict()})
+            results.append(result)
+            results_file.write(json.dumps(result) + "\n")
+    return results  # return the results in the order of the scenario files
+# run the scenario files (or the directories of scenario files) one by one in receding horizon (MPC) mode and write their applied trajectories and results to output_directory,
+# cost_weights (if given) override the cost weights of every scenario
+def run_scenarios_receding_horizon(paths, output_directory, horizon, cost_weights = None, kernels_directory = None):
+    os.makedirs(output_directory, exist_ok = True)
+    results = []  # the results of all the scenarios
+    with open(os.path.join(output_directory, "results.jsonl"), "a") as results_file:
+        for path in scenario_files(paths):
+            scenario = load_scenario(path)
+            if cost_weights is not None: scenario.cost_weights = full_cost_weights({**scenario.cost_weights, **cost_weights})
+            planner = receding_horizon_planner(scenario.robot_model(), scenario.feet_phases(), scenario.dt, horizon, scenario.hessian_approximation, scenario.tol,
+                                               scenario.max_iter, integrator = scenario.integrator, cost_weights = scenario.cost_weights, scaling = scenario.scaling,
+                                               kernels = None if kernels_directory is None else process_dynamics_kernels(kernels_directory))
+            states, inputs, info = planner.run(scenario.initial_com_position, scenario.initial_body_orientation, scenario.final_com_position, scenario.final_body_orientation)
+            result = {"scenario_file": path, "mode": "mpc", "horizon": planner.horizon, **info, "trajectory_file": os.path.splitext(os.path.basename(path))[0] + ".traj"}
+            save_trajectory(os.path.join(output_directory, result["trajectory_file"]), states, inputs, scenario.dt, scenario.feet_phases(),
+                            model = scenario.robot_model(), info = info, metadata = {"scenario": scenario.to_dict(), "mode": "mpc", "horizon": planner.horizon})
+            results.append(result)
+            results_file.write(json.dumps(result) + "\n")
+            print(f"{path}: {info['windows']} windows, solve latency p50 {1000 * info['latency_p50']:.1f} ms, p90 {1000 * info['latency_p90']:.1f} ms, p99 {1000 * info['latency_p99']:.1f} ms")
+    return results  # return the results in the order of the scenario files
+# the global functions below run the benchmark suite of the solver, fixed scenarios whose timing (split into the callbacks and IPOPT), iterations, peak memory and status are
+# compared with a stored baseline
+# the fixed scenarios of the benchmark, every movement type with the default timing and the walk on the grid of the time steps and the total times (by default the values of the
+# GUI), each with every scaling method (by default the model scaling)
+def benchmark_scenarios(move_types = None, dt_values = None, total_time_values = None, scaling_methods = None):
+    scenarios = []  # the scenarios of the benchmark
+    for scaling in scaling_methods or ["model"]:
+        scenarios += [quadruped_scenario(f"gait_{move_type.replace(' ', '_')}", move_type = move_type, scaling = scaling) for move_type in (move_types or quadruped_robot_model.move_types_list)]
+        for dt, total_time in itertools.product(dt_values or quadruped_robot_api.dt_values, total_time_values or quadruped_robot_api.total_time_values):
+            # one cycle per second (or a single cycle for the fractional total times)
+            scenarios.append(quadruped_scenario(f"walk_dt{dt:g}_T{total_time:g}", dt = dt, total_time = total_time,
+                                                cycles_period = 1 if float(total_time).is_integer() else total_time, scaling = scaling))
+    return scenarios
+def peak_rss():  # the peak resident set size of this process in MB (None if it can not be measured)
+    if resource is None: return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (2**20 if sys.platform == "darwin" else 2**10)  # in bytes on macOS, in kB elsewhere
+# solve a scenario of the benchmark (it runs in a fresh worker process, so that the peak memory is its own), with the generated dynamics kernels of kernels_directory if given
+def run_benchmark_scenario(scenario, kernels_directory = None):
+    row = {"case": scenario.name, "scaling": scenario.scaling, "move_type": scenario.move_type, "dt": scenario.dt, "total_time": scenario.total_time, "K": scenario.K()}
+    try:
+        states, inputs, info = scenario.solve(profile = True, kernels = None if kernels_directory is None else process_dynamics_kernels(kernels_directory))
+        callbacks = info["profile"]["callbacks"]  # the calls and the wall time of the callbacks
+        row.update({"status": int(info["status"]), "iterations": int(info["iterations"]), "wall_time": info["wall_time"],
+                    "constraints_time": callbacks["constraints"]["time"], "jacobian_time": callbacks["jacobian"]["time"], "hessian_time": callbacks["hessian"]["time"],
+                    "ipopt_time": info["profile"]["ipopt_time"]})
+    except Exception as error:  # a failed scenario must not stop the rest of the benchmark
+        row.update({"status": None, "status_msg": repr(error), "iterations": 0, "wall_time": None})
+    row["peak_rss"] = peak_rss()
+    return row
+# solve every scenario repeat times, every solve in a fresh worker process, and keep the fastest solve of every scenario, returns the rows in the order of the scenarios
+def run_benchmark(scenarios, processes = 1, repeat = 1, kernels_directory = None):
+    with multiprocessing.Pool(processes, maxtasksperchild = 1) as pool:
+        solves = pool.starmap(run_benchmark_scenario, [(scenario, kernels_directory) for scenario in scenarios for run in range(repeat)], chunksize = 1)
+    return [min(solves[index * repeat : (index + 1) * repeat], key = lambda row: float("inf") if row["wall_time"] is None else row["wall_time"]) for index in range(len(scenarios))]
+def benchmark_environment():  # the versions and the machine of the benchmark, stored with its results
+    return {"python": platform.python_version(), "numpy": np.__version__, "cyipopt": getattr(cyipopt, "__version__", None), "platform": platform.platform(),
+            "processor": platform.processor(), "cpu_count": os.cpu_count(), "date": time.strftime("%Y-%m-%dT%H:%M:%S")}
+# compare the benchmark rows with the baseline rows of the same cases, a case regresses if it is no longer solved, needs more iterations or is slower by more than the tolerance
+# (and by more than min_time sec), returns the regressions
+def compare_benchmark(rows, baseline_rows, tolerance = 0.25, min_time = 0.05):
+    baseline = {(row["case"], row.get("scaling", "model")): row for row in baseline_rows}  # the baseline rows by case and scaling method
+    regressions = []  # the regressed cases and their reasons
+    for row in rows:
+        old = baseline.get((row["case"], row["scaling"]))
+        if old is None or old["status"] not in (0, 1): continue  # only the solved cases of the baseline are compared
+        if row["status"] not in (0, 1):
+            regressions.append({"case": row["case"], "scaling": row["scaling"], "reasons": [f"status {old['status']} -> {row['status']}"]})
+            continue
+        reasons = [f"iterations {old['iterations']} -> {row['iterations']}"] if row["iterations"] > old["iterations"] else []
+        for key in ["wall_time", "constraints_time", "jacobian_time", "hessian_time", "ipopt_time"]:
+            if row[key] > (1 + tolerance) * old[key] and row[key] - old[key] > min_time: reasons.append(f"{key} {old[key]:.3f} s -> {row[key]:.3f} s")
+        if reasons: regressions.append({"case": row["case"], "scaling": row["scaling"], "reasons": reasons})
+    return regressions
+def scaling_reduction(rows, scaling = "model", reference = "none"):  # the iterations of the cases solved with both scaling methods, returns a list of (case, reference iterations, iterations)
+    reference_rows = {row["case"]: row for row in rows if row["scaling"] == reference and row["status"] in (0, 1)}  # the solved cases of the reference method
+    return [(row["case"], reference_rows[row["case"]]["iterations"], row["iterations"]) for row in rows if row["scaling"] == scaling and row["status"] in (0, 1) and row["case"] in reference_rows]
+def main(arguments):  # the command-line entry point for the unattended runs (without the GUI)
+    parser = argparse.ArgumentParser(description = "Plan quadruped robot trajectories without the GUI.")
+    subparsers = parser.add_subparsers(dest = "command", required = True)
+    run_parser = subparsers.add_parser("run", help = "solve scenario files (JSON or TOML) or directories of scenario files")
+    run_parser.add_argument("paths", nargs = "+", help = "the scenario files or directories")
+    run_parser.add_argument("--profile", action = "store_true",
+                            help = "write the profile of every solve (the calls and the time of the callbacks and of the dynamics, and the progress of every iteration)")
+    sweep_parser = subparsers.add_parser("sweep", help = "solve a parameter sweep, given as a JSON file")
+    sweep_parser.add_argument("sweep_file", help = "the JSON file of the sweep specification")
+    mpc_parser = subparsers.add_parser("mpc", help = "run scenario files (JSON or TOML) or directories of scenario files in receding horizon (MPC) mode")
+    mpc_parser.add_argument("paths", nargs = "+", help = "the scenario files or directories")
+    mpc_parser.add_argument("--horizon", type = int, default = 10, help = "the number of the knot points of every window (default: 10)")
+    integrators_parser = subparsers.add_parser("integrators", help = "compare the accuracy and the wall time of the integrators on a scenario file")
+    integrators_parser.add_argument("scenario_file", help = "the scenario file (JSON or TOML)")
+    integrators_parser.add_argument("--integrators", nargs = "+", choices = trajectory_optimization.integrators, default = None, help = "the compared integrators (default: all)")
+    integrators_parser.add_argument("--dt", nargs = "+", type = float, default = None, help = "the compared time steps in sec (default: the time step of the scenario)")
+    verify_parser = subparsers.add_parser("verify", help = "simulate trajectory files or directories of trajectory files at a fine time step and report their drift from the plan")
+    verify_parser.add_argument("paths", nargs = "+", help = "the trajectory files or directories")
+    verify_parser.add_argument("--substeps", type = int, default = 10, help = "the number of the internal RK4 steps of every knot interval (default: 10)")
+    verify_parser.add_argument("--max-drift", type = float, default = None,
+                               help = "the largest accepted position drift in m, the exit code is nonzero if any trajectory drifts further (default: no limit)")
+    benchmark_parser = subparsers.add_parser("benchmark", help = "run the benchmark suite of the solver and compare it with a baseline")
+    benchmark_parser.add_argument("--gaits", nargs = "+", choices = quadruped_robot_model.move_types_list, default = None, help = "the benchmarked movement types (default: all)")
+    benchmark_parser.add_argument("--dt", nargs = "+", type = float, default = None, help = "the time steps of the walk grid in sec (default: the values of the GUI)")
+    benchmark_parser.add_argument("--total-time", nargs = "+", type = float, default = None, help = "the total times of the walk grid in sec (default: the values of the GUI)")
+    benchmark_parser.add_argument("--scaling", nargs = "+", choices = trajectory_optimization.scaling_methods, default = ["model"],
+                                  help = "the benchmarked scaling methods, with \"model none\" the iteration counts of the two are compared (default: model)")
+    benchmark_parser.add_argument("--repeat", type = int, default = 1, help = "the number of the solves of every scenario, the fastest one is kept (default: 1)")
+    benchmark_parser.add_argument("--baseline", default = None, help = "the benchmark file of the baseline, the exit code is nonzero if any case regresses against it (default: no comparison)")
+    benchmark_parser.add_argument("--update-baseline", action = "store_true", help = "write the results to the baseline file instead of comparing them")
+    benchmark_parser.add_argument("--tolerance", type = float, default = 0.25, help = "the accepted relative slowdown against the baseline (default: 0.25)")
+    benchmark_parser.add_argument("-o", "--output", default = "results", help = "the output directory of the results (default: results)")
+    benchmark_parser.add_argument("-p", "--processes", type = int, default = 1, help = "the number of the worker processes, more than one makes the timings noisy (default: 1)")
+    kernels_parser = subparsers.add_parser("kernels",
+                                           help = "generate the compiled kernels of the dynamics and of their derivatives (requires sympy, and numba for the compilation) "
+                                                  "and compare them with the numpy functions")
+    kernels_parser.add_argument("--directory", default = dynamics_kernels.directory,
+                                help = f"the directory of the generated kernels, the runs use them with the --kernels option (default: {dynamics_kernels.directory})")
+    kernels_parser.add_argument("--regenerate", action = "store_true", help = "generate the kernels again even if they exist")
+    kernels_parser.add_argument("--vectorized", action = "store_true", help = "compare the vectorized numpy kernels instead of the numba compiled ones")
+    kernels_parser.add_argument("--knots", nargs = "+", type = int, default = [10, 100, 1000], help = "the compared numbers of knot points (default: 10 100 1000)")
+    for subparser in (run_parser, sweep_parser, mpc_parser, integrators_parser, verify_parser):
+        subparser.add_argument("-o", "--output", default = "results", help = "the output directory of the results (default: results)")
+    for subparser in (run_parser, sweep_parser):  # the runs that solve in a process pool and can warm start from the cache
+        subparser.add_argument("-p", "--processes", type = int, default = None, help = "the number of the worker processes (default: the number of cores)")
+        subparser.add_argument("-c", "--cache", default = None, help = "the directory of the warm-start cache (default: no cache)")
+    for subparser in (run_parser, sweep_parser, mpc_parser, integrators_parser, benchmark_parser):
+        subparser.add_argument("--kernels", nargs = "?", const = dynamics_kernels.directory, default = None, metavar = "DIRECTORY",
+                               help = f"evaluate the dynamics with the generated kernels of DIRECTORY (default DIRECTORY: {dynamics_kernels.directory}, generate them with "
+                                      "the kernels command), without this option the numpy functions of the model are used")
+    for subparser in (run_parser, sweep_parser, mpc_parser, integrators_parser):
+        subparser.add_argument("--cost-weights", nargs = "+", type = cost_weight_argument, default = None, metavar = "TERM=WEIGHT",
+                               help = f"the weights of the cost terms {list(trajectory_optimization.default_cost_weights)}, over the weights of the scenarios or of the sweep "
+                                      "(default: the weights of the scenarios or of the sweep, zero if not given)")
+    arguments = parser.parse_args(arguments)
+    cost_weights = dict(arguments.cost_weights) if getattr(arguments, "cost_weights", None) is not None else None  # the cost weights given on the command line (if any)
+    kernels_directory = getattr(arguments, "kernels", None)  # the directory of the generated dynamics kernels given on the command line (if any)
+    if kernels_directory is not None and load_dynamics_kernels(kernels_directory) is None:  # checked before the workers start (they load the kernels again)
+        print(f"the dynamics kernels of {kernels_directory} are not generated, run the kernels command first")
+        return 1
+    if arguments.command == "run":
+        results = run_scenarios(arguments.paths, arguments.output, arguments.processes, arguments.cache, arguments.profile, cost_weights, kernels_directory)
+    elif arguments.command == "mpc":
+        results = run_scenarios_receding_horizon(arguments.paths, arguments.output, arguments.horizon, cost_weights, kernels_directory)
+    elif arguments.command == "integrators":
+        scenario = load_scenario(arguments.scenario_file)
+        if cost_weights is not None: scenario.cost_weights = full_cost_weights({**scenario.cost_weights, **cost_weights})
+        results = integrators_report(scenario, arguments.integrators, arguments.dt, kernels = None if kernels_directory is None else process_dynamics_kernels(kernels_directory))
+        os.makedirs(arguments.output, exist_ok = True)
+        with open(os.path.join(arguments.output, "integrators.json"), "w") as report_file:
+            json.dump(results, report_file, indent = 4)
+        print("the control inputs and the contacts are held over every interval (zero-order hold) by all the integrators and by the reference integration of the errors")
+        print(f"{'integrator':>16} {'hessian':>14} {'dt':>6} {'K':>5} {'status':>6} {'iter':>5} {'time (s)':>9} {'max pos err (m)':>16} {'max orient err (deg)':>21}")
+        for row in results:
+            print(f"{row['integrator']:>16} {row['hessian_approximation']:>14} {row['dt']:>6g} {row['K']:>5} {row['status']:>6} {row['iterations']:>5} "
+                  f"{row['wall_time']:>9.3f} {row['max_position_error']:>16.2e} {row['max_orientation_error']:>21.2e}")
+    elif arguments.command == "benchmark":
+        benchmark = {"environment": benchmark_environment(),
+                     "results": run_benchmark(benchmark_scenarios(arguments.gaits, arguments.dt, arguments.total_time, arguments.scaling), arguments.processes, arguments.repeat, kernels_directory)}
+        os.makedirs(arguments.output, exist_ok = True)
+        with open(os.path.join(arguments.output, "benchmark.json"), "w") as benchmark_file:
+            json.dump(benchmark, benchmark_file, indent = 4)
+        print(f"{'case':>20} {'scaling':>14} {'K':>5} {'status':>6} {'iter':>5} {'time (s)':>9} {'constr (s)':>10} {'jac (s)':>8} {'hess (s)':>8} {'ipopt (s)':>9} {'rss (MB)':>8}")
+        for row in benchmark["results"]:
+            if row["wall_time"] is None:
+                print(f"{row['case']:>20} {row['scaling']:>14} {row['K']:>5} failed: {row['status_msg']}")
+            else:
+                print(f"{row['case']:>20} {row['scaling']:>14} {row['K']:>5} {row['status']:>6} {row['iterations']:>5} {row['wall_time']:>9.3f} "
+                      f"{row['constraints_time']:>10.3f} {row['jacobian_time']:>8.3f} {row['hessian_time']:>8.3f} {row['ipopt_time']:>9.3f} {row['peak_rss'] or 0:>8.1f}")
+        reduction = scaling_reduction(benchmark["results"])  # the cases solved both with and without the model scaling
+        if reduction:
+            print(f"model scaling: {sum(row[2] for row in reduction)} iterations instead of {sum(row[1] for row in reduction)} without scaling on {len(reduction)} cases "
+                  f"({100 * (1 - sum(row[2] for row in reduction) / max(1, sum(row[1] for row in reduction))):.0f}% fewer)")
+        if arguments.baseline is not None and arguments.update_baseline:
+            with open(arguments.baseline, "w") as baseline_file:
+                json.dump(benchmark, baseline_file, indent = 4)
+            print(f"the baseline {arguments.baseline} is updated")
+        elif arguments.baseline is not None:
+            with open(arguments.baseline) as baseline_file: regressions = compare_benchmark(benchmark["results"], json.load(baseline_file)["results"], arguments.tolerance)
+            for regression in regressions:
+                print(f"regression in {regression['case']} ({regression['scaling']} scaling): {', '.join(regression['reasons'])}")
+            print(f"{len(regressions)} regressions against the baseline {arguments.baseline}, the results are in {arguments.output}")
+            return 1 if regressions else 0  # the exit code is nonzero if any case regresses
+        results = benchmark["results"]
+    elif arguments.command == "kernels":
+        if arguments.regenerate:
+            os.makedirs(arguments.directory, exist_ok = True)
+            generate_dynamics_kernels(os.path.join(arguments.directory, f"dynamics_kernels_v{dynamics_kernels.version}.py"))
+        kernels = load_dynamics_kernels(arguments.directory, True, not arguments.vectorized)  # generated here if they are missing
+        if kernels is None:
+            print(f"the kernels of {arguments.directory} could not be loaded")
+            return 1
+        print(f"{'kernel':>12} {'contacts':>8} {'K':>5} {'max diff':>9} {'numpy (ms)':>10} {'kernel (ms)':>11} {'speedup':>7}")
+        for row in dynamics_kernels_report(kernels, knots = arguments.knots):
+            print(f"{row['kernel']:>12} {row['contacts']:>8} {row['K']:>5} {row['max_difference']:>9.1e} {1e3 * row['numpy_time']:>10.3f} {1e3 * row['kernel_time']:>11.3f} "
+                  f"{row['numpy_time'] / row['kernel_time']:>7.1f}")
+        print(f"the {'numba compiled' if kernels.compiled else 'vectorized'} kernels are in {arguments.directory}, the runs with the --kernels option use them from {kernels.min_knots} knot points")
+        return 0
+    elif arguments.command == "verify":
+        results = verify_trajectory_files(arguments.paths, arguments.substeps)
+        os.makedirs(arguments.output, exist_ok = True)
+        with open(os.path.join(arguments.output, "verification.jsonl"), "w") as verification_file:
+            verification_file.writelines(json.dumps(row) + "\n" for row in results)
+        for row in results:
+            print(f"{row['trajectory_file']}: max position drift {row['max_position_drift']:.2e} m (final {row['final_position_drift']:.2e} m), max orientation drift "
+                  f"{row['max_orientation_drift']:.2e} deg")
+        accepted = [arguments.max_drift is None or row["max_position_drift"] <= arguments.max_drift for row in results]  # the trajectories within the accepted drift
+        print(f"{sum(accepted)}/{len(results)} verified, the results are in {arguments.output}")
+        return 0 if all(accepted) else 1  # the exit code is nonzero if any trajectory drifts too far
+    else:
+        with open(arguments.sweep_file) as sweep_file: sweep = json.load(sweep_file)
+        if arguments.cache is not None: sweep["cache_directory"] = arguments.cache
+        if cost_weights is not None: sweep["cost_weights"] = {**sweep.get("cost_weights", {}), **cost_weights}
+        if kernels_directory is not None: sweep["kernels_directory"] = kernels_directory
+        results = solve_parameter_sweep(sweep, arguments.output, arguments.processes)
+    print(f"{sum(result['status'] in (0, 1) for result in results)}/{len(results)} solved, the results are in {arguments.output}")
+    return 0 if all(result["status"] in (0, 1) for result in results) else 1  # the exit code is nonzero if any solve failed
+
 # the code block below is used to create the quadruped robot simulation API window or windows, depending on the number of the program instances (windows) the user wants to be created
 if __name__ == "__main__":
+    if len(sys.argv) > 1: sys.exit(main(sys.argv[1:]))  # the command-line arguments run the scenarios/sweeps unattended, without the GUI
     windows_number = int(input("How many windows (program instances) do you want to be created? "))
     # windows_number = 1
     roots_list = []
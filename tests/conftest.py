@@ -0,0 +1,44 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # the module is the single file at the root of the repository
+
+
+@pytest.fixture
+def api():
+    pytest.importorskip("cyipopt")  # the module imports the solver at the top
+    import quadruped_robot_api
+    return quadruped_robot_api
+
+
+@pytest.fixture
+def make_problem(api):  # a small problem with a random contact schedule and a random point x, and the mask of the forces fixed to zero (the swing feet)
+    def make_problem(integrator = "euler", K = 7, seed = 0, batch = True, cost_weights = None, hessian_approximation = None):
+        rng = np.random.default_rng(seed)
+        model = api.quadruped_robot_model()
+        feet_phases = rng.random((model.feet_number, K)) < 0.6
+        feet_phases[:, -1] = True  # a window of the receding horizon can end in a contact phase
+        x0 = model.state([0, 0, 0.3], [0, 0, 0]).reshape((model.N, 1)); x_target = model.state([0.5, 0.2, 0.3], [30, 0, 0]).reshape((model.N, 1))
+        batch_functions = {"dynamics_batch": model.quadruped_dynamics_batch, "dynamics_dx_batch": model.quadruped_dynamics_dxquad_batch, "dynamics_du_batch": model.quadruped_dynamics_du_batch, "dynamics_hess_batch": model.quadruped_dynamics_hessian_batch} if batch else {}
+        problem = api.trajectory_optimization(model.quadruped_dynamics, model.quadruped_dynamics_dxquad, model.quadruped_dynamics_du, x0, x_target, K, 0.1, feet_phases, verbose = False, integrator = integrator,
+                                              hessian_approximation = hessian_approximation, cost_weights = cost_weights, force_scale = model.mass * model.g, **batch_functions)
+        X = rng.normal(size = (K, model.N)); X[:, model.body_com_dim : model.body_com_dim + 4] /= np.linalg.norm(X[:, model.body_com_dim : model.body_com_dim + 4], axis = 1, keepdims = True)
+        U = rng.normal(0., model.mass * model.g / 4, (K - 1, model.M))
+        fixed = np.zeros(problem.x_dim, dtype = bool)  # the forces of the swing feet, the bounds fix them to zero
+        fixed[K * model.N :] = np.repeat(~feet_phases[:, :-1].T, 3, axis = 1).ravel()
+        return problem, np.concatenate((X.ravel(), U.ravel())), fixed
+    return make_problem
+
+
+@pytest.fixture
+def finite_differences():  # the central differences of a vector function at x, one column per element of x
+    def finite_differences(function, x, step = 1e-6):
+        columns = []
+        for index in range(len(x)):
+            dx = np.zeros(len(x)); dx[index] = step
+            columns.append((np.ravel(function(x + dx)) - np.ravel(function(x - dx))) / (2 * step))
+        return np.stack(columns, axis = 1)
+    return finite_differences
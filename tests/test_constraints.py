@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_batch_constraints_match_per_knot(make_problem, seed):
+    batch_problem, x, _ = make_problem(seed = seed)
+    per_knot_problem, _, _ = make_problem(seed = seed, batch = False)
+    np.testing.assert_allclose(batch_problem.constraints(x), per_knot_problem.constraints(x), rtol = 1e-12, atol = 1e-10)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_batch_jacobian_matches_per_knot(make_problem, seed):
+    batch_problem, x, _ = make_problem(seed = seed)
+    per_knot_problem, _, _ = make_problem(seed = seed, batch = False)
+    shape = (batch_problem.eq_dim + batch_problem.ineq_dim, batch_problem.x_dim)
+    jacobians = []
+    for problem in (batch_problem, per_knot_problem):
+        jacobian = np.zeros(shape); jacobian[problem.jacobianstructure()] = problem.jacobian(x)
+        jacobians.append(jacobian)
+    np.testing.assert_allclose(jacobians[0], jacobians[1], rtol = 1e-12, atol = 1e-10)
+
+
+def test_bounds_fix_the_ends_on_a_copy_of_the_template(api, make_problem):
+    problem, _, fixed = make_problem()
+    model = api.quadruped_robot_model()
+    arguments = (10 * model.mass * model.g, model.legs_bounds_x, model.legs_bounds_y, model.legs_bounds_z)
+    template = problem.bounds_template(*arguments)
+    opt_lb, opt_ub, c_lb, c_ub = problem.bounds(*arguments)
+    X_lb, X_ub = opt_lb[: problem.K * problem.N].reshape((problem.K, problem.N)), opt_ub[: problem.K * problem.N].reshape((problem.K, problem.N))
+    feet_z = problem.body_state_dim + 3 * np.arange(problem.feet_number) + 2  # the feet heights of the ends are bounded by the ground, not by the given states
+    initial, target = np.setdiff1d(np.arange(problem.N), feet_z), np.setdiff1d(problem.target_indexes, feet_z)
+    np.testing.assert_array_equal(X_lb[0, initial], problem.x0[initial, 0]); np.testing.assert_array_equal(X_ub[0, initial], problem.x0[initial, 0])
+    np.testing.assert_array_equal(X_lb[-1, target], problem.x_target[target, 0]); np.testing.assert_array_equal(X_ub[-1, target], problem.x_target[target, 0])
+    assert np.all(X_lb[[0, -1]][:, feet_z] == 0) and np.all(X_ub[[0, -1]][:, feet_z][problem.feet_phases[:, [0, -1]].T] == 0)
+    inner = np.ones(problem.x_dim, dtype = bool); inner[: problem.N] = False; inner[(problem.K - 1) * problem.N : problem.K * problem.N] = False  # the variables of the knot points between the ends
+    np.testing.assert_array_equal(opt_lb[inner], template[0][inner]); np.testing.assert_array_equal(opt_ub[inner], template[1][inner])
+    np.testing.assert_array_equal(c_lb, template[2]); np.testing.assert_array_equal(c_ub, template[3])
+    assert np.all(opt_lb[fixed] == 0) and np.all(opt_ub[fixed] == 0)  # the forces of the swing feet
+    expected = [np.copy(bound) for bound in (opt_lb, opt_ub, c_lb, c_ub)]
+    for bound in (opt_lb, opt_ub, c_lb, c_ub): bound[:] = np.nan  # the solver owns its bounds, the changes do not reach the cached template
+    for bound, expected_bound in zip(problem.bounds(*arguments), expected): np.testing.assert_array_equal(bound, expected_bound)
+
+
+def test_scaled_dynamics_identity_blocks_stay_identities(api, make_problem):
+    problem, x, _ = make_problem()
+    model = api.quadruped_robot_model()
+    x_scaling, g_scaling = problem.scaling(max(model.body_length_x, model.body_length_y, model.body_length_z), model.mass * model.g, model.g)
+    assert x_scaling.shape == (problem.x_dim,) and g_scaling.shape == (problem.eq_dim + problem.ineq_dim,)
+    assert np.all(np.isfinite(x_scaling) & (x_scaling > 0)) and np.all(np.isfinite(g_scaling) & (g_scaling > 0))
+    rows, cols = problem.jacobianstructure()
+    scaled_jacobian = g_scaling[rows] * problem.jacobian(x) / x_scaling[cols]  # the Jacobian of the scaled constraints with respect to the scaled variables
+    body_rows = rows < (problem.K - 1) * problem.body_state_dim  # the dynamics constraints
+    identity = body_rows & (cols == (rows // problem.body_state_dim + 1) * problem.N + rows % problem.body_state_dim)  # the elements of the states x_k+1 of their own constraint
+    assert np.count_nonzero(identity) == (problem.K - 1) * problem.body_state_dim
+    np.testing.assert_array_equal(scaled_jacobian[identity], 1.)
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+
+@pytest.mark.parametrize("integrator", ["euler", "trapezoidal", "hermite-simpson", "rk4"])
+def test_jacobian_matches_finite_differences(make_problem, finite_differences, integrator):
+    problem, x, fixed = make_problem(integrator)
+    rows, cols = problem.jacobianstructure()
+    assert len(set(zip(rows.tolist(), cols.tolist()))) == len(rows)  # every nonzero element is declared once
+    jacobian = np.zeros((problem.eq_dim + problem.ineq_dim, problem.x_dim))
+    jacobian[rows, cols] = problem.jacobian(x)
+    expected = finite_differences(problem.constraints, x)
+    # the jacobian keeps the torque columns of the swing feet forces (like the per-knot one), the bounds fix these forces to zero
+    np.testing.assert_allclose(jacobian[:, ~fixed], expected[:, ~fixed], rtol = 1e-5, atol = 1e-5)  # the elements outside the structure are zero in both
+
+
+@pytest.mark.parametrize("cost_weights", [None, {"effort": 1., "smoothness": 0.3, "angular_velocity": 0.5, "tracking": 2.}])
+def test_hessian_matches_finite_differences(make_problem, finite_differences, cost_weights):
+    problem, x, fixed = make_problem(cost_weights = cost_weights, hessian_approximation = "exact")
+    lagrange, obj_factor = np.random.default_rng(1).normal(size = problem.eq_dim + problem.ineq_dim), 2.
+    rows, cols = problem.hessianstructure()
+    assert np.all(rows >= cols) and len(set(zip(rows.tolist(), cols.tolist()))) == len(rows)  # the lower triangle, every nonzero element declared once
+    hessian = np.zeros((problem.x_dim, problem.x_dim))
+    hessian[rows, cols] = problem.hessian(x, lagrange, obj_factor)
+    jacobian_rows, jacobian_cols = problem.jacobianstructure()
+    def lagrangian_gradient(x):
+        gradient = obj_factor * np.ravel(problem.gradient(x))
+        np.add.at(gradient, jacobian_cols, lagrange[jacobian_rows] * problem.jacobian(x))
+        return gradient
+    expected = np.tril(finite_differences(lagrangian_gradient, x))
+    free = np.flatnonzero(~fixed)
+    np.testing.assert_allclose(hessian[np.ix_(free, free)], expected[np.ix_(free, free)], rtol = 1e-5, atol = 1e-4)
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def canvas(api):
+    try: root = api.tk.Tk()
+    except api.tk.TclError: pytest.skip("the gait buttons are drawn on a Tk canvas, which needs a display")
+    root.withdraw()
+    yield api.tk.Canvas(root)
+    root.destroy()
+
+
+def test_gait_button_is_a_view_of_the_gaits_schedule(api, canvas):
+    gaits_schedule = np.zeros((4, 3), dtype = bool)
+    gaits_schedule[2, 1] = True
+    button = api.gait_button(canvas, 10, 10, 2, 1, 0, gaits_schedule)
+    button.set_button_on_grid(2, 1)
+    assert button.gait_button_is_pressed and canvas.itemcget(button.button, "fill") == api.gait_button.press_colors[2]
+    button.press_button()  # the swing phase is written to the schedule
+    assert not gaits_schedule[2, 1] and not button.gait_button_is_pressed
+    assert canvas.itemcget(button.button, "fill") == api.gait_button.unpress_colors[0]
+    gaits_schedule[:] = True  # a schedule changed elsewhere (e.g. a loaded scenario) is shown after an update
+    assert button.gait_button_is_pressed
+    button.update_button()
+    assert canvas.itemcget(button.button, "fill") == api.gait_button.press_colors[2] and button.control_highlight == 1
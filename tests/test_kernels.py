@@ -0,0 +1,17 @@
+import numpy as np
+import pytest
+
+
+def test_kernels_match_the_numpy_functions(api, tmp_path):
+    pytest.importorskip("sympy")  # the kernels are derived symbolically
+    kernels = api.load_dynamics_kernels(str(tmp_path), generate = True, compiled = False)
+    model = api.quadruped_robot_model()
+    K = kernels.min_knots  # the smallest problem evaluated by the kernels
+    rng = np.random.default_rng(0)
+    X = rng.normal(size = (K, model.N)); X[:, model.body_com_dim : model.body_com_dim + 4] /= np.linalg.norm(X[:, model.body_com_dim : model.body_com_dim + 4], axis = 1, keepdims = True)
+    U, W = rng.normal(0., model.mass * model.g / 4, (K, model.M)), rng.normal(size = (K, model.body_state_dim))
+    kernel_functions, numpy_functions = api.batch_dynamics_functions(model, K, kernels), api.batch_dynamics_functions(model, 0)
+    for contacts in (np.ones((K, model.feet_number), dtype = bool), rng.random((K, model.feet_number)) < 0.5):  # all the feet in contact, then random swing feet
+        for name, kernel_function, numpy_function in zip(api.dynamics_kernels.names, kernel_functions, numpy_functions):
+            arguments = (X, U, contacts, W) if name == "hessian" else (X, U, contacts)
+            np.testing.assert_allclose(kernel_function(*arguments), numpy_function(*arguments), rtol = 1e-9, atol = 1e-9, err_msg = name)
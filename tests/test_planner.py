@@ -0,0 +1,36 @@
+import json
+import os
+
+import numpy as np
+
+
+def test_plan_holds_the_ends_and_reuses_the_cache(api, tmp_path):
+    model = api.quadruped_robot_model()
+    height = model.feet_height + model.body_length_z / 2  # the standing height
+    feet_phases = np.ones((model.feet_number, 6), dtype = bool)  # all the feet in contact
+    cache = api.trajectory_cache(str(tmp_path))
+    plan = lambda final_com_position: api.plan_quadruped_trajectory(model, [0, 0, height], (0, 0, 0), final_com_position, (0, 0, 0), feet_phases, 0.1, print_level = 0, cache = cache)
+    states, inputs, info = plan([0, 0, height])  # the feet in contact can not move, so the robot stands
+    assert states.shape == (6, model.N) and inputs.shape == (5, model.M)
+    assert info["status"] in (0, 1) and info["cache"] == "miss" and info["iterations"] > 0
+    np.testing.assert_allclose(states[0], model.state([0, 0, height], (0, 0, 0)))
+    np.testing.assert_allclose(states[-1, : model.body_position_dim], [0, 0, height])
+    cached_states, cached_inputs, cached_info = plan([0, 0, height])
+    assert cached_info["cache"] == "hit"
+    np.testing.assert_array_equal(cached_states, states)
+    np.testing.assert_array_equal(cached_inputs, inputs)
+    assert plan([0.01, 0, height])[2]["cache"] == "warm"  # a near target starts from the cached solution
+
+
+def test_sweep_writes_a_trajectory_and_a_result_per_case(api, tmp_path):
+    sweep = {"move_types": ["all C"], "masses": [20., 25.], "dt_values": [0.1], "total_time_values": [1], "initial_pose": [[0, 0, None], [0, 0, 0]], "final_poses": [[[0, 0, None], [0, 0, 0]]]}
+    results = api.solve_parameter_sweep(sweep, str(tmp_path), processes = 1)
+    assert [result["index"] for result in results] == [0, 1] and [result["mass"] for result in results] == [20., 25.]
+    for result in results:
+        assert result["status"] in (0, 1), result["status_msg"]
+        states, inputs, header = api.load_trajectory(os.path.join(str(tmp_path), result["trajectory_file"]))
+        model = api.quadruped_robot_model(**header["model"])
+        assert states.shape == (11, model.N) and inputs.shape == (10, model.M)
+        assert model.mass == result["mass"] and header["metadata"]["case"]["index"] == result["index"]
+    with open(os.path.join(str(tmp_path), "results.jsonl")) as results_file:
+        assert sorted(json.loads(line)["index"] for line in results_file) == [0, 1]  # every case is streamed to the results file
@@ -0,0 +1,18 @@
+import numpy as np
+
+
+def test_receding_horizon_applies_one_input_per_window(api):
+    scenario = api.quadruped_scenario("walk", total_time = 1, cycles_period = 0.5, move_type = "walk", final_com_position = [1.3, 1., 0.], final_body_orientation = (0, 0, 0))
+    scenario.final_com_position[2] = scenario.initial_com_position[2]
+    model, feet_phases = scenario.robot_model(), scenario.feet_phases()
+    feet_phases[:, -1] = feet_phases[:, -2]  # the last knot point continues the last gait, so the last windows end in a contact phase
+    assert feet_phases[:, -1].any()
+    K, horizon = feet_phases.shape[1], 4
+    planner = api.receding_horizon_planner(model, feet_phases, scenario.dt, horizon, max_iter = 20)
+    states, inputs, info = planner.run(scenario.initial_com_position, scenario.initial_body_orientation, scenario.final_com_position, scenario.final_body_orientation)
+    assert states.shape == (K, model.N) and inputs.shape == (K - 1, model.M)
+    np.testing.assert_allclose(states[0], model.state(scenario.initial_com_position, scenario.initial_body_orientation))
+    assert info["windows"] == K - 1
+    assert {"status", "failed_windows", "iterations", "latency_mean", "latency_p50", "latency_p90", "latency_p99", "latency_max", "wall_time"} <= set(info)
+    assert info["latency_p50"] <= info["latency_p90"] <= info["latency_p99"] <= info["latency_max"]
+    assert len(planner.problems) <= K - 1  # the windows with the same contact schedule share their problem
@@ -0,0 +1,38 @@
+import json
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def tomllib(api):
+    if api.tomllib is None: pytest.skip("reading TOML needs python 3.11+ (tomllib) or the tomli package")
+    return api.tomllib
+
+
+def test_dict_to_toml_round_trips_through_tomllib(api, tomllib):
+    dictionary = {"name": "walk \"fast\"", "dt": 0.05, "max_iter": np.int64(50), "scale": np.float32(0.5), "verbose": np.bool_(True), "skipped": None, "poses": [[0, 0.3], [1.5, -2e-7]], "table": {"flag": False, "values": [1, 2]}}
+    assert tomllib.loads(api.dict_to_toml(dictionary)) == {"name": "walk \"fast\"", "dt": 0.05, "max_iter": 50, "scale": 0.5, "verbose": True, "poses": [[0, 0.3], [1.5, -2e-7]], "table": {"flag": False, "values": [1, 2]}}
+
+
+def test_scenario_round_trips_through_toml(api, tomllib, tmp_path):
+    scenario = api.quadruped_scenario("trot", move_type = "trot", total_time = 1.5, integrator = "rk4", cost_weights = {"effort": 0.5}, model = {"mass": 25.})
+    path = str(tmp_path / "trot.toml")
+    scenario.save(path)
+    loaded = api.load_scenario(path)
+    assert json.loads(json.dumps(loaded.to_dict())) == json.loads(json.dumps(scenario.to_dict()))  # the tuples are lists in both
+
+
+@pytest.mark.parametrize("dictionary", [{"dt": float("nan")}, {"dt": float("inf")}, {"table": {"nested": {"dt": 0.1}}}, {"values": [1, None]}, {"value": object()}])
+def test_dict_to_toml_rejects_what_toml_can_not_hold(api, dictionary):
+    with pytest.raises(ValueError):
+        api.dict_to_toml(dictionary)
+
+
+def test_failed_save_leaves_no_file(api, tmp_path):
+    scenario = api.quadruped_scenario()
+    scenario.tol = float("nan")
+    path = tmp_path / "scenario.toml"
+    with pytest.raises(ValueError):
+        scenario.save(str(path))
+    assert not path.exists()
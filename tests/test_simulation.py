@@ -0,0 +1,32 @@
+import numpy as np
+
+
+def test_simulate_trajectories_rolls_out_every_trajectory_of_the_batch(api):
+    model = api.quadruped_robot_model()
+    rng = np.random.default_rng(0)
+    planned_states = np.tile(model.state([0, 0, 0.3], (10, 0, 0)), (3, 6, 1)) + rng.normal(0., 0.01, (3, 6, model.N))
+    inputs, feet_phases = rng.normal(0., 50., (3, 5, model.M)), rng.random((3, model.feet_number, 6)) < 0.6
+    states = api.simulate_trajectories(model, planned_states, inputs, feet_phases, 0.05)
+    np.testing.assert_array_equal(states[:, 0], planned_states[:, 0])
+    np.testing.assert_array_equal(states[:, :, model.body_state_dim :], planned_states[:, :, model.body_state_dim :])  # the feet follow the plan
+    for b in range(3):
+        np.testing.assert_allclose(states[b], api.simulate_trajectories(model, planned_states[b : b + 1], inputs[b : b + 1], feet_phases[b : b + 1], 0.05)[0], rtol = 1e-12, atol = 1e-12)
+
+
+def test_verify_trajectory_files_measures_the_drift_in_file_order(api, tmp_path):
+    model = api.quadruped_robot_model()
+    paths = []
+    for name, K, seed, offset in [("b_drifting", 8, 1, 0.01), ("a_exact", 8, 2, 0.), ("c_short", 4, 3, 0.)]:
+        # a trajectory that follows its own simulation, from a standing state with random feet forces around the weight
+        inputs = np.random.default_rng(seed).normal(0., 5., (1, K - 1, model.M)); inputs[..., 2::3] += model.mass * model.g / model.feet_number
+        feet_phases = np.ones((1, model.feet_number, K), dtype = bool)
+        standing_states = np.tile(model.state([0, 0, model.feet_height + model.body_length_z / 2], (0, 0, 0)), (1, K, 1))
+        states, inputs, feet_phases = api.simulate_trajectories(model, standing_states, inputs, feet_phases, 0.05)[0], inputs[0], feet_phases[0]
+        states[1:, 0] += offset  # the planned x positions after the first knot point
+        paths.append(str(tmp_path / f"{name}.traj"))
+        api.save_trajectory(paths[-1], states, inputs, 0.05, feet_phases, model = model)
+    rows = api.verify_trajectory_files(paths)
+    assert [row["trajectory_file"] for row in rows] == paths and [row["K"] for row in rows] == [8, 8, 4]
+    np.testing.assert_allclose(rows[0]["max_position_drift"], 0.01, rtol = 1e-6)
+    assert rows[1]["max_position_drift"] < 1e-12 and rows[2]["max_position_drift"] < 1e-12 and rows[1]["max_orientation_drift"] < 1e-4
+    assert [row["trajectory_file"] for row in api.verify_trajectory_files([str(tmp_path)])] == sorted(paths)  # the trajectory files of a directory
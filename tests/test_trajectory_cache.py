@@ -0,0 +1,57 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def solved(api, make_problem):  # a problem and a fake solution of it, put to the cache with put(key, *solved)
+    problem, x, _ = make_problem()
+    states, inputs = x[: problem.K * problem.N].reshape((problem.K, problem.N)), x[problem.K * problem.N :].reshape((problem.K - 1, problem.M))
+    info = {"mult_g": np.zeros(problem.eq_dim + problem.ineq_dim), "mult_x_L": np.zeros(problem.x_dim), "mult_x_U": np.zeros(problem.x_dim), "status": 0, "status_msg": b"ok", "obj_val": 1.5, "iterations": 7}
+    return api.quadruped_robot_model(), problem.feet_phases, problem.dt, problem.x0, problem.x_target, problem, states, inputs, info
+
+
+def test_get_returns_the_put_solution(api, tmp_path, solved):
+    cache = api.trajectory_cache(str(tmp_path))
+    key = cache.key(*solved[:5])
+    assert cache.get(key) is None
+    cache.put(key, *solved)
+    entry = cache.get(key)
+    np.testing.assert_array_equal(entry["states"], solved[6])
+    np.testing.assert_array_equal(entry["inputs"], solved[7])
+    assert int(entry["status"]) == 0 and str(entry["status_msg"]) == "ok" and int(entry["iterations"]) == 7
+
+
+def test_key_depends_on_the_integrator_and_the_cost_weights(api, tmp_path, solved):
+    cache = api.trajectory_cache(str(tmp_path))
+    key = cache.key(*solved[:5])
+    assert cache.key(*solved[:5], "euler", api.full_cost_weights()) == key  # the default integrator and cost weights
+    assert cache.key(*solved[:5], "rk4") != key
+    assert cache.key(*solved[:5], "euler", {"effort": 1.}) != key
+
+
+def test_nearest_finds_a_near_miss_of_the_same_integrator(api, tmp_path, solved):
+    cache = api.trajectory_cache(str(tmp_path))
+    cache.put(cache.key(*solved[:5]), *solved)
+    model, feet_phases, dt, x0, x_target = solved[:5]
+    near_target = x_target + 0.01
+    np.testing.assert_array_equal(cache.nearest(model, feet_phases, dt, x0, near_target)["states"], solved[6])
+    assert cache.nearest(model, feet_phases, dt, x0, near_target, "rk4") is None
+    assert cache.nearest(model, feet_phases, dt, x0, near_target, "euler", {"effort": 1.}) is None
+
+
+def test_evict_removes_the_least_recently_used_entries(api, tmp_path, solved):
+    cache = api.trajectory_cache(str(tmp_path), max_entries = 2)
+    model, feet_phases, dt, x0, x_target = solved[:5]
+    keys = [cache.key(model, feet_phases, dt, x0, x_target + offset) for offset in range(3)]
+    cache.put(keys[0], *solved); cache.put(keys[1], *solved)
+    now = time.time()
+    os.utime(os.path.join(str(tmp_path), keys[0] + ".npz"), (now - 200, now - 200))
+    os.utime(os.path.join(str(tmp_path), keys[1] + ".npz"), (now - 100, now - 100))
+    assert cache.get(keys[0]) is not None  # the oldest entry is used again, so the other one is now the least recently used
+    cache.put(keys[2], *solved)
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None and cache.get(keys[2]) is not None
+    assert sorted(os.listdir(str(tmp_path))) == sorted(key + extension for key in (keys[0], keys[2]) for extension in (".json", ".npz"))
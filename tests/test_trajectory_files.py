@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+
+@pytest.mark.parametrize("K", [1, 11])
+def test_load_trajectory_returns_the_saved_trajectory(api, tmp_path, K):
+    model = api.quadruped_robot_model(mass = 20.)
+    rng = np.random.default_rng(0)
+    states, inputs = rng.normal(size = (K, model.N)), rng.normal(size = (K - 1, model.M))
+    feet_phases = rng.random((model.feet_number, K)) < 0.5
+    path = str(tmp_path / "trajectory.traj")
+    api.save_trajectory(path, states, inputs, 0.05, feet_phases, model = model, info = {"status": 0, "status_msg": b"ok", "mult_g": np.zeros(3)}, metadata = {"scenario": "walk"})
+    loaded_states, loaded_inputs, header = api.load_trajectory(path)
+    np.testing.assert_array_equal(loaded_states, states)
+    np.testing.assert_array_equal(loaded_inputs, inputs)
+    assert loaded_inputs.shape == (K - 1, model.M)
+    assert header["dt"] == 0.05 and header["K"] == K
+    np.testing.assert_array_equal(np.array(header["feet_phases"], dtype = bool), feet_phases)
+    assert api.quadruped_robot_model(**header["model"]).parameters() == model.parameters()
+    assert header["solver"] == {"status": 0, "status_msg": "ok"}  # only the plain values of the solver info are kept
+    assert header["metadata"] == {"scenario": "walk"}
+
+
+def test_load_trajectory_rejects_other_files(api, tmp_path):
+    path = tmp_path / "scenario.json"
+    path.write_text("{}")
+    with pytest.raises(ValueError):
+        api.load_trajectory(str(path))